@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Collision rate and index size for each fingerprint width.
+
+The collision rate is measured on `--n_kgrams` random (distinct) kgrams over
+a small alphabet, which mimics the normalised token stream. The index size
+is measured by building the `InvertIndex` of the given softwares (default:
+the `examples` directory).
+"""
+import os
+import random
+import sys
+import time
+
+from locmoss import MossEngine, Parser, Winnower
+from locmoss.kgram import KGrams, RollingKGrams
+from locmoss.parser import Token
+from locmoss.software import Software
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+EXAMPLES = os.path.join(HERE, "..", "examples", "*", "*.c")
+
+ALPHABET = ["N", "S", "F", "(", ")", "{", "}", ";", ",", "=", "+", "-", "*",
+            "<", ">", "[", "]", "if", "for", "while", "int", "return", "0",
+            "1", "void", "char", "else", "&", "!", "."]
+
+
+def random_tokens(n, seed=0):
+    rng = random.Random(seed)
+    return [Token(rng.choice(ALPHABET), i) for i in range(n)]
+
+
+def collision_rate(kgram_cls, tokens, k, hash_bits):
+    texts = {}
+    for _, kgram in kgram_cls.kgramify(tokens, k, hash_bits):
+        texts.setdefault(str(kgram), int(kgram))
+    n_distinct_fp = len(set(texts.values()))
+    return len(texts), 1. - n_distinct_fp / float(len(texts))
+
+
+def index_size(hashing, hash_bits, paths, k, window_size):
+    softwares = Software.list_from_globs(paths)
+    fingerprinter = Winnower(Parser, window_size, k, hashing=hashing,
+                             hash_bits=hash_bits)
+    moss = MossEngine(fingerprinter).build_index(softwares)
+    n_entries = 0
+    n_postings = 0
+    n_bytes = sys.getsizeof(moss.invert_index.hash_t)
+    for fp, softwares in moss.invert_index.iter_raw():
+        n_entries += 1
+        n_postings += len(softwares)
+        n_bytes += sys.getsizeof(fp) + sys.getsizeof(softwares)
+    return n_entries, n_postings, n_bytes
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paths", nargs="*", default=[EXAMPLES])
+    parser.add_argument("--n_kgrams", type=int, default=10**6)
+    parser.add_argument("--kgram_len", "-k", type=int, default=5)
+    parser.add_argument("--window_size", "-w", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    tokens = random_tokens(args.n_kgrams + args.kgram_len - 1)
+
+    header = ("hashing", "bits", "distinct kgrams", "collision rate",
+              "index entries", "postings", "index bytes", "time (s)")
+    print(" | ".join(header))
+    for hashing, kgram_cls in (("sha1", KGrams), ("rolling", RollingKGrams)):
+        for hash_bits in (16, 32, 64):
+            start = time.perf_counter()
+            n_distinct, rate = collision_rate(kgram_cls, tokens,
+                                              args.kgram_len, hash_bits)
+            duration = time.perf_counter() - start
+            n_entries, n_postings, n_bytes = index_size(
+                hashing, hash_bits, args.paths, args.kgram_len,
+                args.window_size)
+            row = (hashing, hash_bits, n_distinct, "{:.2e}".format(rate),
+                   n_entries, n_postings, n_bytes, "{:.2f}".format(duration))
+            print(" | ".join(str(x) for x in row))
+
+
+if __name__ == '__main__':
+    main()
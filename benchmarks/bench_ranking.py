@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Full (non-vectorised) rankings of all the pairs of the matching graph.
+Each similarity is timed through `Ranking.from_invert_index`, and compared
+with the scoring of the pairs one by one, from their shareprints (the
+default `Similarity.score_graph`). TF-IDF accumulates the dot products of
+all the pairs in one pass over the postings instead: both must give the
+same scores.
+
+The matching graph is derived beforehand (it is shared by the rankings).
+"""
+import glob
+import os
+import tempfile
+import time
+from functools import partial
+
+import pygments.lexers
+
+from locmoss import MossEngine, Parser, Winnower
+from locmoss.moss import Filter
+from locmoss.query import CountSimilarity, JaccardSimilarity, \
+    TfIdfSimilarity, Ranking
+from locmoss.query.similarity import Similarity
+from locmoss.software import Software
+
+from corpus import generate_corpus
+
+
+def per_pair(similarity, invert_index):
+    matching_graph = invert_index.derive_matching_graph()
+    # Shareprints are materialised again for each run
+    return {(s1, s2): score for score, s1, s2 in Similarity.score_graph(
+        similarity, invert_index, matching_graph)}
+
+
+def ranked(similarity, invert_index):
+    return {(s1, s2): score for score, s1, s2
+            in Ranking.from_invert_index(similarity, invert_index)}
+
+
+def timeit(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n_softwares", "-n", type=int, default=150)
+    parser.add_argument("--kgram_len", "-k", type=int, default=5)
+    parser.add_argument("--window_size", "-w", type=int, default=15)
+    parser.add_argument("--collision_threshold", "-c", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    lexer = pygments.lexers.get_lexer_by_name("c")
+    moss = MossEngine(Winnower(partial(Parser, lexer=lexer), args.window_size,
+                               args.kgram_len),
+                      Filter(args.collision_threshold))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        generate_corpus(tmp_dir, args.n_softwares)
+        softwares = Software.list_from_globs(
+            sorted(glob.glob(os.path.join(tmp_dir, "*", "*.c"))))
+        moss.build_index(softwares)
+    index = moss.invert_index
+    index.derive_software_stats()
+    n_pairs = len(index.derive_matching_graph())
+
+    print("{} softwares, {} pairs".format(len(softwares), n_pairs))
+    print("similarity | ranking (s) | per pair (s) | speedup")
+    for similarity in (CountSimilarity(), JaccardSimilarity(),
+                       TfIdfSimilarity()):
+        fast, scores = timeit(partial(ranked, similarity, index),
+                              args.repeat)
+        slow, expected = timeit(partial(per_pair, similarity, index),
+                                args.repeat)
+        assert scores.keys() == expected.keys()
+        assert all(abs(scores[pair] - expected[pair]) < 1e-9
+                   for pair in expected)
+        print("{} | {:.3f} | {:.3f} | {:.1f}".format(
+            similarity.label, fast, slow, slow / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Cost of the Jaccard and TF-IDF similarities with the shared
+`SoftwareStats` table versus the previous per-call computations (the
+active fingerprint count and max tf were recomputed by scanning the whole
+software, making the TF-IDF norm O(F^2) per software).
+
+Synthetic softwares of increasing size F are compared pairwise.
+"""
+import math
+import random
+import time
+
+from locmoss.location import Location
+from locmoss.moss import InvertIndex
+from locmoss.query import JaccardSimilarity, TfIdfSimilarity
+from locmoss.software import Software
+
+
+class ScanningJaccard(JaccardSimilarity):
+    def __call__(self, invert_index, software_1, software_2, shareprints):
+        def count(software):
+            return sum(1 for fp in software.yield_fingerprints()
+                       if not invert_index.is_skipped(fp))
+        n_fp1, n_fp2 = count(software_1), count(software_2)
+        return float(len(shareprints)) / (n_fp1 + n_fp2 - len(shareprints))
+
+
+class ScanningTfIdf(TfIdfSimilarity):
+    def tfidf(self, invert_index, fingerprint, software):
+        max_n_fp = max(count
+                       for fp, count in software.yield_fingerprint_counts()
+                       if not invert_index.is_skipped(fp))
+        tf = .5 + .5 * software.count(fingerprint) / float(max_n_fp)
+        n_softwares = len(invert_index.get_softwares())
+        idf = math.log(n_softwares / float(len(invert_index[fingerprint])))
+        return tf * idf
+
+    def norm(self, invert_index, software):
+        return math.sqrt(sum(self.tfidf(invert_index, fp, software) ** 2
+                             for fp in software.yield_fingerprints()
+                             if not invert_index.is_skipped(fp)))
+
+    def __call__(self, invert_index, software_1, software_2, shareprints):
+        sp = sum(self.tfidf(invert_index, fp, software_1) *
+                 self.tfidf(invert_index, fp, software_2)
+                 for fp in shareprints)
+        return sp / (self.norm(invert_index, software_1) *
+                     self.norm(invert_index, software_2))
+
+
+def build_index(n_softwares, n_fingerprints, seed=0):
+    rng = random.Random(seed)
+    universe = n_fingerprints * 4
+    index = InvertIndex()
+    for i in range(n_softwares):
+        software = Software("s{}".format(i), ["f.c"])
+        for line in range(n_fingerprints):
+            software.add_fingerprint(rng.randrange(universe),
+                                     Location("f.c", line + 1, 1))
+        index.add_software(software)
+    return index
+
+
+def timeit(similarity, index):
+    # A fresh copy of the derived structures for each run
+    index._dirty()
+    graph = index.derive_matching_graph()
+    start = time.perf_counter()
+    for s1, s2, shareprints in graph:
+        similarity(index, s1, s2, shareprints)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n_softwares", type=int, default=6)
+    args = parser.parse_args(argv)
+
+    print("F | jaccard scan (s) | jaccard stats (s) | "
+          "tf-idf scan (s) | tf-idf stats (s)")
+    for n_fingerprints in (100, 200, 400, 800):
+        index = build_index(args.n_softwares, n_fingerprints)
+        times = [timeit(ScanningJaccard(), index),
+                 timeit(JaccardSimilarity(), index),
+                 timeit(ScanningTfIdf(), index),
+                 timeit(TfIdfSimilarity(), index)]
+        print("{} | {}".format(n_fingerprints,
+                               " | ".join("{:.4f}".format(t) for t in times)))
+
+
+if __name__ == '__main__':
+    main()
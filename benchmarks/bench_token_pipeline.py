@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Token pipeline of the fingerprinting of whole files: the token objects
+pipeline (one `Token` and one `Location` per token, one kgram per position,
+as with `Winnower.extract_fingerprints_`) versus the compact one of
+`Winnower.extract_compact_` (parallel arrays from the parser, kgrams and
+locations created for the selected fingerprints only). Both must select the
+same fingerprints.
+
+For each pipeline, the number of objects allocated (per class, per 1k
+tokens), the time and the peak memory (`tracemalloc`) are reported.
+"""
+import glob
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+
+import pygments.lexers
+
+from locmoss.kgram import KGrams, RollingKGrams
+from locmoss.location import Location
+from locmoss.parser import Parser, Token
+from locmoss.winnowing import Winnower
+
+from corpus import generate_corpus
+
+
+COUNTED = (Token, Location, KGrams, RollingKGrams)
+
+
+@contextmanager
+def count_instances(classes=COUNTED):
+    """Count the instances created of each class"""
+    counts = Counter()
+    originals = {cls: cls.__dict__["__init__"] for cls in classes}
+
+    def counting(cls, init):
+        def __init__(self, *args, **kwargs):
+            counts[cls.__name__] += 1
+            init(self, *args, **kwargs)
+        return __init__
+
+    for cls, init in originals.items():
+        cls.__init__ = counting(cls, init)
+    try:
+        yield counts
+    finally:
+        for cls, init in originals.items():
+            cls.__init__ = init
+
+
+def token_objects(winnower, parser_factory, files):
+    return [(location, kgram) for f in files
+            for location, kgram
+            in winnower.extract_fingerprints_(iter(parser_factory(f)))]
+
+
+def compact(winnower, parser_factory, files):
+    return [(Location(f, line, column), kgram) for f in files
+            for kgram, line, column
+            in winnower.extract_compact_(parser_factory(f))]
+
+
+def measure(pipeline, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pipeline()
+        best = min(best, time.perf_counter() - start)
+
+    with count_instances() as counts:
+        pipeline()
+    tracemalloc.start()
+    selected = pipeline()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, counts, peak, selected
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n_softwares", "-n", type=int, default=30)
+    parser.add_argument("--kgram_len", "-k", type=int, default=5)
+    parser.add_argument("--window_size", "-w", type=int, default=15)
+    parser.add_argument("--hashing", choices=("rolling", "sha1"),
+                        default="rolling")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    lexer = pygments.lexers.get_lexer_by_name("c")
+    parser_factory = partial(Parser, lexer=lexer)
+    winnower = Winnower(parser_factory, args.window_size, args.kgram_len,
+                        hashing=args.hashing)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        generate_corpus(tmp_dir, args.n_softwares)
+        files = sorted(glob.glob(os.path.join(tmp_dir, "*", "*.c")))
+        n_tokens = sum(len(parser_factory(f).compact()[0]) for f in files)
+
+        results = []
+        expected = None
+        for name, pipeline in (("tokens", token_objects),
+                               ("compact", compact)):
+            duration, counts, peak, selected = measure(
+                partial(pipeline, winnower, parser_factory, files),
+                args.repeat)
+            selected = [(str(location), int(kgram))
+                        for location, kgram in selected]
+            if expected is None:
+                expected = selected
+            assert selected == expected
+            results.append((name, duration, counts, peak))
+
+    print("{} files, {} tokens, {} selected fingerprints".format(
+        len(files), n_tokens, len(expected)))
+    names = [cls.__name__ for cls in COUNTED]
+    print("pipeline | time (s) | peak (MiB) | " +
+          " | ".join("{} / 1k tokens".format(n) for n in names))
+    for name, duration, counts, peak in results:
+        print("{} | {:.3f} | {:.1f} | ".format(name, duration, peak / 2.**20) +
+              " | ".join("{:.1f}".format(1000. * counts[n] / n_tokens)
+                         for n in names))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Tokenization of whole files: pygments lexers (with `normalize` applied to
+every token) versus the dedicated C, C++, Java and Python tokenizers of
+`FastTokenizer`. Both must produce the same symbols.
+
+Files are taken from the synthetic corpus of `corpus.py` (C), or from any
+glob pattern with `--files` (and `--language`).
+"""
+import glob
+import os
+import tempfile
+import time
+
+import pygments.lexers
+
+from locmoss.parser import Parser
+from locmoss.tokenizer import FastTokenizer
+
+from corpus import generate_corpus
+
+
+def timeit(tokenize, texts, repeat):
+    best = float("inf")
+    symbols = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        symbols = [list(tokenize(text)) for text in texts]
+        best = min(best, time.perf_counter() - start)
+    return best, symbols
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", default=None,
+                        help="Glob pattern of the files to tokenize")
+    parser.add_argument("--language", "-l", default="c")
+    parser.add_argument("--n_softwares", "-n", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pattern = args.files
+        if pattern is None:
+            generate_corpus(tmp_dir, args.n_softwares)
+            pattern = os.path.join(tmp_dir, "*", "*.c")
+        texts = []
+        for fpath in sorted(glob.glob(pattern, recursive=True)):
+            with open(fpath, "r", encoding="latin-1") as hdl:
+                texts.append(hdl.read())
+
+    lexer = pygments.lexers.get_lexer_by_name(args.language)
+    start = time.perf_counter()
+    tokenizer = FastTokenizer.get(lexer)
+    if tokenizer is None:
+        print("'{}' is not supported by FastTokenizer".format(lexer.name))
+        return
+    slow, expected = timeit(lambda text: Parser.iter_pygments(text, lexer),
+                            texts, args.repeat)
+    fast, symbols = timeit(tokenizer, texts, args.repeat)
+    assert symbols == expected
+
+    print("# files | # symbols | pygments (s) | fast (s) | speedup")
+    print("{} | {} | {:.3f} | {:.3f} | {:.1f}".format(
+        len(texts), sum(len(s) for s in symbols), slow, fast, slow / fast))
+
+
+if __name__ == '__main__':
+    main()
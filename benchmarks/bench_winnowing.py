@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the winnowing step: monotonic deque (`Winnower`) versus
+the O(w) per kgram reference implementation (`NaiveWinnower`).
+
+The kgrams are computed beforehand so that only the window minimum
+selection is timed.
+"""
+import random
+import time
+
+from locmoss.kgram import RollingKGrams
+from locmoss.parser import Token
+from locmoss.winnowing import Winnower, NaiveWinnower
+
+
+class PrecomputedWinnower(object):
+    # Mixin replaying precomputed kgrams instead of hashing tokens
+    @property
+    def kgramifier(self):
+        return lambda kgrams, k, hash_bits: kgrams
+
+
+class FastWinnower(PrecomputedWinnower, Winnower):
+    pass
+
+
+class SlowWinnower(PrecomputedWinnower, NaiveWinnower):
+    pass
+
+
+def timeit(winnower, kgrams, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        n = sum(1 for _ in winnower.extract_fingerprints_(kgrams))
+        best = min(best, time.perf_counter() - start)
+    return best, n
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n_tokens", type=int, default=10**5)
+    parser.add_argument("--kgram_len", "-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    tokens = [Token(rng.choice("NSF(){};=+-*"), i)
+              for i in range(args.n_tokens)]
+    kgrams = list(RollingKGrams.kgramify(tokens, args.kgram_len, 64))
+
+    print("window | naive (s) | deque (s) | speedup | # selected")
+    for window_size in (4, 8, 15, 30, 60):
+        slow, n_slow = timeit(SlowWinnower(None, window_size, args.kgram_len),
+                              kgrams, args.repeat)
+        fast, n_fast = timeit(FastWinnower(None, window_size, args.kgram_len),
+                              kgrams, args.repeat)
+        assert n_slow == n_fast
+        print("{:6} | {:9.3f} | {:9.3f} | {:7.1f} | {}"
+              "".format(window_size, slow, fast, slow / fast, n_fast))
+
+
+if __name__ == '__main__':
+    main()
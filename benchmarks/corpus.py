@@ -0,0 +1,205 @@
+"""
+Generation of synthetic corpora for the benchmarks.
+
+Each software is a directory of C files. Every file starts from one of the
+sort programs of `examples/` (the "assignment" seeds, shared by all the
+softwares as in a real course) followed by randomly generated functions.
+A fraction `plagiarism_rate` of the softwares are instead copies of a
+previous (original) software, with identifiers renamed, and a few
+statements and comments inserted.
+"""
+import glob
+import json
+import os
+import random
+import re
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SEEDS = os.path.join(HERE, "..", "examples", "*", "*.c")
+
+KEYWORDS = {"int", "void", "char", "static", "return", "if", "else", "for",
+            "while", "size_t", "include", "sizeof", "const", "double",
+            "float", "unsigned", "long", "NULL", "malloc", "free"}
+
+OPERATORS = ["+", "-", "*", "/", "%", "^", "&", "|", "<<", ">>"]
+COMPARATORS = ["<", ">", "<=", ">=", "==", "!="]
+
+
+def load_seeds(pattern=SEEDS):
+    seeds = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="latin-1") as hdl:
+            seeds.append(hdl.read())
+    if len(seeds) == 0:
+        raise ValueError("No seed found with '{}'".format(pattern))
+    return seeds
+
+
+class CodeGenerator(object):
+    """Random (but syntactically plausible) C functions"""
+    def __init__(self, rng):
+        self.rng = rng
+
+    def name(self, prefix="v"):
+        return "{}{}".format(prefix, self.rng.randrange(10**6))
+
+    def expression(self, variables, depth=0):
+        rng = self.rng
+        if depth > 1 or rng.random() < .4:
+            if rng.random() < .3:
+                return str(rng.randrange(100))
+            return rng.choice(variables)
+        return "({} {} {})".format(self.expression(variables, depth + 1),
+                                   rng.choice(OPERATORS),
+                                   self.expression(variables, depth + 1))
+
+    def statements(self, variables, indent, depth=0):
+        rng = self.rng
+        lines = []
+        for _ in range(rng.randint(2, 5)):
+            kind = rng.random()
+            pad = "  " * indent
+            if kind < .4 or depth > 1:
+                lines.append("{}{} = {};".format(
+                    pad, rng.choice(variables),
+                    self.expression(variables)))
+            elif kind < .6:
+                var = self.name("i")
+                lines.append("{}for (int {v} = 0; {v} < {}; {v}++) {{"
+                             "".format(pad, rng.choice(variables), v=var))
+                lines.extend(self.statements(variables + [var], indent + 1,
+                                             depth + 1))
+                lines.append(pad + "}")
+            elif kind < .8:
+                lines.append("{}if ({} {} {}) {{".format(
+                    pad, rng.choice(variables), rng.choice(COMPARATORS),
+                    self.expression(variables)))
+                lines.extend(self.statements(variables, indent + 1,
+                                             depth + 1))
+                lines.append(pad + "}")
+            else:
+                lines.append("{}while ({} {} {}) {{".format(
+                    pad, rng.choice(variables), rng.choice(COMPARATORS),
+                    rng.randrange(100)))
+                lines.append("{}  {}--;".format(pad, rng.choice(variables)))
+                lines.append(pad + "}")
+        return lines
+
+    def function(self):
+        rng = self.rng
+        params = [self.name("p") for _ in range(rng.randint(1, 3))]
+        local = self.name("x")
+        lines = ["static int {}({}) {{".format(
+            self.name("f"), ", ".join("int " + p for p in params)),
+            "  int {} = {};".format(local, rng.randrange(10))]
+        lines.extend(self.statements(params + [local], 1))
+        lines.append("  return {};".format(local))
+        lines.append("}")
+        return "\n".join(lines)
+
+
+def rename_identifiers(code, rng):
+    mapping = {}
+
+    def rename(match):
+        word = match.group(0)
+        if word in KEYWORDS:
+            return word
+        if word not in mapping:
+            mapping[word] = "{}_{}".format(word[:2], rng.randrange(10**4))
+        return mapping[word]
+
+    return re.sub(r"\b[A-Za-z_][A-Za-z0-9_]*\b", rename, code)
+
+
+def disguise(code, rng, generator):
+    """Light modifications of a plagiarised file"""
+    lines = rename_identifiers(code, rng).split("\n")
+    for _ in range(max(1, len(lines) // 20)):
+        position = rng.randrange(len(lines) + 1)
+        if rng.random() < .5:
+            lines.insert(position, "// " + generator.name("note"))
+        else:
+            lines.insert(position, "\n" + generator.function() + "\n")
+    return "\n".join(lines)
+
+
+def generate_corpus(directory, n_softwares=30, n_files=3, n_functions=10,
+                    plagiarism_rate=.2, seed=0):
+    """
+    Write the corpus in `directory` (one sub-directory per software) and
+    return its description (including the ground truth, i.e. the
+    plagiarised pairs).
+    """
+    rng = random.Random(seed)
+    generator = CodeGenerator(rng)
+    seeds = load_seeds()
+
+    # The copies are drawn beforehand so that their number does not depend
+    # on the luck of the draw (the first software is always an original)
+    n_copies = min(int(round(plagiarism_rate * n_softwares)), n_softwares - 1)
+    copies = set(rng.sample(range(1, n_softwares), max(n_copies, 0)))
+
+    originals = []
+    plagiarisms = []
+    names = []
+    for i in range(n_softwares):
+        name = "software_{:05d}".format(i)
+        names.append(name)
+        soft_dir = os.path.join(directory, name)
+        os.makedirs(soft_dir, exist_ok=True)
+
+        if i in copies:
+            source = rng.choice(originals)
+            plagiarisms.append((source, name))
+            for j in range(n_files):
+                path = os.path.join(directory, source, "file_{}.c".format(j))
+                with open(path, "r", encoding="latin-1") as hdl:
+                    code = disguise(hdl.read(), rng, generator)
+                with open(os.path.join(soft_dir, "file_{}.c".format(j)),
+                          "w", encoding="latin-1") as hdl:
+                    hdl.write(code)
+            continue
+
+        originals.append(name)
+        for j in range(n_files):
+            functions = [generator.function() for _ in range(n_functions)]
+            code = "\n\n".join([rng.choice(seeds)] + functions) + "\n"
+            with open(os.path.join(soft_dir, "file_{}.c".format(j)), "w",
+                      encoding="latin-1") as hdl:
+                hdl.write(code)
+
+    description = {
+        "n_softwares": n_softwares,
+        "n_files": n_files,
+        "n_functions": n_functions,
+        "plagiarism_rate": plagiarism_rate,
+        "seed": seed,
+        "softwares": names,
+        "plagiarisms": plagiarisms,
+    }
+    with open(os.path.join(directory, "corpus.json"), "w") as hdl:
+        json.dump(description, hdl, indent=1)
+    return description
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("directory")
+    parser.add_argument("--n_softwares", "-n", type=int, default=30)
+    parser.add_argument("--n_files", "-m", type=int, default=3)
+    parser.add_argument("--n_functions", type=int, default=10)
+    parser.add_argument("--plagiarism_rate", type=float, default=.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    description = generate_corpus(args.directory, args.n_softwares,
+                                  args.n_files, args.n_functions,
+                                  args.plagiarism_rate, args.seed)
+    print("{} softwares, {} plagiarisms".format(
+        description["n_softwares"], len(description["plagiarisms"])))
+
+
+if __name__ == '__main__':
+    main()
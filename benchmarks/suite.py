@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+"""
+Benchmark suite of the whole pipeline on a synthetic corpus (see
+`corpus.py`).
+
+Each stage is timed separately: tokenisation (`Parser`), kgram hashing
+(`kgramify`), winnowing, `InvertIndex` build, `Filter`, `MatchingGraph`,
+each `Similarity` ranking and the rendering of the reports. The peak
+memory allocated by each stage is measured with `tracemalloc` (which slows
+the stages down: use `--no_memory` for timings only). The number of objects
+(tokens, locations and kgrams) created per 1k tokens by the fingerprinting
+is counted as well.
+
+The results (parameters, commit, timings, memory, and a few results to
+check that runs are comparable) are written as JSON, and can be compared
+with a previous run with `--compare`:
+
+    python benchmarks/suite.py -o before.json
+    (checkout another commit)
+    python benchmarks/suite.py -o after.json --compare before.json
+"""
+import glob
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import partial
+
+import pygments.lexers
+
+from locmoss import MossEngine, Parser, Winnower
+from locmoss.moss import Filter
+from locmoss.query import CountSimilarity, JaccardSimilarity, \
+    TfIdfSimilarity, Ranking, MostSimilar, MatchingSnippets, \
+    TerminalRenderer, JsonRenderer
+from locmoss.query import sparse
+from locmoss.software import Software
+
+from bench_token_pipeline import count_instances
+from corpus import generate_corpus
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Stages(object):
+    """Time (and measure the peak memory of) named stages"""
+    def __init__(self, memory=True, repeat=1):
+        self.memory = memory
+        self.repeat = repeat
+        self.results = {}
+
+    @contextmanager
+    def _measure(self, name):
+        if self.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            peak = None
+            if self.memory:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            previous = self.results.get(name)
+            if previous is None or duration < previous["time"]:
+                self.results[name] = {"time": duration, "peak_memory": peak}
+
+    def run(self, name, fn, *args):
+        """Run `fn(*args)` `repeat` times and return its last result"""
+        result = None
+        for _ in range(self.repeat):
+            with self._measure(name):
+                result = fn(*args)
+        return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=HERE,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(directory, description, args, stages):
+    lexer = pygments.lexers.get_lexer_by_name("c")
+    parser_factory = partial(Parser, lexer=lexer)
+    fingerprinter = Winnower(parser_factory, args.window_size, args.kgram_len)
+    files = sorted(glob.glob(os.path.join(directory, "*", "*.c")))
+
+    # Stages of the fingerprinting, file by file (compact pipeline, see
+    # `Winnower.extract_compact_`)
+    tokens = stages.run("parse", lambda: [parser_factory(f).compact()
+                                          for f in files])
+    kgram_class = fingerprinter.kgram_class
+    fingerprints = stages.run("kgramify", lambda: [
+        list(kgram_class.fingerprints(symbols, args.kgram_len, 64))
+        for symbols, _, _ in tokens])
+    stages.run("winnow", lambda: [list(fingerprinter.winnow(f))
+                                  for f in fingerprints])
+    n_tokens = sum(len(symbols) for symbols, _, _ in tokens)
+    del tokens, fingerprints
+
+    # End to end fingerprinting, then the index
+    def fingerprint():
+        softwares = Software.list_from_globs(
+            [os.path.join(directory, "*", "*.c")])
+        moss = MossEngine(fingerprinter, renderer=TerminalRenderer(
+            output=io.StringIO()))
+        for software in softwares:
+            moss.fingerprint(software)
+        return moss, softwares
+    moss, softwares = stages.run("fingerprint", fingerprint)
+    # Objects created per token by the fingerprinting
+    with count_instances() as counts:
+        fingerprint()
+    allocations = {name: 1000. * count / n_tokens
+                   for name, count in sorted(counts.items())}
+
+    def build_index():
+        moss.invert_index = moss.invert_index.__class__()
+        for software in softwares:
+            moss.update_index(software)
+        return moss.invert_index
+    index = stages.run("index", build_index)
+
+    collision_threshold = Filter(args.collision_threshold)
+    stages.run("filter", lambda: collision_threshold(index))
+
+    def matching_graph():
+        index._dirty()
+        return index.derive_matching_graph()
+    graph = stages.run("matching_graph", matching_graph)
+
+    similarities = [("count", CountSimilarity), ("jaccard", JaccardSimilarity),
+                    ("tfidf", TfIdfSimilarity)]
+    rankings = {}
+    for name, cls in similarities:
+        rankings[name] = stages.run("ranking_" + name,
+                                    Ranking.from_invert_index, cls(), index)
+        if sparse.is_available():
+            stages.run("ranking_{}_vectorized".format(name),
+                       Ranking.from_invert_index, cls(vectorized=True), index)
+
+    main = rankings["tfidf"]
+
+    def render(renderer):
+        with main.top(args.top):
+            renderer(MostSimilar(main, rankings["jaccard"],
+                                 rankings["count"]).stream(index))
+            renderer(MatchingSnippets(main).stream(index))
+
+    stages.run("render_text", lambda: render(TerminalRenderer(
+        output=io.StringIO())))
+    stages.run("render_json", lambda: render(JsonRenderer(
+        output=io.StringIO())))
+
+    # Results, to check that runs are comparable
+    plagiarisms = {frozenset(pair) for pair in description["plagiarisms"]}
+    top = [frozenset((os.path.basename(s1.name), os.path.basename(s2.name)))
+           for _, s1, s2 in main][:max(1, len(plagiarisms))]
+    return {
+        "n_files": len(files),
+        "n_tokens": n_tokens,
+        "allocations_per_1k_tokens": allocations,
+        "n_fingerprints": sum(1 for _ in index.iter_raw()),
+        "n_active_fingerprints": sum(1 for _ in index),
+        "n_pairs": len(graph),
+        # Fraction of the plagiarisms among the first pairs of the ranking
+        "tfidf_recall": (len(plagiarisms & set(top)) / float(len(plagiarisms))
+                         if len(plagiarisms) > 0 else None),
+    }
+
+
+def compare(current, previous):
+    print("stage | time (s) | previous (s) | ratio | peak (MiB) | "
+          "previous (MiB)")
+    for name, stage in current["stages"].items():
+        old = previous["stages"].get(name)
+        if old is None:
+            continue
+
+        def mib(x):
+            return "-" if x is None else "{:.1f}".format(x / 2.**20)
+
+        print("{} | {:.4f} | {:.4f} | {:.2f} | {} | {}".format(
+            name, stage["time"], old["time"],
+            stage["time"] / old["time"] if old["time"] > 0 else float("nan"),
+            mib(stage["peak_memory"]), mib(old["peak_memory"])))
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--n_softwares", "-n", type=int, default=30)
+    parser.add_argument("--n_files", "-m", type=int, default=3)
+    parser.add_argument("--n_functions", type=int, default=10)
+    parser.add_argument("--plagiarism_rate", type=float, default=.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--kgram_len", "-k", type=int, default=5)
+    parser.add_argument("--window_size", "-w", type=int, default=15)
+    parser.add_argument("--collision_threshold", "-c", type=int, default=10)
+    parser.add_argument("--top", "-t", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Keep the best time of that many runs")
+    parser.add_argument("--no_memory", action="store_true",
+                        help="Do not trace the memory (faster)")
+    parser.add_argument("--corpus_dir", default=None,
+                        help="Where to generate the corpus (temporary "
+                             "directory by default)")
+    parser.add_argument("--output", "-o", default=None,
+                        help="Where to write the JSON results (stdout by "
+                             "default)")
+    parser.add_argument("--compare", default=None,
+                        help="JSON results of a previous run to compare to")
+    args = parser.parse_args(argv)
+
+    stages = Stages(not args.no_memory, args.repeat)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = tmp_dir if args.corpus_dir is None else args.corpus_dir
+        description = generate_corpus(directory, args.n_softwares,
+                                      args.n_files, args.n_functions,
+                                      args.plagiarism_rate, args.seed)
+        results = run_suite(directory, description, args, stages)
+
+    params = {k: v for k, v in vars(args).items()
+              if k not in ("output", "compare", "corpus_dir")}
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "n_plagiarisms": len(description["plagiarisms"]),
+        "stages": stages.results,
+        "results": results,
+    }
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, "w") as hdl:
+            json.dump(report, hdl, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as hdl:
+            previous = json.load(hdl)
+        # The measurement options do not change what is computed
+        ignored = ("repeat", "no_memory")
+        if {k: v for k, v in previous.get("params", {}).items()
+                if k not in ignored} != \
+                {k: v for k, v in params.items() if k not in ignored}:
+            print("Warning: the parameters differ", file=sys.stderr)
+        compare(report, previous)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+/* ========================================================================= *
+ * InsertionSort
+ * Implementation of the InsertionSort algorithm.
+ * ========================================================================= */
+
+package insertionsort;
+
+import java.util.Comparator;
+import static java.util.Objects.requireNonNull;
+
+
+public final class Sort {
+
+    private Sort() {}
+
+    /**
+     * Sort an array of integers in place.
+     *
+     * @param array The array to sort
+     */
+    public static void sort(int[] array) {
+        if (array == null)
+            return;
+
+        int j;
+        int tmp;
+        // Invariant: array[0..i] is sorted
+        for (int i = 0; i < array.length; i++) {
+            tmp = array[i];
+            j = i;
+            // Place tmp at the right position
+            while (j > 0 && array[j - 1] > tmp) {
+                array[j] = array[j - 1];
+                j--;
+            }
+            array[j] = tmp;
+        }
+    }
+
+    /**
+     * Sort an array of objects in place.
+     *
+     * @param array      The array to sort
+     * @param comparator The order of the elements
+     */
+    @SuppressWarnings("unchecked")
+    public static <T> void sort(T[] array, Comparator<? super T> comparator) {
+        requireNonNull(comparator, "comparator");
+        for (int i = 1; i < array.length; i++) {
+            final T tmp = array[i];
+            int j = i;
+            while (j > 0 && comparator.compare(array[j - 1], tmp) > 0) {
+                array[j] = array[--j];
+            }
+            array[j] = tmp;
+        }
+    }
+
+    public static void main(String[] args) {
+        int[] array = {5, 0x1F, 3, 0b101, 1_000, 'a', 017};
+        sort(array);
+        StringBuilder builder = new StringBuilder("sorted:\t");
+        for (int value : array)
+            builder.append(value).append(' ');
+        System.out.println(builder.toString().trim() + 1.5e-3f);
+    }
+}
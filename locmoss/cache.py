@@ -0,0 +1,218 @@
+import os
+import pickle
+import tempfile
+from array import array
+from hashlib import sha1
+
+from locmoss.symbols import SymbolTable, symbol_table
+
+
+class FingerprintCache(object):
+    """
+    `FingerprintCache`
+    ==================
+    Persistent on-disk cache of the fingerprints of individual files.
+
+    Entries are keyed by the digest of the file content, the parser
+    signature (lexer, lexing mode) and the fingerprinter signature (kgram
+    length, window size, hash function, etc.), so that a cached entry is
+    never reused with different settings. The
+    least recently used entries are evicted once the total size of the cache
+    exceeds `max_size` bytes.
+
+    Parameters
+    ----------
+    directory: str
+        Where to store the entries. Created if it does not exist.
+    max_size: int (default: 512 MiB)
+        Size cap of the cache, in bytes. `None` for no limit.
+    """
+    __VERSION__ = 2
+    __SUFFIX__ = ".fp"
+
+    def __init__(self, directory, max_size=512 * 2**20):
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __repr__(self):
+        return "{}({}, {})".format(self.__class__.__name__,
+                                   repr(self.directory),
+                                   repr(self.max_size))
+
+    @classmethod
+    def digest(cls, fpath, block_size=2**16):
+        hasher = sha1()
+        with open(fpath, "rb") as hdl:
+            for block in iter(lambda: hdl.read(block_size), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def key(self, fpath, parser_signature, signature):
+        s = repr((self.__VERSION__, self.digest(fpath),
+                  tuple(parser_signature), tuple(signature)))
+        return sha1(s.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.__SUFFIX__)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as hdl:
+                entries = pickle.load(hdl)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entries
+
+    def put(self, key, entries):
+        # Write to a temporary file first so that concurrent processes never
+        # read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as hdl:
+            pickle.dump(entries, hdl, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, self._path(key))
+
+        if self.max_size is not None:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += size
+            if self._size > self.max_size:
+                self.evict()
+
+    def _entries(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.__SUFFIX__):
+                try:
+                    yield entry.path, entry.stat()
+                except OSError:
+                    # Removed by another process in the meantime
+                    pass
+
+    def size(self):
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def __len__(self):
+        return sum(1 for _ in self._entries())
+
+    def evict(self, max_size=None):
+        """Remove the least recently used entries until the cache size is
+        below `max_size` (default: the cache size cap)"""
+        if max_size is None:
+            max_size = self.max_size
+        entries = sorted(self._entries(), key=lambda x: x[1].st_mtime)
+        size = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if size <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= stat.st_size
+        self._size = size
+
+    def clear(self):
+        self.evict(0)
+
+
+class TokenCache(FingerprintCache):
+    """
+    `TokenCache`
+    ============
+    Persistent on-disk cache of the token streams of individual files (see
+    `Parser.compact`). Unlike fingerprints, tokens do not depend on the
+    fingerprinting parameters (kgram length, window size, etc.): files are
+    not lexed again when only those change.
+
+    Entries are keyed by the digest of the file content and the parser
+    signature. The symbols are stored as text together with file-local ids,
+    and interned again when loaded (ids are specific to the process).
+
+    Parameters
+    ----------
+    directory: str
+        Where to store the entries. Created if it does not exist (can be
+        shared with a `FingerprintCache`).
+    max_size: int (default: 512 MiB)
+        Size cap of the cache, in bytes. `None` for no limit.
+    """
+    __SUFFIX__ = ".tk"
+
+    def compact(self, parser):
+        """Same as `parser.compact()`, from the cache if possible"""
+        key = self.key(parser.fpath, parser.signature(), ("tokens",))
+        entry = self.get(key)
+        if entry is not None:
+            symbols, local_ids, lines, columns = entry
+            mapping = symbol_table.encode(symbols)
+            return array("I", [mapping[i] for i in local_ids]), lines, \
+                columns
+
+        symbol_ids, lines, columns = parser.compact()
+        local = SymbolTable()
+        local_ids = array("I", [local.intern(symbol_table[i])
+                                for i in symbol_ids])
+        self.put(key, (local.symbols, local_ids, lines, columns))
+        return symbol_ids, lines, columns
+
+
+class TokenStreams(object):
+    """
+    `TokenStreams`
+    ==============
+    In-memory counterpart of `TokenCache`: the token streams of the files
+    are kept once computed, so that several fingerprinters (e.g. with
+    different kgram lengths) lex each file only once.
+
+    Parameters
+    ----------
+    cache: `TokenCache` or None (default: None)
+        Where to look for the streams before lexing the files
+    """
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.streams = {}
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, repr(self.cache))
+
+    def __len__(self):
+        return len(self.streams)
+
+    def compact(self, parser):
+        """Same as `parser.compact()`, computed once per file"""
+        key = parser.fpath, parser.signature()
+        stream = self.streams.get(key)
+        if stream is None:
+            stream = parser.compact() if self.cache is None \
+                else self.cache.compact(parser)
+            self.streams[key] = stream
+        return stream
+
+    def __getstate__(self):
+        # Ids are specific to the process: the symbols travel with them
+        state = dict(self.__dict__)
+        state["symbols"] = list(symbol_table.symbols)
+        return state
+
+    def __setstate__(self, state):
+        mapping = symbol_table.encode(state.pop("symbols"))
+        streams = {}
+        for key, (symbol_ids, lines, columns) in state["streams"].items():
+            streams[key] = array("I", [mapping[i] for i in symbol_ids]), \
+                lines, columns
+        state["streams"] = streams
+        self.__dict__.update(state)
@@ -1,19 +1,92 @@
 from abc import ABCMeta, abstractmethod
+from collections import Counter
+
+from locmoss.location import Location
 
 
 class Fingerprinter(object, metaclass=ABCMeta):
 
-    def __init__(self, parser_factory):
+    def __init__(self, parser_factory, cache=None):
         self.parser_factory = parser_factory
+        self.cache = cache
+        # Number of parsed files, cached files, lexer guesses, etc.
+        self.stats = Counter()
+
+
+    def signature(self):
+        """
+        Return a tuple of all the parameters (other than the parser) which
+        influence the fingerprints. Used to key the fingerprint cache.
+        """
+        return self.__class__.__name__,
+
+
+    def create_parser(self, source_file, software):
+        parser = self.parser_factory(source_file)
+        if hasattr(parser, "scope"):
+            parser.scope = software.name
+        return parser
+
+
+    def resolve_lexers(self, softwares):
+        """
+        Resolve the lexers of the files of `softwares`, in order, as the
+        serial fingerprinting does. Used before fingerprinting them in other
+        processes: the resolvers of the parsers are then shipped with their
+        decisions, so that the workers use the same lexers and do not guess
+        again.
+        """
+        for software in softwares:
+            for source_file in software:
+                parser = self.create_parser(source_file, software)
+                if getattr(parser, "resolver", None) is None:
+                    # No decision to share (lexer given, or one guess per
+                    # file wherever it is parsed)
+                    continue
+                parser.get_lexer()
+                self.stats["lexer_guesses"] += parser.n_lexer_guesses
 
 
     def extract_fingerprints(self, software):
         for source_file in software:
-            for x in self.extract_fingerprints_(self.parser_factory(source_file)):
-                yield x
+            parser = self.create_parser(source_file, software)
+            if self.cache is None:
+                self.stats["parsed_files"] += 1
+                for kgram, line, column in self.extract_compact_(parser):
+                    yield Location(source_file, line, column), kgram
+            else:
+                for x in self.extract_cached_fingerprints(source_file, parser):
+                    yield x
+            self.stats["lexer_guesses"] += getattr(parser, "n_lexer_guesses", 0)
 
 
+    def extract_cached_fingerprints(self, source_file, parser):
+        key = self.cache.key(source_file, parser.signature(),
+                             self.signature())
+        entries = self.cache.get(key)
+        if entries is None:
+            self.stats["parsed_files"] += 1
+            entries = list(self.extract_compact_(parser))
+            self.cache.put(key, entries)
+        else:
+            self.stats["cached_files"] += 1
+
+        for fingerprint, line, column in entries:
+            yield Location(source_file, line, column), fingerprint
+
+
+
+    def extract_compact_(self, parser):
+        """
+        Yield the triplets (kgram, line, column) of the fingerprints of a
+        file. Subclasses can override it to avoid creating a `Location` for
+        each fingerprint (by default, they come from `extract_fingerprints_`)
+        """
+        for location, kgram in self.extract_fingerprints_(parser):
+            yield kgram, location.start_line, location.start_column
+
 
     @abstractmethod
     def extract_fingerprints_(self, token_iterator):
         raise StopIteration()
+
@@ -1,6 +1,8 @@
 
 from hashlib import sha1
 
+from locmoss.symbols import SymbolTable, symbol_table
+
 
 class Buffer(object):
     def __init__(self, capacity):
@@ -24,25 +26,62 @@ class Buffer(object):
 
 
 class KGrams(object):
+    """
+    `KGrams`
+    ========
+    K-grams hashed with (the last bits of) the sha-1 digest of their text.
+    The symbols are interned in the shared `SymbolTable`: kgrams are
+    compared by their sequence of symbol ids.
+    """
     @classmethod
-    def default_hash_fn(cls, s):
+    def default_hash_fn(cls, s, hash_bits=16):
         hashval = sha1(s.encode("utf-8"))
-        hashval = hashval.hexdigest()[-4:]
-        hashval = int(hashval, 16)  # using last 16 bits of sha-1 digest
+        hashval = hashval.hexdigest()[-(hash_bits // 4):]
+        hashval = int(hashval, 16)  # using last bits of sha-1 digest
         return hashval
 
     @classmethod
-    def kgramify(cls, token_iterator, k=5):
+    def kgramify(cls, token_iterator, k=5, hash_bits=16):
         buffer = Buffer(k)
         for token in token_iterator:
             buffer.put(token)
             if buffer.is_full():
                 tokens = list(buffer)
-                yield tokens[0].location, cls([x.symbol for x in tokens])
+                yield tokens[0].location, cls([x.symbol for x in tokens],
+                                              hash_bits)
+
+    @classmethod
+    def fingerprints(cls, symbol_ids, k=5, hash_bits=16):
+        # Fingerprint of each kgram of the sequence of symbol ids, without
+        # creating the kgrams (see `at`)
+        hash_fn = cls.default_hash_fn
+        symbols = [symbol_table[i] for i in symbol_ids]
+        for start in range(len(symbols) - k + 1):
+            yield hash_fn("".join(symbols[start:start + k]), hash_bits)
 
-    def __init__(self, symbols):
+    @classmethod
+    def at(cls, symbol_ids, start, k=5, hash_bits=16):
+        """The kgram of the sequence of symbol ids starting at `start`"""
+        return cls([symbol_table[i] for i in symbol_ids[start:start + k]],
+                   hash_bits)
+
+    def __init__(self, symbols, hash_bits=16, hash_val=None):
+        symbols = list(symbols)
         self.symbols = ''.join(symbols)
-        self.hash_val = self.__class__.default_hash_fn(self.symbols)
+        self.ids = tuple(symbol_table.encode(symbols))
+        if hash_val is None:
+            hash_val = self.__class__.default_hash_fn(self.symbols, hash_bits)
+        self.hash_val = hash_val
+
+    @property
+    def packed(self):
+        """The symbol ids packed into an integer (see `SymbolTable.pack`)"""
+        return SymbolTable.pack(self.ids)
+
+    def __reduce__(self):
+        # Ids are specific to the process: the symbols are shipped instead
+        return self.__class__, ([symbol_table[i] for i in self.ids], None,
+                                self.hash_val)
 
     def __len__(self):
         return len(self.symbols)
@@ -50,8 +89,12 @@ class KGrams(object):
     def __hash__(self):
         return self.hash_val
 
+    def __int__(self):
+        # The fingerprint
+        return self.hash_val
+
     def __eq__(self, other):
-        return isinstance(other, KGrams) and other.symbols == self.symbols
+        return isinstance(other, KGrams) and other.ids == self.ids
 
     def __str__(self):
         return self.symbols
@@ -59,3 +102,165 @@ class KGrams(object):
     def __repr__(self):
         return "{}({})".format(self.__class__.__name__,
                                repr(self.symbols))
+
+
+
+class RollingKGrams(object):
+    """
+    `RollingKGrams`
+    ===============
+    K-grams hashed with a Karp-Rabin rolling hash (as in the original
+    winnowing paper). Each symbol is mapped to an integer code and the hash
+    of the next k-gram is derived from the previous one in O(1).
+
+    K-grams keep a reference to the sequence of symbol ids of their file
+    (see `SymbolTable`) rather than their own symbols, until needed (e.g. by
+    a report). Their text is decoded on demand.
+
+    The fingerprint (`hash_val`) is made of the last `hash_bits` bits of the
+    rolling hash. Since the latter is computed modulo a 61-bit prime,
+    fingerprints are at most 61-bit wide.
+    """
+    __slots__ = ("rolling_hash", "hash_val", "_ids", "_start", "_k")
+
+    MODULUS = (1 << 61) - 1  # Mersenne prime
+    BASE = 0x5bd1e995
+
+    # Code of each symbol id of the shared symbol table
+    _codes = []
+
+    @classmethod
+    def codes(cls):
+        # Extends the codes with the symbols interned since the last call.
+        # Unlike ids, codes must not depend on the process so that
+        # fingerprints can be computed in parallel or cached.
+        codes = cls._codes
+        for symbol in symbol_table.symbols[len(codes):]:
+            codes.append(int.from_bytes(sha1(symbol.encode("utf-8"))
+                                        .digest()[:8], "big") % cls.MODULUS)
+        return codes
+
+    @classmethod
+    def symbol_entry(cls, symbol):
+        # Returns the id of `symbol` together with its integer code
+        symbol_id = symbol_table.intern(symbol)
+        return symbol_id, cls.codes()[symbol_id]
+
+    @classmethod
+    def kgramify(cls, token_iterator, k=5, hash_bits=16):
+        mask = (1 << hash_bits) - 1
+        modulus, base = cls.MODULUS, cls.BASE
+        base_k = pow(base, k, modulus)
+        intern, code_table = symbol_table.intern, cls.codes()
+
+        symbol_ids = []
+        codes = [0] * k
+        locations = [None] * k
+        hash_val = 0
+        for i, token in enumerate(token_iterator):
+            symbol_id = intern(token.symbol)
+            if symbol_id >= len(code_table):
+                cls.codes()
+            code = code_table[symbol_id]
+            j = i % k
+            # Add the new symbol and remove the one which was k steps before
+            hash_val = (hash_val * base + code - codes[j] * base_k) % modulus
+            codes[j] = code
+            locations[j] = token.location
+            symbol_ids.append(symbol_id)
+            if i >= k - 1:
+                start = i - k + 1
+                yield locations[start % k], cls(hash_val, hash_val & mask,
+                                                symbol_ids, start, k)
+
+    @classmethod
+    def fingerprints(cls, symbol_ids, k=5, hash_bits=16):
+        # Same rolling hash as `kgramify`, but only the fingerprints are
+        # produced: the kgrams are created on demand with `at`
+        mask = (1 << hash_bits) - 1
+        modulus, base = cls.MODULUS, cls.BASE
+        base_k = pow(base, k, modulus)
+        code_table = cls.codes()
+
+        codes = [0] * k
+        hash_val = 0
+        for i, symbol_id in enumerate(symbol_ids):
+            code = code_table[symbol_id]
+            j = i % k
+            hash_val = (hash_val * base + code - codes[j] * base_k) % modulus
+            codes[j] = code
+            if i >= k - 1:
+                yield hash_val & mask
+
+    @classmethod
+    def at(cls, symbol_ids, start, k=5, hash_bits=16):
+        """
+        The kgram of the sequence of symbol ids starting at `start` (the
+        rolling hash is recomputed from its k symbols, in O(k))
+        """
+        modulus, base = cls.MODULUS, cls.BASE
+        code_table = cls.codes()
+        hash_val = 0
+        for symbol_id in symbol_ids[start:start + k]:
+            hash_val = (hash_val * base + code_table[symbol_id]) % modulus
+        return cls(hash_val, hash_val & ((1 << hash_bits) - 1), symbol_ids,
+                   start, k)
+
+    @classmethod
+    def from_symbols(cls, rolling_hash, hash_val, symbols):
+        symbol_ids = tuple(symbol_table.encode(symbols))
+        return cls(rolling_hash, hash_val, symbol_ids, 0, len(symbol_ids))
+
+    def __init__(self, rolling_hash, hash_val, symbol_ids, start, k):
+        self.rolling_hash = rolling_hash
+        self.hash_val = hash_val
+        self._ids = symbol_ids
+        self._start = start
+        self._k = k
+
+    @property
+    def ids(self):
+        ids = self._ids
+        if type(ids) is not tuple:
+            # Releases the sequence of the file
+            ids = self._ids = tuple(ids[self._start:self._start + self._k])
+            self._start = 0
+        return ids
+
+    @property
+    def symbols(self):
+        return symbol_table.decode(self.ids)
+
+    @property
+    def packed(self):
+        """The symbol ids packed into an integer (see `SymbolTable.pack`)"""
+        return SymbolTable.pack(self.ids)
+
+    def __reduce__(self):
+        # Ids are specific to the process: only the symbols of the kgram are
+        # shipped (not the whole sequence of the file)
+        return self.__class__.from_symbols, (
+            self.rolling_hash, self.hash_val,
+            [symbol_table[i] for i in self.ids])
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __hash__(self):
+        return self.hash_val
+
+    def __int__(self):
+        # The fingerprint
+        return self.hash_val
+
+    def __eq__(self, other):
+        return isinstance(other, RollingKGrams) and \
+               other.rolling_hash == self.rolling_hash
+
+    def __str__(self):
+        return self.symbols
+
+    def __repr__(self):
+        return "{}({}, {})".format(self.__class__.__name__,
+                                   repr(self.rolling_hash),
+                                   repr(self.symbols))
@@ -1,5 +1,11 @@
+from bisect import bisect_left
+from collections import OrderedDict
+
+
 
 class Location(object):
+    __slots__ = ("source_file", "start_line", "start_column")
+
     def __init__(self, source_file, start_line, start_column):
         self.source_file = source_file
         self.start_line = start_line
@@ -15,21 +21,150 @@ class Location(object):
                                        repr(self.start_column))
 
 
-class LocationIterator(object):
-    def __init__(self, pre_lines=0, post_lines=0, encoding="latin-1"):
+class SnippetService(object):
+    """
+    `SnippetService`
+    ================
+    Serve the lines surrounding locations. Each file is read once and kept
+    (as a list of lines) in a LRU cache, so that snippets are obtained by
+    slicing instead of rescanning the file.
+
+    Parameters
+    ----------
+    pre_lines: int (default: 0)
+        Number of lines before the location
+    post_lines: int (default: 0)
+        Number of lines after the location
+    encoding: str (default: "latin-1")
+        Encoding of the files
+    max_size: int (default: 64 MiB)
+        Approximate bound (in characters) on the size of the cached files.
+        The least recently used files are evicted first. The file being
+        served is always kept.
+    """
+    def __init__(self, pre_lines=0, post_lines=0, encoding="latin-1",
+                 max_size=64 * 2**20):
         self.pre_lines = pre_lines
         self.post_lines = post_lines
         self.encoding = encoding
+        self.max_size = max_size
+        self.files = OrderedDict()
+        # Positions of the tokens of (some of) the cached files (see `span`)
+        self.positions = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "{}({}, {}, {}, {})".format(self.__class__.__name__,
+                                           repr(self.pre_lines),
+                                           repr(self.post_lines),
+                                           repr(self.encoding),
+                                           repr(self.max_size))
+
+    @classmethod
+    def _sizeof(cls, lines):
+        return sum(len(line) + 1 for line in lines)
+
+    def lines(self, source_file):
+        """The (right-stripped) lines of the file"""
+        lines = self.files.get(source_file)
+        if lines is not None:
+            self.hits += 1
+            self.files.move_to_end(source_file)
+            return lines
+
+        self.misses += 1
+        with open(source_file, "r", encoding=self.encoding) as hdl:
+            lines = [line.rstrip() for line in hdl]
+        self.files[source_file] = lines
+        self.size += self._sizeof(lines)
+        while self.size > self.max_size and len(self.files) > 1:
+            evicted_file, evicted = self.files.popitem(last=False)
+            self.size -= self._sizeof(evicted)
+            self.positions.pop(evicted_file, None)
+        return lines
 
+    def token_positions(self, source_file, tokenize):
+        """
+        The sorted (line, column) of the tokens of the file, as given by
+        `tokenize`, which returns the arrays (symbol ids, lines, columns) of
+        the file (e.g. `Parser.compact`). Kept as long as the file is cached.
+        """
+        positions = self.positions.get(source_file)
+        if positions is None:
+            _, lines, columns = tokenize()
+            positions = list(zip(lines, columns))
+            # Registers the file in the cache (so that both are evicted
+            # together)
+            self.lines(source_file)
+            self.positions[source_file] = positions
+        return positions
+
+    def span(self, location, k, tokenize):
+        """
+        The range covered by the `k` tokens starting at `location`, as a pair
+        ((line, column), (line, column)) whose end is the position of the
+        next token (excluded), or None if the kgram ends the file. Return
+        None if no token starts at `location` (see `token_positions`).
+        """
+        positions = self.token_positions(location.source_file, tokenize)
+        start = location.start_line, location.start_column
+        i = bisect_left(positions, start)
+        if i == len(positions) or positions[i] != start:
+            return None
+        end = positions[i + k] if i + k < len(positions) else None
+        return start, end
+
+    def window(self, location):
+        """The range [first, last] of line numbers around the location"""
+        first = max(1, location.start_line - self.pre_lines)
+        last = location.start_line + self.post_lines
+        return first, last
+
+    def serve(self, source_file, first, last):
+        """Yield the pairs (line number, line) from `first` to `last`
+        (included)"""
+        lines = self.lines(source_file)
+        for i, line in enumerate(lines[first - 1:last]):
+            yield first + i, line
 
     def __call__(self, location):
-        # TODO do something more efficient
-        pre = max(1, location.start_line - self.pre_lines)
-        post = location.start_line + self.post_lines
-        with open(location.source_file, "r", encoding=self.encoding) as hdl:
-            for i, line in enumerate(hdl):
-                line_nb = i + 1
-                if line_nb > post:
-                    break
-                if pre < line_nb:
-                    yield line_nb, line.rstrip()
\ No newline at end of file
+        first, last = self.window(location)
+        return self.serve(location.source_file, first, last)
+
+    def merge(self, locations):
+        """
+        Group the locations whose windows overlap (or touch) within a file.
+
+        Return
+        ------
+        A list of triplets (source_file, locations, (first, last)), in order
+        of appearance of the files
+        """
+        by_file = OrderedDict()
+        for location in locations:
+            by_file.setdefault(location.source_file, []).append(location)
+
+        merged = []
+        for source_file, file_locations in by_file.items():
+            group, first, last = [], None, None
+            for location in sorted(file_locations,
+                                   key=lambda l: (l.start_line,
+                                                  l.start_column)):
+                start, end = self.window(location)
+                if group and start <= last + 1:
+                    group.append(location)
+                    last = max(last, end)
+                    continue
+                if group:
+                    merged.append((source_file, group, (first, last)))
+                group, first, last = [location], start, end
+            if group:
+                merged.append((source_file, group, (first, last)))
+        return merged
+
+
+class LocationIterator(SnippetService):
+    # Kept for backward compatibility, see `SnippetService`
+    pass
@@ -0,0 +1,107 @@
+import random
+from collections import defaultdict
+from itertools import combinations
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+class MinHashLSH(object):
+    """
+    `MinHashLSH`
+    ============
+    Candidate generation by locality sensitive hashing: each software is
+    summarised by a MinHash signature of its active fingerprints, which is
+    cut into `n_bands` bands of `n_rows` values. Two softwares are
+    candidates if they agree on at least one band, which happens with
+    probability 1 - (1 - J^n_rows)^n_bands for a Jaccard index J.
+
+    More bands (or fewer rows) increase the recall at the expense of more
+    candidate pairs. The Jaccard index at which a pair has a probability of
+    about 1/2 to be a candidate is given by `threshold`.
+
+    Signatures are computed with numpy if it is available.
+
+    Parameters
+    ----------
+    n_bands: int (default: 32)
+        Number of bands
+    n_rows: int (default: 4)
+        Number of MinHash values per band
+    seed: int (default: 0)
+        Seed of the hash functions
+    """
+    PRIME = 2**31 - 1
+
+    def __init__(self, n_bands=32, n_rows=4, seed=0):
+        if n_bands < 1 or n_rows < 1:
+            raise ValueError("The number of bands and rows must be positive")
+        self.n_bands = n_bands
+        self.n_rows = n_rows
+        self.seed = seed
+        rng = random.Random(seed)
+        n_hashes = n_bands * n_rows
+        self.a = [rng.randrange(1, self.PRIME) for _ in range(n_hashes)]
+        self.b = [rng.randrange(0, self.PRIME) for _ in range(n_hashes)]
+
+    def __repr__(self):
+        return "{}({}, {}, {})".format(self.__class__.__name__,
+                                       repr(self.n_bands),
+                                       repr(self.n_rows),
+                                       repr(self.seed))
+
+    @property
+    def threshold(self):
+        return (1. / self.n_bands) ** (1. / self.n_rows)
+
+    def signature(self, fingerprints):
+        """
+        MinHash signature (tuple of `n_bands * n_rows` ints) of a non-empty
+        collection of fingerprints
+        """
+        prime = self.PRIME
+        if np is not None:
+            # Products stay below 2**62: no overflow
+            x = np.fromiter((fp % prime for fp in fingerprints),
+                            dtype=np.uint64)
+            a = np.array(self.a, dtype=np.uint64)[:, None]
+            b = np.array(self.b, dtype=np.uint64)[:, None]
+            return tuple(((a * x + b) % np.uint64(prime)).min(axis=1)
+                         .tolist())
+        xs = [fp % prime for fp in fingerprints]
+        return tuple(min((a * x + b) % prime for x in xs)
+                     for a, b in zip(self.a, self.b))
+
+    def signatures(self, invert_index):
+        """Yield the pairs (software, signature) of the softwares with at
+        least one active fingerprint"""
+        for software in invert_index.get_softwares():
+            fingerprints = [fp for fp in software.yield_fingerprints()
+                            if not invert_index.is_skipped(fp)]
+            if len(fingerprints) > 0:
+                yield software, self.signature(fingerprints)
+
+    def candidates(self, invert_index):
+        """
+        Return the list of candidate pairs (software_1, software_2), with
+        software_1 preceding software_2 in `invert_index.get_softwares()`
+        """
+        buckets = defaultdict(list)
+        softwares = []
+        for idx, (software, signature) in \
+                enumerate(self.signatures(invert_index)):
+            softwares.append(software)
+            for band in range(self.n_bands):
+                start = band * self.n_rows
+                key = band, signature[start:start + self.n_rows]
+                buckets[key].append(idx)
+
+        pairs = set()
+        for indices in buckets.values():
+            pairs.update(combinations(indices, 2))
+        return [(softwares[i], softwares[j]) for i, j in sorted(pairs)]
+
+    def __call__(self, invert_index):
+        return self.candidates(invert_index)
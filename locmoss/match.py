@@ -1,27 +1,122 @@
 from collections import defaultdict
+from itertools import combinations
+
+
+class SharePrints(object):
+    """
+    `SharePrints`
+    =============
+    The active fingerprints shared by a pair of softwares. Only the count is
+    stored by the `MatchingGraph`; the fingerprints themselves are
+    materialised (by intersecting the fingerprints of both softwares) the
+    first time they are iterated over.
+    """
+    __slots__ = ("invert_index", "software_1", "software_2", "count",
+                 "_fingerprints")
+
+    def __init__(self, invert_index, software_1, software_2, count):
+        self.invert_index = invert_index
+        self.software_1 = software_1
+        self.software_2 = software_2
+        self.count = count
+        self._fingerprints = None
+
+    @property
+    def fingerprints(self):
+        if self._fingerprints is None:
+            self._fingerprints = frozenset(self.invert_index.shareprints(
+                self.software_1, self.software_2))
+        return self._fingerprints
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        # Sorted so that reports do not depend on the hashing of the set
+        return iter(sorted(self.fingerprints))
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self.fingerprints
+
+    def __repr__(self):
+        return "{}({}, {}, {})".format(self.__class__.__name__,
+                                       repr(self.software_1),
+                                       repr(self.software_2),
+                                       repr(self.count))
 
 
 class MatchingGraph(object):
+    """
+    `MatchingGraph`
+    ===============
+    Pairs of softwares sharing at least one (active) fingerprint, together
+    with the number of fingerprints they share. Pairs are encoded as
+    integers and only their counts are held in memory (see `SharePrints`).
+
+    Pairs are oriented, and iterated over, by the names of their softwares,
+    whether the graph was derived at once or patched afterwards.
+    """
     @classmethod
     def from_invert_index(cls, invert_index):
-        softwares = invert_index.get_softwares()
-        graph = cls()
-        for s1 in softwares:
-            for fingerprint in s1.yield_fingerprints():
-                matching_software = invert_index[fingerprint]
-                for s2 in matching_software:
-                    if s1.name < s2.name:
-                        # No need to count self matches
-                        # and symetry is taken care of by the graph
-                        graph.add_match(s1, s2, fingerprint)
-
+        graph = cls(invert_index)
+        # Indices follow the name ordering of the softwares
+        for software in invert_index.get_softwares():
+            graph._idx(software)
+
+        candidates = invert_index.derive_candidates()
+        if candidates is not None:
+            return graph._count_candidates(candidates)
+
+        counts = defaultdict(int)
+        # Each fingerprint is visited once, and each of its pairs counted
+        # once (no self matches)
+        for fingerprint, softwares in invert_index:
+            indices = sorted(graph.n2i[s.name] for s in softwares)
+            for idx_a, idx_b in combinations(indices, 2):
+                counts[cls._code(idx_a, idx_b)] += 1
+
+        graph.counts = dict(sorted(counts.items()))
         return graph
 
-
-    def __init__(self):
+    def _count_candidates(self, candidates):
+        # Only the candidate pairs are scored, by intersecting their active
+        # fingerprints
+        invert_index = self.invert_index
+        active = {}
+
+        def active_fingerprints(software):
+            fingerprints = active.get(software)
+            if fingerprints is None:
+                fingerprints = frozenset(
+                    fp for fp in software.yield_fingerprints()
+                    if not invert_index.is_skipped(fp))
+                active[software] = fingerprints
+            return fingerprints
+
+        counts = {}
+        for s1, s2 in candidates:
+            count = len(active_fingerprints(s1) & active_fingerprints(s2))
+            if count > 0:
+                counts[self._key(s1, s2)] = count
+        self.counts = dict(sorted(counts.items()))
+        return self
+
+
+    def __init__(self, invert_index=None):
+        self.invert_index = invert_index
         self.i2s = []
         self.n2i = {}
-        self.shareprints = defaultdict(set)
+        self.counts = {}
+        # Whether pairs were added since the counts were last sorted
+        self._unsorted = False
+
+    @classmethod
+    def _code(cls, idx_a, idx_b):
+        return (idx_a << 32) | idx_b
+
+    @classmethod
+    def _decode(cls, code):
+        return code >> 32, code & 0xFFFFFFFF
 
     def _idx(self, int_or_software):
         try:
@@ -35,30 +130,122 @@ class MatchingGraph(object):
                 self.i2s.append(software)
             return idx
 
+    def _find(self, int_or_software):
+        # Like `_idx` but without registering unknown softwares
+        try:
+            return int(int_or_software)
+        except TypeError:
+            return self.n2i.get(int_or_software.name)
 
-    def add_match(self, s1, s2, fingerprint):
-        idx1 = self._idx(s1)
-        idx2 = self._idx(s2)
-        idx_a, idx_b = (idx1, idx2) if idx1 < idx2 else (idx2, idx1)
+    def _key(self, s1, s2, register=False):
+        get = self._idx if register else self._find
+        idx1, idx2 = get(s1), get(s2)
+        if idx1 is None or idx2 is None:
+            return None
+        # Softwares registered by patches do not follow the name ordering
+        i2s = self.i2s
+        return self._code(idx1, idx2) if i2s[idx1].name < i2s[idx2].name \
+            else self._code(idx2, idx1)
+
+    def _sorted_counts(self):
+        if self._unsorted:
+            i2s = self.i2s
+
+            def names(item):
+                idx_a, idx_b = self._decode(item[0])
+                return i2s[idx_a].name, i2s[idx_b].name
 
-        self.shareprints[(idx_a, idx_b)].add(fingerprint)
+            self.counts = dict(sorted(self.counts.items(), key=names))
+            self._unsorted = False
+        return self.counts
+
+
+    def add_match(self, s1, s2, fingerprint):
+        """Record that the pair (s1, s2) shares one more fingerprint"""
+        key = self._key(s1, s2, register=True)
+        count = self.counts.get(key)
+        if count is None:
+            self._unsorted = True
+            count = 0
+        self.counts[key] = count + 1
+
+    def remove_match(self, s1, s2, fingerprint):
+        """Record that the pair (s1, s2) shares one fingerprint less. Return
+        whether the pair was in the graph"""
+        key = self._key(s1, s2)
+        count = self.counts.get(key)
+        if count is None:
+            return False
+        if count <= 1:
+            del self.counts[key]
+        else:
+            self.counts[key] = count - 1
+        return True
+
+    def remove_software(self, software):
+        """Remove all the pairs involving the software and return them"""
+        idx = self.n2i.pop(software.name, None)
+        if idx is None:
+            return []
+        removed = []
+        for key in list(self.counts):
+            if idx in self._decode(key):
+                del self.counts[key]
+                idx_a, idx_b = self._decode(key)
+                removed.append((self.i2s[idx_a], self.i2s[idx_b]))
+        # The index is not reused: a software with the same name will get
+        # a new one
+        self.i2s[idx] = None
+        return removed
 
     def software_from_name(self, name):
         return self.i2s[self.n2i[name]]
 
+    def _shareprints(self, idx_a, idx_b, count):
+        return SharePrints(self.invert_index, self.i2s[idx_a],
+                           self.i2s[idx_b], count)
+
     def __iter__(self):
-        for (idx1, idx2), fingerprint in self.shareprints.items():
-            yield self.i2s[idx1], self.i2s[idx2], fingerprint
+        for code, count in self._sorted_counts().items():
+            idx1, idx2 = self._decode(code)
+            yield self.i2s[idx1], self.i2s[idx2], \
+                self._shareprints(idx1, idx2, count)
+
+    def accumulate(self, weight):
+        """
+        Yield the triplets (software_1, software_2, sum) of the pairs of the
+        graph, where the sum is that of `weight(fingerprint, software_1) *
+        weight(fingerprint, software_2)` over the fingerprints they share.
+        All the pairs are computed in a single pass over the postings, as
+        the counts are, instead of materialising their shareprints.
+        """
+        n2i = self.n2i
+        counts = self._sorted_counts()
+        sums = defaultdict(float)
+        for fingerprint, softwares in self.invert_index:
+            weights = sorted((s.name, n2i[s.name], weight(fingerprint, s))
+                             for s in softwares if s.name in n2i)
+            for (_, idx_a, w_a), (_, idx_b, w_b) in combinations(weights, 2):
+                code = self._code(idx_a, idx_b)
+                if code in counts:
+                    sums[code] += w_a * w_b
+
+        for code in counts:
+            idx1, idx2 = self._decode(code)
+            yield self.i2s[idx1], self.i2s[idx2], sums[code]
+
+    def count(self, s1, s2):
+        """Number of fingerprints shared by the two softwares"""
+        return self.counts.get(self._key(s1, s2), 0)
 
     def __getitem__(self, item):
-        idx1, idx2 = item
-        idx1, idx2 = self._idx(idx1), self._idx(idx2)
-
-        idx_a, idx_b = (idx1, idx2) if idx1 < idx2 else (idx2, idx1)
-
-        return self.shareprints.get((idx_a, idx_b))
+        key = self._key(*item)
+        count = self.counts.get(key)
+        if count is None:
+            return None
+        return self._shareprints(*self._decode(key), count)
 
     def __len__(self):
-        return len(self.shareprints)
+        return len(self.counts)
 
 
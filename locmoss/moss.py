@@ -1,9 +1,15 @@
+import os
 from collections import defaultdict
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
 
 from locmoss.query import TerminalRenderer
 
 from locmoss.match import MatchingGraph
+from locmoss.stats import SoftwareStats
+from locmoss.query.query import Query
 from locmoss.query.report import Report
+from locmoss.reference import ReferenceFilter
 
 
 class InvertIndex(object):
@@ -12,37 +18,74 @@ class InvertIndex(object):
     =============
     Mapping fingerprints to softwares.
 
-    Content is not supposed to be directly altered (use `add` and `invalidate`)
+    Content is not supposed to be directly altered (use `add`, `invalidate`,
+    `add_softwares` and `remove_softwares`).
+
+    Skipped fingerprints are either those of the reference (`skips`), which
+    are never indexed, or those invalidated by a filter (`filtered`), whose
+    postings are still maintained so that they can be revalidated.
+
+    If a `candidate_generator` (e.g. `locmoss.lsh.MinHashLSH`) is set, only
+    the pairs of softwares it yields are considered by the matching graph
+    and the rankings.
     """
-    def __init__(self):
+    def __init__(self, candidate_generator=None):
         self.hash_t = defaultdict(set)
         self.skips = set()
+        self.filtered = set()
+        self.candidate_generator = candidate_generator
         self._matching_graph = None
+        self._software_stats = None
+        self._candidates = None
         self._softwares = None
 
     def _dirty(self):
         self._matching_graph = None
+        self._software_stats = None
+        self._candidates = None
         self._softwares = None
 
     def add(self, fingerprint, software, skip=False):
         self._dirty()
+        self._add(fingerprint, software, skip)
+
+    def _add(self, fingerprint, software, skip=False):
         if skip:
             self.skips.add(fingerprint)
         if fingerprint not in self.skips:
             self.hash_t[fingerprint].add(software)
+            return True
+        return False
+
+    def add_software(self, software, skip=False):
+        """Add all the fingerprints of `software` (invalidating the derived
+        structures once)"""
+        self._dirty()
+        for fp in software.yield_fingerprints():
+            self._add(fp, software, skip)
 
     def invalidate(self, fingerprint):
         self._dirty()
-        self.skips.add(fingerprint)
+        self.filtered.add(fingerprint)
+
+    def revalidate(self, fingerprint):
+        self._dirty()
+        self.filtered.discard(fingerprint)
+
+    def count_softwares(self, fingerprint):
+        """Number of softwares containing the fingerprint, regardless of
+        whether it is skipped"""
+        postings = self.hash_t.get(fingerprint)
+        return 0 if postings is None else len(postings)
 
     def __getitem__(self, fingerprint):
-        if fingerprint in self.skips:
+        if self.is_skipped(fingerprint):
             return frozenset()
         return self.hash_t[fingerprint]
 
     def __iter__(self):
         for fp, sw in self.hash_t.items():
-            if fp not in self.skips:
+            if not self.is_skipped(fp):
                 yield fp, sw
 
     def iter_raw(self):
@@ -50,7 +93,123 @@ class InvertIndex(object):
             yield fp, sw
 
     def is_skipped(self, fingerprint):
-        return fingerprint in self.skips
+        return fingerprint in self.skips or fingerprint in self.filtered
+
+    # ------------------------------ Incremental ----------------------------- #
+    def _refilter(self, filter, fingerprints):
+        update = getattr(filter, "update", None)
+        if update is None:
+            return set(), set()
+        return update(self, fingerprints)
+
+    def add_softwares(self, softwares, filter=None):
+        """
+        Add (fingerprinted) softwares to the index. The `filter` is only
+        re-evaluated for the fingerprints of those softwares, and the
+        matching graph (if already derived) is patched instead of being
+        rebuilt.
+
+        Return
+        ------
+        affected: set of frozenset or None
+            The pairs of softwares whose shareprints changed (None if unknown,
+            i.e. if the graph was not derived or depends on the candidate
+            generator)
+        changed: set of `Software`
+            The softwares whose active fingerprints changed
+        """
+        graph = self._patchable_graph()
+        new = set(softwares)
+        was_active = {}
+        for software in softwares:
+            for fp in software.yield_fingerprints():
+                if fp not in was_active:
+                    was_active[fp] = not self.is_skipped(fp)
+                if not self._add(fp, software):
+                    del was_active[fp]
+        self._refilter(filter, was_active)
+        self._dirty()
+
+        affected, changed = set(), set(new)
+        if graph is None:
+            return None, changed
+
+        for fp, before in was_active.items():
+            postings = self.hash_t[fp]
+            after = not self.is_skipped(fp)
+            if before and after:
+                # Only the pairs involving a new software
+                pairs = [(s1, s2) for s1, s2 in combinations(postings, 2)
+                         if s1 in new or s2 in new]
+                self._link(graph, fp, pairs, affected)
+            elif before:
+                old = [s for s in postings if s not in new]
+                self._unlink(graph, fp, combinations(old, 2), affected)
+                changed.update(postings)
+            elif after:
+                self._link(graph, fp, combinations(postings, 2), affected)
+                changed.update(postings)
+
+        self._matching_graph = graph
+        return affected, changed
+
+    def remove_softwares(self, softwares, filter=None):
+        """
+        Remove softwares from the index. See `add_softwares`.
+        """
+        graph = self._patchable_graph()
+        was_active = {}
+        for software in softwares:
+            for fp in software.yield_fingerprints():
+                postings = self.hash_t.get(fp)
+                if postings is None or software not in postings:
+                    continue
+                postings.discard(software)
+                if len(postings) == 0:
+                    del self.hash_t[fp]
+                    self.filtered.discard(fp)
+                    was_active.pop(fp, None)
+                elif fp not in was_active:
+                    was_active[fp] = not self.is_skipped(fp)
+        self._refilter(filter, was_active)
+        self._dirty()
+
+        affected, changed = set(), set()
+        if graph is None:
+            return None, changed
+
+        for software in softwares:
+            for s1, s2 in graph.remove_software(software):
+                affected.add(frozenset((s1, s2)))
+
+        for fp, before in was_active.items():
+            postings = self.hash_t[fp]
+            after = not self.is_skipped(fp)
+            if before and not after:
+                self._unlink(graph, fp, combinations(postings, 2), affected)
+                changed.update(postings)
+            elif after and not before:
+                self._link(graph, fp, combinations(postings, 2), affected)
+                changed.update(postings)
+
+        self._matching_graph = graph
+        return affected, changed
+
+    def _patchable_graph(self):
+        # Candidates may change with the softwares: the graph is rebuilt
+        if self.candidate_generator is not None:
+            return None
+        return self._matching_graph
+
+    def _link(self, graph, fingerprint, pairs, affected):
+        for s1, s2 in pairs:
+            graph.add_match(s1, s2, fingerprint)
+            affected.add(frozenset((s1, s2)))
+
+    def _unlink(self, graph, fingerprint, pairs, affected):
+        for s1, s2 in pairs:
+            if graph.remove_match(s1, s2, fingerprint):
+                affected.add(frozenset((s1, s2)))
 
 
     def get_softwares(self):
@@ -58,7 +217,8 @@ class InvertIndex(object):
             all_soft = set()
             for softwares in self.hash_t.values():
                 all_soft.update(softwares)
-            self._softwares = all_soft
+            # Sorted so that reports do not depend on memory addresses
+            self._softwares = sorted(all_soft, key=lambda s: s.name)
         return self._softwares
 
 
@@ -67,6 +227,42 @@ class InvertIndex(object):
             self._matching_graph = MatchingGraph.from_invert_index(self)
         return self._matching_graph
 
+    def derive_candidates(self):
+        """The candidate pairs of softwares, or None if all the pairs are
+        considered"""
+        if self.candidate_generator is None:
+            return None
+        if self._candidates is None:
+            self._candidates = self.candidate_generator(self)
+        return self._candidates
+
+    def shareprints(self, software_1, software_2):
+        """The (sorted) active fingerprints shared by the two softwares"""
+        fingerprints = set(software_1.yield_fingerprints())
+        return [fp for fp in software_2.yield_fingerprints()
+                if fp in fingerprints and not self.is_skipped(fp)]
+
+    def derive_software_stats(self):
+        if self._software_stats is None:
+            self._software_stats = SoftwareStats.from_invert_index(self)
+        return self._software_stats
+
+
+    def save(self, path):
+        """Save the index in a compact binary format (see `locmoss.storage`)"""
+        from locmoss.storage import save_invert_index
+        save_invert_index(self, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load an index saved with `save`. If `mmap` is True, the file is
+        memory-mapped and queried without being deserialised. The returned
+        index is read-only.
+        """
+        from locmoss.storage import load_invert_index
+        return load_invert_index(path, mmap)
+
 
 class Filter(object):
     def __init__(self, collision_threshold):
@@ -77,14 +273,70 @@ class Filter(object):
             if len(s) > self.collision_threshold:
                 invert_index.invalidate(fp)
 
+    def update(self, invert_index, fingerprints):
+        """
+        Re-evaluate the filter on the given fingerprints only.
+
+        Return
+        ------
+        invalidated, revalidated: sets
+            The fingerprints which have been invalidated (resp. revalidated)
+        """
+        invalidated, revalidated = set(), set()
+        for fp in fingerprints:
+            n_softwares = invert_index.count_softwares(fp)
+            filtered = fp in invert_index.filtered
+            if n_softwares > self.collision_threshold and not filtered:
+                invert_index.invalidate(fp)
+                invalidated.add(fp)
+            elif n_softwares <= self.collision_threshold and filtered:
+                invert_index.revalidate(fp)
+                revalidated.add(fp)
+        return invalidated, revalidated
+
+
+
+
+# ------------------------------ Parallel build ------------------------------ #
+_worker_fingerprinter = None
+
 
+def _init_worker(fingerprinter):
+    global _worker_fingerprinter
+    _worker_fingerprinter = fingerprinter
+
+
+def _extract_compact(software):
+    """
+    Fingerprint `software` in a worker process. Only tuples
+    (fingerprint, file index, line, column) are sent back to avoid pickling
+    one `Location` (and its path) per fingerprint, together with the
+    fingerprinter statistics for that software.
+    """
+    _worker_fingerprinter.stats.clear()
+    file_indices = {f: i for i, f in enumerate(software.source_files)}
+    compact = []
+    for location, kgram in \
+            _worker_fingerprinter.extract_fingerprints(software):
+        compact.append((kgram, file_indices[location.source_file],
+                        location.start_line, location.start_column))
+    return compact, dict(_worker_fingerprinter.stats)
+
+
+def effective_n_jobs(n_jobs):
+    if n_jobs is None:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return max(1, n_jobs)
 
 
 class MossEngine(object):
     """
     Start by adding the reference file
     """
-    def __init__(self, fingerprinter, filter=None, renderer=None):
+    def __init__(self, fingerprinter, filter=None, renderer=None, lsh=None,
+                 streaming=False):
         self.fingerprinter = fingerprinter
         if filter is None:
             filter = lambda x: x
@@ -92,31 +344,143 @@ class MossEngine(object):
         if renderer is None:
             renderer = TerminalRenderer()
         self.renderer = renderer
-        self.invert_index = InvertIndex()
+        # Candidate generator (see `locmoss.lsh.MinHashLSH`). If None, all
+        # the pairs sharing a fingerprint are scored
+        self.lsh = lsh
+        # If True, the reports of the queries are rendered block by block
+        # as they are produced rather than built in memory beforehand
+        self.streaming = streaming
+        self.invert_index = InvertIndex(lsh)
+        # Rankings kept up to date by `add_softwares` and `remove_software`
+        # (see `track`)
+        self.rankings = []
 
     def fingerprint(self, software):
-        for location, fingerprint in self.fingerprinter.extract_fingerprints(software):
-            software.add_fingerprint(fingerprint, location)
+        # Fingerprints are stored as plain integers, the kgrams are only kept
+        # for display
+        for location, kgram in self.fingerprinter.extract_fingerprints(software):
+            software.add_fingerprint(int(kgram), location, kgram)
 
 
     def update_index(self, software, reference=False):
-        for fp in software.fingerprints:
-            self.invert_index.add(fp, software, skip=reference)
-
-
-
-    def build_index(self, softwares, reference_software=None):
+        self.invert_index.add_software(software, skip=reference)
+
+
+
+    def fingerprint_all(self, softwares, n_jobs=1):
+        """
+        Fingerprint all the `softwares` and yield them in order, as soon as
+        they are ready.
+
+        Parameters
+        ----------
+        softwares: iterable of `Software`
+        n_jobs: int (default: 1)
+            Number of processes to use. `None` or 1 means serial processing,
+            negative values are relative to the number of CPUs (-1 means all
+            of them).
+        """
+        n_jobs = effective_n_jobs(n_jobs)
+        if n_jobs == 1:
+            for software in softwares:
+                self.fingerprint(software)
+                yield software
+            return
+
+        softwares = list(softwares)
+        # Lexers are resolved here so that all the workers agree with the
+        # serial path on the lexers and on the number of guesses
+        self.fingerprinter.resolve_lexers(softwares)
+        with ProcessPoolExecutor(n_jobs, initializer=_init_worker,
+                                 initargs=(self.fingerprinter,)) as executor:
+            # `map` preserves the ordering, hence the merging is
+            # deterministic and identical to the serial path
+            results = executor.map(_extract_compact, softwares)
+            for software, (compact, stats) in zip(softwares, results):
+                self.fingerprinter.stats.update(stats)
+                for kgram, file_idx, line, column in compact:
+                    software.add_compact(int(kgram), file_idx, line, column,
+                                         kgram)
+                yield software
+
+
+    def build_index(self, softwares, reference_software=None, n_jobs=1):
         if reference_software is not None:
             self.fingerprint(reference_software)
             self.update_index(reference_software, True)
-        for software in softwares:
-            self.fingerprint(software)
+        for software in self.fingerprint_all(softwares, n_jobs):
             self.update_index(software)
         self.filter(self.invert_index)
         return self
 
 
+    def add_softwares(self, softwares, n_jobs=1):
+        """
+        Add softwares to an already built index (e.g. late submissions).
+        Only the touched fingerprints are filtered again, and the matching
+        graph and the tracked rankings (see `track`) are patched for the
+        affected pairs.
+        """
+        softwares = list(self.fingerprint_all(softwares, n_jobs))
+        affected, changed = self.invert_index.add_softwares(softwares,
+                                                            self.filter)
+        self._update_rankings(affected, changed)
+        return self
+
+    def remove_software(self, software):
+        """Remove a software (or a software name) from the index. See
+        `add_softwares`."""
+        if isinstance(software, str):
+            matches = [s for s in self.invert_index.get_softwares()
+                       if s.name == software]
+            if len(matches) == 0:
+                raise KeyError(software)
+            software = matches[0]
+        affected, changed = self.invert_index.remove_softwares([software],
+                                                               self.filter)
+        self._update_rankings(affected, changed)
+        return self
+
+    def track(self, ranking):
+        """Keep the ranking up to date when softwares are added or removed
+        (until `untrack`) and return it"""
+        if not any(r is ranking for r in self.rankings):
+            self.rankings.append(ranking)
+        return ranking
+
+    def untrack(self, ranking):
+        """Stop updating the ranking"""
+        self.rankings = [r for r in self.rankings if r is not ranking]
+
+    def _update_rankings(self, affected, changed):
+        for ranking in self.rankings:
+            ranking.update(self.invert_index, affected, changed)
+
+
+    def save_index(self, path):
+        self.invert_index.save(path)
+        return self
+
+    def load_index(self, path, mmap=True):
+        self.invert_index = InvertIndex.load(path, mmap)
+        self.invert_index.candidate_generator = self.lsh
+        return self
+
+    def load_reference(self, path, mmap=True):
+        """
+        Load a reference filter (see `locmoss.reference.ReferenceFilter`):
+        the kgrams of the reference are discarded while winnowing, hence
+        never enter the index. The fingerprinter must use the same kgram
+        length and hashing as the filter.
+        """
+        self.fingerprinter.reference_filter = ReferenceFilter.load(path, mmap)
+        return self
+
+
     def query(self, a_query):
+        if self.streaming and isinstance(a_query, Query):
+            self.renderer(a_query.stream(self.invert_index))
+            return None
         result = a_query(self.invert_index)
         if isinstance(result, Report):
             self.renderer(result)
@@ -1,13 +1,18 @@
 import os
+from array import array
 
 import pygments.token
 import pygments.lexers
 
 from locmoss.location import Location
+from locmoss.symbols import symbol_table
+from locmoss.tokenizer import FastTokenizer
 
 
 
 class Token(object):
+    __slots__ = ("symbol", "location")
+
     def __init__(self, symbol, location):
         self.symbol = symbol
         self.location = location
@@ -20,45 +25,264 @@ class Token(object):
                                        repr(self.symbol),
                                        repr(self.location))
 
+
+def normalize(token_type, value):
+    """
+    Return the normalised symbol of a pygments token, or None if it must be
+    ignored (whitespaces, comments).
+    """
+    # Adapted from https://github.com/agranya99/MOSS-winnowing-seqMatcher/blob/master/cleanUP.py
+    if token_type in pygments.token.Text or token_type in pygments.token.Comment:
+        return None
+    elif token_type == pygments.token.Name:
+        return "N"  # all variable names as 'N'
+    elif token_type in pygments.token.Literal.String:
+        return "S"  # all strings as 'S'
+    elif token_type in pygments.token.Name.Function:
+        return "F"  # user defined function names as 'F'
+    return value
+
+
+class LexerResolver(object):
+    """
+    `LexerResolver`
+    ===============
+    Resolve the lexer of files, caching the result of
+    `pygments.lexers.guess_lexer_for_filename` (which tries every registered
+    lexer, and is therefore slow).
+
+    Parameters
+    ----------
+    overrides: dict (default: None)
+        Map file extensions (e.g. ".h") to lexers (or lexer short names).
+        Those lexers are used directly, without guess.
+    strategy: "extension" or "software" (default: "extension")
+        "extension": the lexer is guessed once per file extension.
+        "software": the first file of each software decides the lexer of all
+        the files of that software.
+    """
+    __STRATEGIES__ = ("extension", "software")
+
+    def __init__(self, overrides=None, strategy="extension"):
+        if strategy not in self.__STRATEGIES__:
+            raise ValueError("Unknown strategy '{}' (choose among {})"
+                             "".format(strategy,
+                                       ", ".join(self.__STRATEGIES__)))
+        self.overrides = {}
+        for extension, lexer in ({} if overrides is None else overrides).items():
+            if isinstance(lexer, str):
+                lexer = pygments.lexers.get_lexer_by_name(lexer)
+            self.overrides[self.normalize_extension(extension)] = lexer
+        self.strategy = strategy
+        self.cache = {}
+        self.n_guesses = 0
+
+    def __repr__(self):
+        return "{}({}, {})".format(self.__class__.__name__,
+                                   repr(self.overrides),
+                                   repr(self.strategy))
+
+    @classmethod
+    def normalize_extension(cls, extension):
+        extension = extension.lower()
+        return extension if extension.startswith(".") else "." + extension
+
+    @classmethod
+    def extension(cls, fpath):
+        # Files without extension (e.g. "Makefile") are keyed by their name
+        name = os.path.basename(fpath)
+        extension = os.path.splitext(name)[1]
+        return extension.lower() if extension else name
+
+    def resolve(self, fpath, read_text, scope=None):
+        """
+        Parameters
+        ----------
+        fpath: str
+            The path of the file
+        read_text: callable
+            Return the content of the file (only called if a guess is needed)
+        scope: hashable (default: None)
+            The software to which the file belongs
+        """
+        extension = self.extension(fpath)
+        lexer = self.overrides.get(extension)
+        if lexer is not None:
+            return lexer
+
+        if self.strategy == "software" and scope is not None:
+            key = scope, None
+        else:
+            key = None, extension
+
+        lexer = self.cache.get(key)
+        if lexer is None:
+            lexer = pygments.lexers.guess_lexer_for_filename(fpath,
+                                                             read_text())
+            self.n_guesses += 1
+            self.cache[key] = lexer
+        return lexer
+
+
 class Parser(object):
-    def __init__(self, fpath, lexer=None, encoding="latin-1"):
+    """
+    Parameters
+    ----------
+    fpath: str
+        Path to the file to parse
+    lexer: pygments lexer or None
+        The lexer to use. If None, it is given by the `resolver` or guessed
+        from the file name and content.
+    encoding: str
+        Encoding of the file
+    per_line: bool (default: False)
+        If True, each line is lexed separately (behaviour of previous
+        versions). Otherwise, the whole file is lexed at once, which is
+        faster and handles multi-line tokens (block comments, multi-line
+        strings, etc.) correctly.
+    resolver: `LexerResolver` or None
+        Used to find the lexer if none is given.
+    scope: hashable or None
+        Identifies the software to which the file belongs (set by the
+        `Fingerprinter`).
+    fast: bool (default: True)
+        If True, whole C, C++, Java and Python files are lexed by the
+        dedicated `FastTokenizer` (same symbols, faster). Otherwise, or for
+        other languages, the pygments lexer is used directly.
+
+    Attributes
+    ----------
+    n_lexer_guesses: int
+        The number of calls to `guess_lexer_for_filename` made by this parser.
+    """
+    def __init__(self, fpath, lexer=None, encoding="latin-1", per_line=False,
+                 resolver=None, scope=None, fast=True):
         self.fpath = fpath
         self.lexer = lexer
         self.encoding = encoding
+        self.per_line = per_line
+        self.resolver = resolver
+        self.scope = scope
+        self.fast = fast
+        self.n_lexer_guesses = 0
 
 
     def __repr__(self):
-        return "{}({}, {}, {})".format(self.__class__.__name__,
-                                       repr(self.fpath),
-                                       repr(self.lexer),
-                                       repr(self.encoding))
+        return "{}({}, {}, {}, {}, {}, {}, {})".format(self.__class__.__name__,
+                                                       repr(self.fpath),
+                                                       repr(self.lexer),
+                                                       repr(self.encoding),
+                                                       repr(self.per_line),
+                                                       repr(self.resolver),
+                                                       repr(self.scope),
+                                                       repr(self.fast))
 
-    def __iter__(self):
+    def read(self):
         with open(self.fpath, "r", encoding=self.encoding) as hdl:
-            text = hdl.read()
-        lexer = pygments.lexers.guess_lexer_for_filename(self.fpath, text) \
-            if self.lexer is None else self.lexer
+            return hdl.read()
 
-        # Adapted from https://github.com/agranya99/MOSS-winnowing-seqMatcher/blob/master/cleanUP.py
+    def get_lexer(self, text=None):
+        if self.lexer is not None:
+            return self.lexer
+
+        def read_text():
+            return self.read() if text is None else text
+
+        if self.resolver is None:
+            self.n_lexer_guesses += 1
+            return pygments.lexers.guess_lexer_for_filename(self.fpath,
+                                                            read_text())
+
+        n_guesses = self.resolver.n_guesses
+        lexer = self.resolver.resolve(self.fpath, read_text, self.scope)
+        self.n_lexer_guesses += self.resolver.n_guesses - n_guesses
+        return lexer
+
+    @property
+    def lexer_name(self):
+        if self.lexer is None and self.resolver is None:
+            # The guess depends on the file name (not only its extension,
+            # e.g. "CMakeLists.txt") and content, the latter being keyed
+            # separately by the cache
+            return "guess:" + os.path.basename(self.fpath)
+        return self.get_lexer().name
+
+    def signature(self):
+        """Parameters (other than the file) influencing the tokens (`fast`
+        does not)"""
+        return self.lexer_name, "per_line" if self.per_line else "whole"
+
+    def __iter__(self):
+        fpath = self.fpath
+        symbol_ids, lines, columns = self.compact()
+        for symbol_id, line, column in zip(symbol_ids, lines, columns):
+            yield Token(symbol_table[symbol_id], Location(fpath, line, column))
+
+    def compact(self):
+        """
+        Return the tokens of the file as three parallel arrays: the ids of
+        the symbols (in the shared `SymbolTable`), their lines and their
+        columns. Unlike iterating over the parser, no object is created per
+        token.
+        """
+        text = self.read()
+        lexer = self.get_lexer(text)
+        symbol_ids, lines, columns = array("I"), array("l"), array("l")
+        if self.per_line:
+            self.compact_per_line(text, lexer, symbol_ids, lines, columns)
+        else:
+            self.compact_whole(text, lexer, symbol_ids, lines, columns)
+        return symbol_ids, lines, columns
+
+    def symbols(self, text, lexer):
+        """Yield the pairs (offset, symbol) of the tokens of `text`"""
+        tokenizer = FastTokenizer.get(lexer) if self.fast else None
+        if tokenizer is not None:
+            return tokenizer(text)
+        return self.iter_pygments(text, lexer)
+
+    @classmethod
+    def iter_pygments(cls, text, lexer):
+        for offset, token_type, value in lexer.get_tokens_unprocessed(text):
+            symbol = normalize(token_type, value)
+            if symbol is not None:
+                yield offset, symbol
+
+    def compact_whole(self, text, lexer, symbol_ids, lines, columns):
+        if not text.endswith("\n"):
+            text += "\n"
+
+        # Offset of the start of each line
+        line_starts = [0]
+        idx = text.find("\n")
+        while idx >= 0:
+            line_starts.append(idx + 1)
+            idx = text.find("\n", idx + 1)
+        n_lines = len(line_starts)
+
+        intern = symbol_table.intern
+        add_symbol, add_line, add_column = symbol_ids.append, lines.append, \
+            columns.append
+        line_idx = 0
+        line_start = 0
+        for offset, symbol in self.symbols(text, lexer):
+            # Tokens come in order: move forward to the line of the token
+            while line_idx + 1 < n_lines and line_starts[line_idx + 1] <= offset:
+                line_idx += 1
+                line_start = line_starts[line_idx]
+            add_symbol(intern(symbol))
+            add_line(line_idx + 1)
+            add_column(offset - line_start + 1)
+
+    def compact_per_line(self, text, lexer, symbol_ids, lines, columns):
         for j, line in enumerate(text.split(os.linesep)):
             line_number = j + 1
             column_number = 1
             for token_type, original_symbol in lexer.get_tokens(line):
-                symbol = original_symbol
-                if token_type == pygments.token.Text or token_type in pygments.token.Comment:
-                    symbol = None
-                elif token_type == pygments.token.Name:
-                    symbol = "N"  # all variable names as 'N'
-                elif token_type in pygments.token.Literal.String:
-                    symbol = "S"  # all strings as 'S'
-                elif token_type in pygments.token.Name.Function:
-                    symbol = "F"  # user defined function names as 'F'
-
-
-
+                symbol = normalize(token_type, original_symbol)
                 if symbol is not None:
-                    yield Token(symbol, Location(self.fpath, line_number,
-                                                 column_number))
+                    symbol_ids.append(symbol_table.intern(symbol))
+                    lines.append(line_number)
+                    columns.append(column_number)
 
                 column_number += len(original_symbol)
-
@@ -1,11 +1,12 @@
-from .renderer import TerminalRenderer
+from .renderer import TerminalRenderer, JsonRenderer, HtmlRenderer
 from .similarity import CountSimilarity, JaccardSimilarity, TfIdfSimilarity, \
     Ranking
 from .query import MetaData, SoftwareList, CorpusStat, MostSimilar, \
     MatchingLocations, MatchingSnippets
 
 
-__all__ = ["TerminalRenderer", "CountSimilarity", "JaccardSimilarity",
-            "TfIdfSimilarity", "Ranking",
+__all__ = ["TerminalRenderer", "JsonRenderer", "HtmlRenderer",
+           "CountSimilarity", "JaccardSimilarity", "TfIdfSimilarity",
+           "Ranking",
            "MetaData", "SoftwareList", "CorpusStat", "MostSimilar",
            "MatchingLocations", "MatchingSnippets"]
@@ -2,10 +2,10 @@ import os
 
 from datetime import datetime, timedelta
 
-from locmoss.location import LocationIterator
-from locmoss.query.report import Report, Anchor, Anchorable, Reference, \
-    SubSection, Section
-from locmoss.query.similarity import Ranking, CountSimilarity
+from locmoss.location import SnippetService
+from locmoss.query.report import Report, Reference, \
+    SubSection, Section, ReportList, Snippet, Raw, Newline, Banner, Score
+from locmoss.query.similarity import Ranking, CountSimilarity, Similarity
 
 
 class Query(object):
@@ -18,10 +18,26 @@ class Query(object):
     def query_(self, report, invert_index):
         pass
 
-    def __call__(self, invert_index):
+    def generate_(self, invert_index):
+        """
+        Yield the blocks of the report. Queries producing long reports
+        override this method (instead of `query_`) so that their blocks can
+        be rendered as soon as they are produced.
+        """
         report = Report()
-        self.header(report)
         self.query_(report, invert_index)
+        return iter(report)
+
+    def stream(self, invert_index):
+        """Generator of the report blocks (see `generate_`)"""
+        report = Report()
+        self.header(report)
+        yield from report
+        yield from self.generate_(invert_index)
+
+    def __call__(self, invert_index):
+        report = Report()
+        report.extend(self.stream(invert_index))
         return report
 
 
@@ -44,7 +60,7 @@ class MetaData(Query):
 
     def header(self, report):
         for line in self.__HEADER__.split(os.linesep):
-            report.add_raw(line)
+            report.add(Banner(line))
 
     def query_(self, report, invert_index):
         now = datetime.now()
@@ -58,14 +74,21 @@ class MetaData(Query):
 
 
 class SoftwareList(Query):
-    def query_(self, report, invert_index):
+    def generate_(self, invert_index):
         softwares = invert_index.get_softwares()
         for sf in softwares:
-            with report.add_list(sf.name) as report_list:
-                report_list.extend(sf)
+            report_list = ReportList(sf.name)
+            report_list.extend(sf)
+            yield report_list
 
 
 class CorpusStat(Query):
+    def __init__(self, fingerprinter_stats=None, label=None):
+        # `fingerprinter_stats`: mapping such as `Fingerprinter.stats`
+        super().__init__(label)
+        self.fingerprinter_stats = {} if fingerprinter_stats is None \
+            else fingerprinter_stats
+
     def query_(self, report, invert_index):
         n_fp = 0
         n_skipped = 0
@@ -86,6 +109,9 @@ class CorpusStat(Query):
             report_list.append("Number of active fingerprints: {}"
                                "".format(n_fp - n_skipped))
             report_list.append("Number of collisions: {}".format(n_collisions))
+            for key, value in sorted(self.fingerprinter_stats.items()):
+                report_list.append("Number of {}: {}"
+                                   "".format(key.replace("_", " "), value))
 
 
 class MostSimilar(Query):
@@ -102,7 +128,8 @@ class MostSimilar(Query):
 
 
     def __init__(self, *rankings, label=None):
-        # Ordering follow the scorers[0]
+        # Ordering follow the scorers[0]. The others can be `Ranking`s or
+        # `Similarity`s: the latter are only computed for the displayed pairs
         super().__init__(label)
         self.rankings = rankings
         self.ranking = ()
@@ -124,8 +151,9 @@ class MostSimilar(Query):
 
             for i, (main_score, software_1, software_2) in enumerate(main_ranking):
 
-                all_scores = [main_score] + [ranking[(software_1, software_2)]
-                                             for ranking in other_rankings]
+                all_scores = [main_score] + [
+                    self.score(ranking, invert_index, software_1, software_2)
+                    for ranking in other_rankings]
                 s1_name = software_1.name
                 s2_name = software_2.name
 
@@ -134,16 +162,31 @@ class MostSimilar(Query):
                 row = [Reference(str(i + 1), anchor), s1_name, s2_name]
 
                 for ranking, score in zip(self.rankings, all_scores):
-                    row.append(ranking.similarity.format_score(score))
+                    similarity = self.similarity(ranking)
+                    row.append(Score(score, similarity.format_score(score)))
                 table.append(*row)
 
+    @classmethod
+    def similarity(cls, ranking_or_similarity):
+        if isinstance(ranking_or_similarity, Similarity):
+            return ranking_or_similarity
+        return ranking_or_similarity.similarity
+
+    @classmethod
+    def score(cls, ranking_or_similarity, invert_index, software_1,
+              software_2):
+        if isinstance(ranking_or_similarity, Similarity):
+            return ranking_or_similarity.score_pair(invert_index, software_1,
+                                                    software_2)
+        return ranking_or_similarity[(software_1, software_2)]
+
 
 class MatchingLocations(Query):
     def __init__(self, ranking, label=None):
         super().__init__(label)
         self.ranking = ranking
 
-    def query_(self, report, invert_index):
+    def generate_(self, invert_index):
         matching_graph = invert_index.derive_matching_graph()
 
         for _, soft_1, soft_2 in self.ranking:
@@ -151,72 +194,107 @@ class MatchingLocations(Query):
             anchor = Section.create_anchor(Reference.join(s1_name, s2_name))
 
             shareprints = matching_graph[(soft_1, soft_2)]
-            report.add(Section("{} VS. {}".format(s1_name, s2_name), anchor))
-            report.add_raw("Matching fingerprints: {}".format(len(shareprints)))
-            report.add_newline()
+            yield Section("{} VS. {}".format(s1_name, s2_name), anchor)
+            yield Raw("Matching fingerprints: {}".format(len(shareprints)))
+            yield Newline()
 
 
             for fingerprint in shareprints:
 
-                with report.add_list(str(fingerprint)) as report_list:
-                    for software in (soft_1, soft_2):
-                        locations = software[fingerprint]
-                        for location in locations:
-                            desc = "{}:{}:{}".format(location.source_file,
-                                                     location.start_line,
-                                                     location.start_column)
-                            report_list.append(desc)
+                report_list = ReportList(soft_1.kgram_str(fingerprint))
+                for software in (soft_1, soft_2):
+                    locations = software[fingerprint]
+                    for location in locations:
+                        desc = "{}:{}:{}".format(location.source_file,
+                                                 location.start_line,
+                                                 location.start_column)
+                        report_list.append(desc)
+                yield report_list
 
 
-                report.add_newline()
+                yield Newline()
 
 
 
 
 class MatchingSnippets(Query):
+    """
+    The snippets of the shared fingerprints of each pair of a ranking. If
+    the `fingerprinter` of the index is given, the files are lexed again to
+    find the range covered by each kgram (otherwise, only the locations of
+    the kgrams are known).
+    """
     def __init__(self, ranking, pre_lines=5, post_lines=5,
-                 label=None):
+                 label=None, fingerprinter=None):
         super().__init__(label)
         self.ranking = ranking
-        self.loc_iter = LocationIterator(pre_lines, post_lines)
-
-
-    def query_(self, report, invert_index):
+        self.snippets = SnippetService(pre_lines, post_lines)
+        self.fingerprinter = fingerprinter
+
+    def spans(self, software, fingerprint, locations):
+        fingerprinter = self.fingerprinter
+        if fingerprinter is None:
+            return []
+        k = software.kgram_len(fingerprint)
+        if k is None:
+            k = getattr(fingerprinter, "k", None)
+        if k is None:
+            return []
+
+        spans = []
+        for location in locations:
+            def tokenize():
+                parser = fingerprinter.create_parser(location.source_file,
+                                                     software)
+                compact = getattr(fingerprinter, "compact", None)
+                return parser.compact() if compact is None \
+                    else compact(parser)
+            span = self.snippets.span(location, k, tokenize)
+            if span is not None:
+                spans.append(span)
+        return spans
+
+
+    def generate_(self, invert_index):
         matching_graph = invert_index.derive_matching_graph()
 
-        anchors = {}
-
         for _, soft_1, soft_2 in self.ranking:
             s1_name, s2_name = soft_1.name, soft_2.name
             anchor = Section.create_anchor(Reference.join(s1_name, s2_name))
 
-            report.add(Section("{} VS. {}".format(s1_name, s2_name), anchor))
+            yield Section("{} VS. {}".format(s1_name, s2_name), anchor)
 
             shareprints = matching_graph[(soft_1, soft_2)]
 
-            with report.add_list("Matching fingerprints: {}".format(len(shareprints))) as li:
-                for fingerprint in shareprints:
-                    ref_s = Reference.join(s1_name, s2_name, str(fingerprint))
-                    anchor = SubSection.create_anchor(ref_s)
+            anchors = {}
+            li = ReportList("Matching fingerprints: {}".format(len(shareprints)))
+            for fingerprint in shareprints:
+                ref_s = Reference.join(s1_name, s2_name, str(fingerprint))
+                anchor = SubSection.create_anchor(ref_s)
 
-                    anchors[ref_s] = anchor
+                anchors[ref_s] = anchor
 
-                    li.append(Reference(str(fingerprint), anchor))
+                li.append(Reference(soft_1.kgram_str(fingerprint), anchor))
+            yield li
 
 
-            report.add_newline()
+            yield Newline()
 
             for fingerprint in shareprints:
-                s_fp = str(fingerprint)
-                ref_s = Reference.join(s1_name, s2_name, s_fp)
-                report.add(SubSection(s_fp, anchors[ref_s]))
+                ref_s = Reference.join(s1_name, s2_name, str(fingerprint))
+                yield SubSection(soft_1.kgram_str(fingerprint), anchors[ref_s])
 
                 for software in (soft_1, soft_2):
                     locations = software[fingerprint]
-                    for location in locations:
-                        desc = "{}:{}:{}".format(location.source_file,
-                                                 location.start_line,
-                                                 location.start_column)
-                        with report.add_snippet(desc) as snippet:
-                            for ln, line in self.loc_iter(location):
-                                snippet.append(ln, line)
+                    # Overlapping windows of a file form a single snippet
+                    for source_file, group, (first, last) in \
+                            self.snippets.merge(locations):
+                        desc = ", ".join("{}:{}:{}".format(
+                            location.source_file, location.start_line,
+                            location.start_column) for location in group)
+                        snippet = Snippet(desc, group, self.spans(
+                            software, fingerprint, group))
+                        for ln, line in self.snippets.serve(source_file,
+                                                            first, last):
+                            snippet.append(ln, line)
+                        yield snippet
@@ -1,9 +1,13 @@
+import html
+import json
 import os
+import re
+import sys
 from abc import ABCMeta, abstractmethod
 from contextlib import contextmanager
 
 from .report import Header, ReportList, Table, Anchor, Reference, Description, \
-    Section, SubSection, Snippet, Anchorable, Newline
+    Section, SubSection, Snippet, Anchorable, Newline, Banner, Score
 
 
 class Renderer(object, metaclass=ABCMeta):
@@ -12,14 +16,28 @@ class Renderer(object, metaclass=ABCMeta):
         pass
 
     def __call__(self, report):
+        # `report` can be a `Report` or any iterable of blocks, such as
+        # `Query.stream`: blocks are then rendered as soon as they come
         if report is not None:
             for block in report:
                 self.display(self.dispatch(block))
+            self.flush()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """Called once all the reports have been rendered"""
+        self.flush()
 
 
     def dispatch(self, block):
         if isinstance(block, Newline):
             return self.render_newline(block)
+        elif isinstance(block, Banner):
+            return self.render_banner(block)
+        elif isinstance(block, Score):
+            return self.render_score(block)
         elif isinstance(block, Header):
             return self.render_header(block)
         elif isinstance(block, ReportList):
@@ -52,6 +70,12 @@ class Renderer(object, metaclass=ABCMeta):
     def render_raw(self, s):
         return ""
 
+    def render_banner(self, banner):
+        return self.render_raw(banner)
+
+    def render_score(self, score):
+        return self.render_raw(str(score))
+
     @abstractmethod
     def render_anchor(self, anchor):
         return ""
@@ -107,12 +131,27 @@ def increment_width(terminal_renderer, delta):
 
 
 class TerminalRenderer(Renderer):
-    def __init__(self, width=80, anchor_max_length=12):
+    """
+    Parameters
+    ----------
+    width: int (default: 80)
+        Width of the output
+    anchor_max_length: int (default: 12)
+        Length at which anchors are truncated
+    output: file-like or None (default: None)
+        Where to write. `sys.stdout` if None (resolved at display time).
+    """
+    def __init__(self, width=80, anchor_max_length=12, output=None):
         self.width = width
         self.anchor_max_length = anchor_max_length
+        self.output = output
 
     def display(self, s, **kwargs):
-        print(s, **kwargs)
+        print(s, file=sys.stdout if self.output is None else self.output,
+              **kwargs)
+
+    def flush(self):
+        (sys.stdout if self.output is None else self.output).flush()
 
     def _justify(self, left, to_justify, boundaries=0):
         pad = self.width - len(left) - len(to_justify) - boundaries
@@ -259,3 +298,406 @@ class TerminalRenderer(Renderer):
         lines.append("")
         return self._multiline(*lines)
 
+
+
+
+class JsonRenderer(Renderer):
+    """
+    `JsonRenderer`
+    ==============
+    Machine-readable rendering of the reports: each block is converted to
+    a JSON object (e.g. `{"type": "table", "header": [...], "rows": [...]}`)
+    and written as soon as it is rendered. Scores are numbers, banners and
+    newlines are dropped.
+
+    Parameters
+    ----------
+    output: file-like or None (default: None)
+        Where to write. `sys.stdout` if None (resolved at display time).
+    lines: bool (default: True)
+        If True, one JSON object is written per line (JSONL). Otherwise, a
+        single JSON array is written, which is terminated by `close`.
+    """
+    def __init__(self, output=None, lines=True):
+        self.output = output
+        self.lines = lines
+        self.n_blocks = 0
+
+    @property
+    def stream(self):
+        return sys.stdout if self.output is None else self.output
+
+    def display(self, s, **kwargs):
+        if s is None:
+            return
+        if isinstance(s, str):
+            s = {"type": "text", "text": s}
+        js = json.dumps(s)
+        if self.lines:
+            self.stream.write(js + "\n")
+        else:
+            self.stream.write(("[" if self.n_blocks == 0 else ",\n") + js)
+        self.n_blocks += 1
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        if not self.lines:
+            self.stream.write("[]\n" if self.n_blocks == 0 else "]\n")
+        self.flush()
+
+    def _anchored(self, type, anchorable):
+        return {"type": type, "title": str(anchorable),
+                "anchor": self.render_anchor(anchorable.anchor)}
+
+    # -------------------------------- IN LINE --------------------------------
+    def render_newline(self, _):
+        return None
+
+    def render_raw(self, s):
+        return str(s)
+
+    def render_banner(self, banner):
+        return None
+
+    def render_score(self, score):
+        return score.value
+
+    def render_anchor(self, anchor):
+        return anchor.as_hash_str()
+
+    def render_anchorable(self, anchorable):
+        return self._anchored("anchorable", anchorable)
+
+    def render_reference(self, ref):
+        return {"type": "reference", "text": str(ref),
+                "anchor": self.render_anchor(ref.anchor)}
+
+    # --------------------------------- BLOCK ---------------------------------
+    def _headline(self, headline):
+        return None if headline is None else self.dispatch(headline)
+
+    def render_header(self, header):
+        return self._anchored("header", header)
+
+    def render_list(self, report_list):
+        return {"type": "list",
+                "headline": self._headline(report_list.headline),
+                "items": [self.dispatch(x) for x in report_list]}
+
+    def render_table(self, table):
+        def row(cells):
+            return None if cells is None else [self.dispatch(x)
+                                               for x in cells]
+        return {"type": "table", "header": row(table.header),
+                "rows": [row(cells) for cells in table],
+                "footer": row(table.footer)}
+
+    def render_description(self, description):
+        return {"type": "description",
+                "headline": self._headline(description.headline),
+                "items": [[self.dispatch(k), self.dispatch(v)]
+                          for k, v in description]}
+
+    def render_section(self, section):
+        return self._anchored("section", section)
+
+    def render_subsection(self, subsection):
+        return self._anchored("subsection", subsection)
+
+    def render_snippet(self, snippet):
+        return {"type": "snippet", "desc": snippet.desc,
+                "lines": [[n, line] for n, line in snippet],
+                "highlights": [[l.start_line, l.start_column]
+                               for l in snippet.highlights],
+                "spans": [[list(start), None if end is None else list(end)]
+                          for start, end in snippet.spans]}
+
+
+class HtmlRenderer(Renderer):
+    """
+    `HtmlRenderer`
+    ==============
+    Browsable, self-contained HTML report written in `directory`: an
+    `index.html` page holds the blocks of the reports, except for the
+    content of each `Section` (typically a pair of softwares), which goes
+    to its own page so that the index stays small whatever the number of
+    snippets. The snippets following a `SubSection` are laid out side by
+    side, and the matched locations are highlighted.
+
+    Pages are written as the blocks come (see `Query.stream`); `close` must
+    be called at the end.
+
+    Parameters
+    ----------
+    directory: str
+        Where to write the pages. Created if it does not exist.
+    title: str (default: "Local MOSS report")
+        Title of the index page.
+    """
+    __STYLE__ = """
+body { font-family: sans-serif; margin: 2em; }
+table { border-collapse: collapse; }
+td, th { border: 1px solid #ccc; padding: .2em .6em; text-align: left; }
+.snippets { display: flex; flex-wrap: wrap; gap: 1em; }
+.snippet { flex: 1 1 30em; min-width: 0; }
+.snippet .desc { font-size: .8em; color: #555; }
+pre { background: #f6f6f6; padding: .5em; overflow-x: auto; }
+pre .ln { color: #999; user-select: none; }
+pre .match { background: #fff3b0; display: inline-block; width: 100%; }
+mark { background: #ffcf40; }
+"""
+
+    __FIRST_TOKEN__ = re.compile(r"\w+|\S")
+
+    def __init__(self, directory, title="Local MOSS report"):
+        self.directory = directory
+        self.title = title
+        self.pages_dir = os.path.join(directory, "pairs")
+        os.makedirs(self.pages_dir, exist_ok=True)
+        self.index = None
+        self.page = None
+        self.in_snippets = False
+        self.written = set()
+        self.referenced = {}
+        self.closed = False
+
+    # ------------------------------- Pages --------------------------------- #
+    @classmethod
+    def page_name(cls, anchor):
+        return anchor.as_hash_str().replace(":", "_") + ".html"
+
+    def _open(self, path, title, back=False):
+        hdl = open(path, "w", encoding="utf-8")
+        hdl.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+                  "<title>{}</title><style>{}</style></head><body>\n"
+                  "".format(html.escape(title), self.__STYLE__))
+        if back:
+            hdl.write("<p><a href=\"../index.html\">&larr; Index</a></p>\n")
+        return hdl
+
+    @classmethod
+    def _close(cls, hdl):
+        hdl.write("</body></html>\n")
+        hdl.close()
+
+    @property
+    def current(self):
+        if self.index is None:
+            self.index = self._open(os.path.join(self.directory, "index.html"),
+                                    self.title)
+            self.index.write("<h1>{}</h1>\n".format(html.escape(self.title)))
+        return self.index if self.page is None else self.page
+
+    def _close_snippets(self):
+        if self.in_snippets:
+            self.current.write("</div>\n")
+            self.in_snippets = False
+
+    def _leave_page(self):
+        self._close_snippets()
+        if self.page is not None:
+            self._close(self.page)
+            self.page = None
+
+    def _route(self, block):
+        # Sections get their own page, headers go back to the index
+        if isinstance(block, Section):
+            self._leave_page()
+            name = self.page_name(block.anchor)
+            self.page = self._open(os.path.join(self.pages_dir, name),
+                                   str(block), back=True)
+            self.written.add(name)
+        elif isinstance(block, Header):
+            self._leave_page()
+        elif isinstance(block, (SubSection, Table, ReportList, Description)):
+            self._close_snippets()
+        elif isinstance(block, Snippet) and not self.in_snippets:
+            self.current.write("<div class=\"snippets\">\n")
+            self.in_snippets = True
+
+    def __call__(self, report):
+        if report is None:
+            return
+        for block in report:
+            self._route(block)
+            s = self.dispatch(block)
+            if isinstance(block, str) and s:
+                s = "<p>{}</p>".format(s)
+            self.display(s)
+        self._close_snippets()
+        self.flush()
+
+    def display(self, s, **kwargs):
+        if s:
+            self.current.write(s + "\n")
+
+    def flush(self):
+        self.current.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._leave_page()
+        # Sections which are referenced (e.g. by `MostSimilar`) but were not
+        # part of the reports
+        for name, title in self.referenced.items():
+            if name not in self.written:
+                hdl = self._open(os.path.join(self.pages_dir, name), title,
+                                 back=True)
+                hdl.write("<p>No details in this report.</p>\n")
+                self._close(hdl)
+        self._close(self.current)
+        self.index = None
+
+    # -------------------------------- IN LINE --------------------------------
+    def render_newline(self, _):
+        return ""
+
+    def render_raw(self, s):
+        return html.escape(str(s))
+
+    def render_banner(self, banner):
+        return ""
+
+    def render_anchor(self, anchor):
+        return "<a id=\"{}\"></a>".format(html.escape(anchor.as_hash_str()))
+
+    def render_anchorable(self, anchorable):
+        return "<span id=\"{}\">{}</span>".format(
+            html.escape(anchorable.anchor.as_hash_str()),
+            html.escape(str(anchorable)))
+
+    def render_reference(self, ref):
+        anchor = ref.anchor
+        if anchor.prefix == Section.get_prefix():
+            name = self.page_name(anchor)
+            self.referenced.setdefault(name, anchor.s)
+            href = "pairs/" + name if self.page is None else name
+        else:
+            href = "#" + anchor.as_hash_str()
+        return "<a href=\"{}\">{}</a>".format(html.escape(href),
+                                              html.escape(str(ref)))
+
+    # --------------------------------- BLOCK ---------------------------------
+    def _anchored(self, tag, anchorable):
+        return "<{0} id=\"{1}\">{2}</{0}>".format(
+            tag, html.escape(anchorable.anchor.as_hash_str()),
+            html.escape(str(anchorable)))
+
+    def _headline(self, headline):
+        return "" if headline is None else \
+            "<p>{}</p>".format(self.dispatch(headline))
+
+    def render_header(self, header):
+        return self._anchored("h2", header)
+
+    def render_list(self, report_list):
+        items = "".join("<li>{}</li>".format(self.dispatch(x))
+                        for x in report_list)
+        return "{}<ul>{}</ul>".format(self._headline(report_list.headline),
+                                      items)
+
+    def render_table(self, table):
+        def row(cells, tag="td"):
+            return "<tr>{}</tr>".format("".join(
+                "<{0}>{1}</{0}>".format(tag, self.dispatch(x))
+                for x in cells))
+
+        lines = ["<table>"]
+        if table.header:
+            lines.append("<thead>{}</thead>".format(row(table.header, "th")))
+        lines.append("<tbody>")
+        lines.extend(row(cells) for cells in table)
+        lines.append("</tbody>")
+        if table.footer:
+            lines.append("<tfoot>{}</tfoot>".format(row(table.footer)))
+        lines.append("</table>")
+        return "\n".join(lines)
+
+    def render_description(self, description):
+        items = "".join("<dt>{}</dt><dd>{}</dd>".format(self.dispatch(k),
+                                                       self.dispatch(v))
+                        for k, v in description)
+        return "{}<dl>{}</dl>".format(self._headline(description.headline),
+                                      items)
+
+    def render_section(self, section):
+        return self._anchored("h2", section)
+
+    def render_subsection(self, subsection):
+        return self._anchored("h3", subsection)
+
+    @classmethod
+    def _marked_ranges(cls, snippet):
+        """
+        Map the line numbers of the snippet to the (sorted, disjoint) ranges
+        [start, end) of the indices of the characters to highlight
+        """
+        spans = snippet.spans
+        if len(spans) == 0:
+            # Unknown extent of the kgrams: only their first token (roughly)
+            spans = []
+            lines = dict(snippet)
+            for location in snippet.highlights:
+                line = lines.get(location.start_line, "")
+                token = cls.__FIRST_TOKEN__.match(line,
+                                                  location.start_column - 1)
+                length = 1 if token is None else len(token.group())
+                spans.append(((location.start_line, location.start_column),
+                              (location.start_line,
+                               location.start_column + length)))
+
+        ranges = {}
+        for n, line in snippet:
+            for (start_line, start_column), end in spans:
+                if n < start_line or (end is not None and n > end[0]):
+                    continue
+                start = start_column - 1 if n == start_line else 0
+                stop = end[1] - 1 if end is not None and n == end[0] \
+                    else len(line)
+                # Without the surrounding whitespaces
+                text = line[start:stop]
+                stop = start + len(text.rstrip())
+                start += len(text) - len(text.lstrip())
+                if start < stop:
+                    ranges.setdefault(n, []).append((start, stop))
+
+        for n, line_ranges in ranges.items():
+            merged = []
+            for start, stop in sorted(line_ranges):
+                if merged and start <= merged[-1][1]:
+                    merged[-1] = merged[-1][0], max(merged[-1][1], stop)
+                else:
+                    merged.append((start, stop))
+            ranges[n] = merged
+        return ranges
+
+    def render_snippet(self, snippet):
+        ranges = self._marked_ranges(snippet)
+
+        lines = []
+        for n, line in snippet:
+            line_ranges = ranges.get(n)
+            if line_ranges is None:
+                content = html.escape(line)
+            else:
+                # Highlight the span of the matches only
+                parts, previous = [], 0
+                for start, stop in line_ranges:
+                    parts.append(html.escape(line[previous:start]))
+                    parts.append("<mark>{}</mark>".format(
+                        html.escape(line[start:stop])))
+                    previous = stop
+                parts.append(html.escape(line[previous:]))
+                content = "<span class=\"match\">{}</span>" \
+                          "".format("".join(parts))
+            lines.append("<span class=\"ln\">{:4}:</span>{}".format(n,
+                                                                    content))
+
+        desc = "" if snippet.desc is None else \
+            "<div class=\"desc\">{}</div>".format(html.escape(snippet.desc))
+        return "<div class=\"snippet\">{}<pre>{}</pre></div>" \
+               "".format(desc, "\n".join(lines))
@@ -5,6 +5,27 @@ from collections import OrderedDict
 class Raw(str):
     pass
 
+class Banner(Raw):
+    # Decorative text (ASCII art), ignored by machine-readable renderers
+    pass
+
+class Score(object):
+    """A similarity score, together with its human-readable form"""
+    def __init__(self, value, formatted=None):
+        self.value = value
+        self.formatted = str(value) if formatted is None else formatted
+
+    def __str__(self):
+        return self.formatted
+
+    def __len__(self):
+        return len(self.formatted)
+
+    def __repr__(self):
+        return "{}({}, {})".format(self.__class__.__name__,
+                                   repr(self.value),
+                                   repr(self.formatted))
+
 class Newline(object):
     pass
 
@@ -144,9 +165,14 @@ class Table(object):
 
 
 class Snippet(object):
-    def __init__(self, desc=None):
+    def __init__(self, desc=None, highlights=(), spans=()):
+        # `highlights`: the `Location`s of the matches within the snippet
+        # `spans`: the ranges they cover, if known, as pairs ((line, column),
+        # (line, column)) whose end is excluded (None: end of the snippet)
         self.desc = desc
         self.lines = []
+        self.highlights = list(highlights)
+        self.spans = list(spans)
 
     def append(self, line_nb, line):
         self.lines.append((line_nb, line))
@@ -208,11 +234,15 @@ class Report(object):
         self.add(table)
         return table
 
-    def add_snippet(self, desc=None):
-        snippet = Snippet(desc)
+    def add_snippet(self, desc=None, highlights=(), spans=()):
+        snippet = Snippet(desc, highlights, spans)
         self.add(snippet)
         return snippet
 
+    def extend(self, blocks):
+        for block in blocks:
+            self.add(block)
+
     def merge(self, other):
         self.content.extend(other.content)
 
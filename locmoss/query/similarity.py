@@ -1,10 +1,31 @@
 from abc import ABCMeta, abstractmethod
 
-import math
+import heapq
 from contextlib import contextmanager
 
+from locmoss.query import sparse
+
 
 class Similarity(object, metaclass=ABCMeta):
+    """
+    Parameters
+    ----------
+    vectorized: bool (default: False)
+        If True, rankings compute the scores of all the pairs at once with
+        sparse matrix products (see `locmoss.query.sparse`, requires numpy
+        and scipy) instead of calling the similarity once per pair. Only
+        for the similarities which are `vectorizable`.
+    """
+    # Whether `pairwise_scores` is implemented
+    vectorizable = False
+
+    def __init__(self, vectorized=False):
+        if vectorized:
+            if not self.vectorizable:
+                raise ValueError("{} cannot be vectorized"
+                                 "".format(self.__class__.__name__))
+            sparse._check_available()
+        self.vectorized = vectorized
 
     @property
     def label(self):
@@ -19,6 +40,53 @@ class Similarity(object, metaclass=ABCMeta):
     def higher_more_similar(self):
         return True
 
+    @property
+    def depends_on(self):
+        """
+        What the score of a pair depends on (used to update rankings
+        incrementally):
+         - "shareprints": only the fingerprints shared by the pair
+         - "softwares": the shareprints and the active fingerprints of both
+           softwares
+         - "corpus": the whole index
+        """
+        return "corpus"
+
+    def reset(self):
+        """Clear any cached state (called when the index changes)"""
+        pass
+
+
+    def pairwise_scores(self, incidence):
+        """
+        Return a function mapping the shared counts of the pairs (COO matrix)
+        to their scores, for the vectorised computation.
+
+        Parameters
+        ----------
+        incidence: `sparse.Incidence`
+
+        Return
+        ------
+        The scoring function, or None if the similarity is not
+        `vectorizable`
+        """
+        return None
+
+    def score_graph(self, invert_index, matching_graph):
+        """
+        Yield the triplets (score, software_1, software_2) of all the pairs
+        of the matching graph. Subclasses can override it to score all the
+        pairs at once.
+        """
+        for software_1, software_2, shareprints in matching_graph:
+            yield self(invert_index, software_1, software_2, shareprints), \
+                software_1, software_2
+
+    def score_pair(self, invert_index, software_1, software_2):
+        """Score a single pair, without deriving the matching graph"""
+        shareprints = invert_index.shareprints(software_1, software_2)
+        return self(invert_index, software_1, software_2, shareprints)
 
     @abstractmethod
     def __call__(self, invert_index, software_1, software_2, shareprints):
@@ -36,33 +104,142 @@ class Ranking(object):
             self.software_2 = software_2
 
     @classmethod
-    def from_invert_index(cls, similarity, invert_index):
+    def from_invert_index(cls, similarity, invert_index, k=None,
+                          threshold=None):
+        """
+        Parameters
+        ----------
+        similarity: `Similarity`
+            The scoring function
+        invert_index: `InvertIndex`
+            The index
+        k: int or None (default: None)
+            If not None, only the `k` most similar pairs are kept (in a
+            bounded heap). Scores of the other pairs are computed on demand
+            by `__getitem__`.
+        threshold: float or None (default: None)
+            If not None, only the pairs at least as similar as `threshold`
+            are kept.
+        """
         ranking = cls(similarity)
+        ranking.k = k
+        ranking.threshold = threshold
+        ranking.invert_index = invert_index
+        ranking._set(ranking._select(ranking._score_all(invert_index)))
+        return ranking
 
+    def _score_all(self, invert_index):
+        similarity = self.similarity
+        if getattr(similarity, "vectorized", False) and \
+                similarity.vectorizable:
+            incidence = sparse.Incidence.from_invert_index(invert_index)
+            scores = similarity.pairwise_scores(incidence)
+            candidates = invert_index.derive_candidates()
+            if candidates is not None:
+                candidates = set(candidates)
+            for score, software_1, software_2 in incidence.pairs(scores):
+                if candidates is None or \
+                        (software_1, software_2) in candidates:
+                    yield self.ScoredPair(score, software_1, software_2)
+        else:
+            matching_graph = invert_index.derive_matching_graph()
+            for score, software_1, software_2 in \
+                    similarity.score_graph(invert_index, matching_graph):
+                yield self.ScoredPair(score, software_1, software_2)
+
+    def _select(self, scored_pairs):
+        higher_more_similar = self.similarity.higher_more_similar
+        if self.threshold is not None:
+            threshold = self.threshold
+            if higher_more_similar:
+                scored_pairs = (x for x in scored_pairs
+                                if x.score >= threshold)
+            else:
+                scored_pairs = (x for x in scored_pairs
+                                if x.score <= threshold)
+
+        key = self._order()
+        if self.k is None:
+            return sorted(scored_pairs, key=key)
+        # Same order as the full sort, but only k pairs held in memory
+        return heapq.nsmallest(self.k, scored_pairs, key=key)
+
+    def _order(self):
+        # Most similar pairs first, ties broken by the names of the
+        # softwares so that patched and rebuilt rankings agree
+        sign = -1 if self.similarity.higher_more_similar else 1
+        return lambda x: (sign * x.score, x.software_1.name,
+                          x.software_2.name)
 
-        matching_graph = invert_index.derive_matching_graph()
-
-        ls = []
-        for software_1, software_2, shareprints in matching_graph:
-            score = similarity(invert_index, software_1, software_2, shareprints)
-            ls.append(cls.ScoredPair(score, software_1, software_2))
-
-        ls.sort(key=lambda x: x.score,
-                reverse=similarity.higher_more_similar)
+    @property
+    def is_partial(self):
+        """Whether some matching pairs are not held by the ranking"""
+        return self.k is not None or self.threshold is not None
 
+    def _set(self, ls):
         map = {}
         for i, scored_pair in enumerate(ls):
             map[(scored_pair.software_1, scored_pair.software_2)] = i
 
-        ranking.ranking = ls
-        ranking.map = map
+        self.ranking = ls
+        self.map = map
+
+    def update(self, invert_index, affected, changed=()):
+        """
+        Update the ranking after a modification of the index.
+
+        Parameters
+        ----------
+        invert_index: `InvertIndex`
+            The modified index
+        affected: set of frozenset or None
+            The pairs of softwares whose shareprints changed (None if
+            unknown)
+        changed: set of `Software`
+            The softwares whose active fingerprints changed
+        """
+        self.similarity.reset()
+        self.invert_index = invert_index
+        if self.similarity.depends_on == "corpus" or self.is_partial or \
+                affected is None:
+            # A partial ranking cannot be patched: pairs which were not kept
+            # may now belong to it
+            self._set(self._select(self._score_all(invert_index)))
+            return self
 
-        return ranking
+        matching_graph = invert_index.derive_matching_graph()
+        affected = set(affected)
+        if self.similarity.depends_on == "softwares" and len(changed) > 0:
+            for software_1, software_2, _ in matching_graph:
+                if software_1 in changed or software_2 in changed:
+                    affected.add(frozenset((software_1, software_2)))
+
+        kept = [x for x in self.ranking
+                if frozenset((x.software_1, x.software_2)) not in affected]
+
+        rescored = []
+        for pair in affected:
+            software_1, software_2 = pair
+            shareprints = matching_graph[(software_1, software_2)]
+            if shareprints is None:
+                # The pair does not match any more
+                continue
+            if software_2.name < software_1.name:
+                software_1, software_2 = software_2, software_1
+            score = self.similarity(invert_index, software_1, software_2,
+                                    shareprints)
+            rescored.append(self.ScoredPair(score, software_1, software_2))
+
+        key = self._order()
+        rescored.sort(key=key)
+        self._set(list(heapq.merge(kept, rescored, key=key)))
+        return self
 
     @classmethod
-    def as_query(cls, similarity):
+    def as_query(cls, similarity, k=None, threshold=None):
         def query(invert_index):
-            return cls.from_invert_index(similarity, invert_index)
+            return cls.from_invert_index(similarity, invert_index, k,
+                                         threshold)
         return query
 
 
@@ -71,6 +248,9 @@ class Ranking(object):
         self.ranking = None
         self.map = None
         self.max_size = None
+        self.k = None
+        self.threshold = None
+        self.invert_index = None
 
     def __iter__(self):
         for i, scored_pair in enumerate(self.ranking):
@@ -80,11 +260,19 @@ class Ranking(object):
 
     def __getitem__(self, item):
         s1, s2 = item
-        i = self.map[(s1, s2)]
-        return self.ranking[i].score
+        i = self.map.get((s1, s2))
+        if i is None:
+            i = self.map.get((s2, s1))
+        if i is not None:
+            return self.ranking[i].score
+        if self.is_partial and self.invert_index is not None:
+            return self.similarity.score_pair(self.invert_index, s1, s2)
+        raise KeyError(item)
 
     def __len__(self):
-        return len(self.ranking) if self.max_size is None else self.max_size
+        if self.max_size is None:
+            return len(self.ranking)
+        return min(self.max_size, len(self.ranking))
 
     @property
     def label(self):
@@ -103,42 +291,51 @@ class Ranking(object):
 
 
 class CountSimilarity(Similarity):
+    vectorizable = True
+
     @property
     def label(self):
         return "# Shareprints"
 
+    @property
+    def depends_on(self):
+        return "shareprints"
+
+
+    def pairwise_scores(self, incidence):
+        return sparse.count_scores(incidence)
 
     def __call__(self, invert_index, software_1, software_2, shareprints):
         return len(shareprints)
 
 
 class JaccardSimilarity(Similarity):
+    vectorizable = True
+
     @property
     def label(self):
         return "Jaccard index"
 
+    @property
+    def depends_on(self):
+        return "softwares"
+
     def format_score(self, x):
         return "{:.2f}".format(x).zfill(2)
 
-    def _count_active_fingerprints(self, invert_index, software):
-        n = software.count_fingerprints()
-        for fp in software.yield_fingerprints():
-            if invert_index.is_skipped(fp):
-                n -= 1
-        return n
-
     def __call__(self, invert_index, software_1, software_2, shareprints):
-        n_fp1 = self._count_active_fingerprints(invert_index, software_1)
-        n_fp2 = self._count_active_fingerprints(invert_index, software_2)
+        stats = invert_index.derive_software_stats()
+        n_fp1 = stats.n_active[software_1]
+        n_fp2 = stats.n_active[software_2]
 
         return float(len(shareprints)) / (n_fp1 + n_fp2 - len(shareprints))
 
+    def pairwise_scores(self, incidence):
+        return sparse.jaccard_scores(incidence)
+
 
 class TfIdfSimilarity(Similarity):
-    def __init__(self):
-        self.tf_cache = {}
-        self.idf_cache = {}
-        self.norm_cache = {}
+    vectorizable = True
 
     @property
     def label(self):
@@ -148,52 +345,32 @@ class TfIdfSimilarity(Similarity):
         return "{:.2f}".format(x).zfill(2)
 
 
-    def _tf(self, invert_index, fingerprint, software):
-        # Augmented Frequency (aka. double normalization 0.5) is used
-        # to treat all softwares similarly, independently of the number
-        # of fingerprints they contain
-
-        max_n_fp = max(len(software[fp])
-                       for fp in software.yield_fingerprints()
-                       if not invert_index.is_skipped(fp))
-
-        return .5 + .5 * len(software[fingerprint]) / float(max_n_fp)
-
-    def _idf(self, fingerprint, invert_index):
-        n_softwares = len(invert_index.get_softwares())
-        n_softwares_with_fp = len(invert_index[fingerprint])
-        return math.log(n_softwares / float(n_softwares_with_fp))
-
     def tfidf(self, invert_index, fingerprint, software):
-        tf = self.tf_cache.get((fingerprint, software))
-        if tf is None:
-            tf = self._tf(invert_index, fingerprint, software)
-            self.tf_cache[(fingerprint, software)] = tf
-
-        idf = self.idf_cache.get(fingerprint)
-        if idf is None:
-            idf = self._idf(fingerprint, invert_index)
-            self.idf_cache[fingerprint] = idf
-
-        return tf * idf
+        return invert_index.derive_software_stats().tfidf(fingerprint,
+                                                          software)
 
     def norm(self, invert_index, software):
-        x = self.norm_cache.get(software)
-        if x is None:
-            x = math.sqrt(sum(self.tfidf(invert_index, fingerprint, software)**2
-                             for fingerprint in software.yield_fingerprints()
-                              if not invert_index.is_skipped(fingerprint)))
-            self.norm_cache[software] = x
-        return x
+        return invert_index.derive_software_stats().norm[software]
 
     def __call__(self, invert_index, software_1, software_2, shareprints):
         # Cosine similarity
-        sp = sum((self.tfidf(invert_index, fingerprint, software_1) *
-                  self.tfidf(invert_index, fingerprint, software_1))
+        stats = invert_index.derive_software_stats()
+        sp = sum(stats.tfidf(fingerprint, software_1) *
+                 stats.tfidf(fingerprint, software_2)
                  for fingerprint in shareprints
                  if not invert_index.is_skipped(fingerprint))
 
-        n_1 = self.norm(invert_index, software_1)
-        n_2 = self.norm(invert_index, software_2)
+        return sp / (stats.norm[software_1] * stats.norm[software_2])
+
+    def score_graph(self, invert_index, matching_graph):
+        # The dot products of all the pairs are accumulated from the
+        # postings: the shareprints of each pair are not materialised
+        stats = invert_index.derive_software_stats()
+        norm = stats.norm
+        for software_1, software_2, sp in \
+                matching_graph.accumulate(stats.tfidf):
+            yield sp / (norm[software_1] * norm[software_2]), \
+                software_1, software_2
 
-        return sp / (n_1 * n_2)
+    def pairwise_scores(self, incidence):
+        return sparse.tfidf_scores(incidence)
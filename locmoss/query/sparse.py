@@ -0,0 +1,150 @@
+"""
+Vectorised computation of the pairwise similarities.
+
+The softwares of an `InvertIndex` are represented by a sparse
+software x fingerprint incidence matrix (skipped fingerprints removed) so
+that the scores of all the pairs are obtained through sparse matrix
+products instead of one Python call per pair.
+
+This requires NumPy and SciPy, which are optional dependencies.
+"""
+try:
+    import numpy as np
+    import scipy.sparse as sp
+except ImportError:  # pragma: no cover
+    np = None
+    sp = None
+
+
+def is_available():
+    return sp is not None
+
+
+def _check_available():
+    if not is_available():
+        raise ImportError("The vectorised similarities require numpy and "
+                          "scipy")
+
+
+class Incidence(object):
+    """
+    `Incidence`
+    ===========
+    Sparse software x fingerprint matrix of an `InvertIndex`.
+
+    Attributes
+    ----------
+    softwares: list of `Software`
+        The softwares (rows), in the order of `get_softwares`
+    fingerprints: numpy array of uint64
+        The (sorted) active fingerprints (columns)
+    counts: CSR matrix
+        The number of occurrences of each fingerprint in each software
+    """
+    def __init__(self, softwares, fingerprints, counts):
+        self.softwares = softwares
+        self.fingerprints = fingerprints
+        self.counts = counts
+
+    @classmethod
+    def from_invert_index(cls, invert_index):
+        _check_available()
+        softwares = list(invert_index.get_softwares())
+        fingerprints = np.array(sorted(fp for fp, _ in invert_index),
+                                dtype=np.uint64)
+
+        rows, cols, data = [], [], []
+        for i, software in enumerate(softwares):
+            hashes = np.frombuffer(software.compact_arrays()[0],
+                                   dtype=np.uint64)
+            if len(hashes) == 0 or len(fingerprints) == 0:
+                continue
+            # Hashes are sorted by fingerprint
+            unique, counts = np.unique(hashes, return_counts=True)
+            positions = np.searchsorted(fingerprints, unique)
+            positions[positions == len(fingerprints)] = 0
+            active = fingerprints[positions] == unique
+            cols.append(positions[active])
+            data.append(counts[active])
+            rows.append(np.full(int(active.sum()), i))
+
+        shape = len(softwares), len(fingerprints)
+        if len(rows) == 0:
+            counts = sp.csr_matrix(shape, dtype=np.float64)
+        else:
+            counts = sp.csr_matrix((np.concatenate(data).astype(np.float64),
+                                    (np.concatenate(rows),
+                                     np.concatenate(cols))),
+                                   shape=shape)
+        return cls(softwares, fingerprints, counts)
+
+    @property
+    def binary(self):
+        binary = self.counts.copy()
+        binary.data[:] = 1
+        return binary
+
+    def shared(self):
+        """Number of distinct (active) fingerprints shared by each pair"""
+        binary = self.binary
+        return (binary @ binary.T).tocsr()
+
+    def pairs(self, scores):
+        """
+        Yield the triplets (score, software_1, software_2) of the pairs
+        sharing at least one fingerprint, with software_1 < software_2.
+
+        Parameters
+        ----------
+        scores: callable
+            Map the shared counts (a COO matrix restricted to the pairs
+            i < j) to the array of the corresponding scores
+        """
+        shared = sp.triu(self.shared(), k=1).tocoo()
+        # Row-major order so that ties are ranked deterministically
+        order = np.lexsort((shared.col, shared.row))
+        shared = sp.coo_matrix((shared.data[order], (shared.row[order],
+                                                     shared.col[order])),
+                               shape=shared.shape)
+        values = scores(shared)
+        for i, j, score in zip(shared.row.tolist(), shared.col.tolist(),
+                               values.tolist()):
+            yield score, self.softwares[i], self.softwares[j]
+
+
+def count_scores(incidence):
+    return lambda shared: shared.data.astype(np.int64)
+
+
+def jaccard_scores(incidence):
+    sizes = np.asarray(incidence.binary.sum(axis=1)).ravel()
+
+    def scores(shared):
+        union = sizes[shared.row] + sizes[shared.col] - shared.data
+        return shared.data / union
+    return scores
+
+
+def tfidf_scores(incidence):
+    counts = incidence.counts
+    n_softwares = counts.shape[0]
+
+    # Augmented frequency (see `TfIdfSimilarity._tf`)
+    max_counts = counts.max(axis=1).toarray().ravel()
+    max_counts[max_counts == 0] = 1
+    weights = counts.tocsr(copy=True)
+    row_of = np.repeat(np.arange(n_softwares), np.diff(weights.indptr))
+    weights.data = .5 + .5 * weights.data / max_counts[row_of]
+
+    document_freq = np.bincount(weights.indices, minlength=counts.shape[1])
+    idf = np.log(n_softwares / np.maximum(document_freq, 1))
+    weights.data *= idf[weights.indices]
+
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1))
+                    .ravel())
+    dot = (weights @ weights.T).tocsr()
+
+    def scores(shared):
+        products = np.asarray(dot[shared.row, shared.col]).ravel()
+        return products / (norms[shared.row] * norms[shared.col])
+    return scores
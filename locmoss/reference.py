@@ -0,0 +1,191 @@
+"""
+Prebuilt filter of the fingerprints of reference code (starter code,
+framework headers, etc.), stored on disk and applied while winnowing so
+that those fingerprints never enter the index.
+
+Layout
+------
+All integers are stored in the native byte order (recorded in the header).
+
+    magic (8 bytes) | header length (uint32) | header (JSON, utf-8)
+    bitmap          uint8[bitmap_bits / 8]   bits set by the fingerprints
+    fingerprints    uint64[n]                sorted, unique
+
+Both sections are aligned on 8 bytes. The header holds the parameters the
+fingerprints depend on (kgram length, hash function), their digest and the
+position of the sections.
+"""
+import json
+import mmap as mmap_
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from hashlib import sha1
+
+from locmoss.software import Software
+
+
+MAGIC = b"LOCMOSSR"
+VERSION = 1
+
+
+class ReferenceFilter(object):
+    """
+    `ReferenceFilter`
+    =================
+    Set of the fingerprints of *all* the kgrams of reference files (not
+    only the winnowed ones): any kgram of a software also found in the
+    reference is discarded, whatever the window size.
+
+    Membership is tested in two steps: a bitmap indexed by the low bits of
+    the fingerprints (a Bloom filter with a single hash function, since
+    fingerprints are hashes already) rejects most of the fingerprints, the
+    others are looked for by binary search in the sorted array.
+
+    Parameters
+    ----------
+    fingerprints: sorted sequence of int
+        The unique fingerprints (e.g. an array or a memory view)
+    bitmap: bytes-like
+        Bitmap of `fingerprint & (bitmap_bits - 1)`
+    k: int
+        Length of the kgrams
+    hash_name: str
+        Hash function of the kgrams (see `Winnower.hash_name`)
+    digest: str
+        Digest of the fingerprints (identifies the filter)
+    path: str or None (default: None)
+        The file from which the filter was loaded
+    """
+    @classmethod
+    def from_fingerprints(cls, fingerprints, k, hash_name):
+        fingerprints = array("Q", sorted(set(fingerprints)))
+        bitmap_bits = 1 << 16
+        while bitmap_bits < 8 * len(fingerprints):
+            bitmap_bits <<= 1
+        bitmap = bytearray(bitmap_bits // 8)
+        mask = bitmap_bits - 1
+        for fingerprint in fingerprints:
+            idx = fingerprint & mask
+            bitmap[idx >> 3] |= 1 << (idx & 7)
+        digest = sha1(fingerprints.tobytes()).hexdigest()
+        return cls(fingerprints, bitmap, k, hash_name, digest)
+
+    @classmethod
+    def build(cls, winnower, paths, name="Reference"):
+        """Filter of the files `paths`, with the kgrams of `winnower`"""
+        software = Software(name, paths)
+        fingerprints = set()
+        for source_file in software:
+            parser = winnower.create_parser(source_file, software)
+            fingerprints.update(winnower.kgram_fingerprints(parser))
+        return cls.from_fingerprints(fingerprints, winnower.k,
+                                     winnower.hash_name)
+
+    def __init__(self, fingerprints, bitmap, k, hash_name, digest,
+                 path=None):
+        self.fingerprints = fingerprints
+        self.bitmap = bitmap
+        self.mask = len(bitmap) * 8 - 1
+        self.k = k
+        self.hash_name = hash_name
+        self.digest = digest
+        self.path = path
+
+    def __repr__(self):
+        return "{}(<{} fingerprints>, k={}, hash_name={}, digest={})" \
+               "".format(self.__class__.__name__, len(self), repr(self.k),
+                         repr(self.hash_name), repr(self.digest))
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def __contains__(self, fingerprint):
+        idx = fingerprint & self.mask
+        if not self.bitmap[idx >> 3] & (1 << (idx & 7)):
+            return False
+        fingerprints = self.fingerprints
+        i = bisect_left(fingerprints, fingerprint)
+        return i < len(fingerprints) and fingerprints[i] == fingerprint
+
+    def __reduce__(self):
+        # Loaded again from the file if possible (e.g. in worker processes)
+        if self.path is not None:
+            return self.__class__.load, (self.path,)
+        return self.__class__, (array("Q", self.fingerprints),
+                                bytes(self.bitmap), self.k, self.hash_name,
+                                self.digest)
+
+    def check(self, winnower):
+        """Raise a `ValueError` if the fingerprints of `winnower` cannot be
+        compared with those of the filter"""
+        if (winnower.k, winnower.hash_name) != (self.k, self.hash_name):
+            raise ValueError("Reference filter built for k={} and '{}' "
+                             "hashing (not k={} and '{}')"
+                             "".format(self.k, self.hash_name, winnower.k,
+                                       winnower.hash_name))
+
+    def save(self, path):
+        sections = [("bitmap", bytes(self.bitmap)),
+                    ("fingerprints", bytes(array("Q", self.fingerprints)))]
+        positions = {}
+        position = 0
+        for name, data in sections:
+            position += (-position) % 8
+            positions[name] = [position, len(data)]
+            position += len(data)
+
+        header = json.dumps({
+            "version": VERSION,
+            "byteorder": sys.byteorder,
+            "k": self.k,
+            "hash_name": self.hash_name,
+            "digest": self.digest,
+            "sections": positions,
+        }).encode("utf-8")
+        header += b" " * ((-(len(MAGIC) + 4 + len(header))) % 8)
+
+        with open(path, "wb") as hdl:
+            hdl.write(MAGIC)
+            hdl.write(struct.pack("<I", len(header)))
+            hdl.write(header)
+            written = 0
+            for name, data in sections:
+                pad = positions[name][0] - written
+                hdl.write(b"\0" * pad)
+                hdl.write(data)
+                written += pad + len(data)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a filter saved with `save` (memory-mapped if `mmap`)"""
+        with open(path, "rb") as hdl:
+            if mmap:
+                buffer = mmap_.mmap(hdl.fileno(), 0, access=mmap_.ACCESS_READ)
+            else:
+                buffer = hdl.read()
+
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("Not a locmoss reference filter")
+        start = len(MAGIC) + 4
+        header_len, = struct.unpack("<I", view[len(MAGIC):start])
+        header = json.loads(bytes(view[start:start + header_len])
+                            .decode("utf-8"))
+        if header["version"] != VERSION:
+            raise ValueError("Unsupported reference filter version: {}"
+                             "".format(header["version"]))
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError("Reference filter saved with a different byte "
+                             "order")
+
+        data_start = start + header_len
+
+        def section(name):
+            position, length = header["sections"][name]
+            begin = data_start + position
+            return view[begin:begin + length]
+
+        return cls(section("fingerprints").cast("Q"), section("bitmap"),
+                   header["k"], header["hash_name"], header["digest"], path)
@@ -1,10 +1,25 @@
 import glob
 import os
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import OrderedDict
-from collections import defaultdict
+
+from locmoss.location import Location
+from locmoss.symbols import SymbolTable, symbol_table
 
 
 class Software(object):
+    """
+    `Software`
+    ==========
+    A set of source files together with their fingerprints.
+
+    Fingerprints are stored compactly as parallel arrays (fingerprint, file
+    index, line, column) together with a table of the file paths. The arrays
+    are sorted by fingerprint lazily (on the first lookup following an
+    addition) so that the locations of a given fingerprint are found by
+    binary search. `Location` objects are only created on demand.
+    """
     @classmethod
     def list_from_globs(cls, patterns, realpath=False):
         tree = Tree.from_glob_pattern(patterns, realpath)
@@ -13,24 +28,142 @@ class Software(object):
     def __init__(self, name, files=()):
         self.name = name
         self.source_files = tuple(files)
-        self.fingerprints = defaultdict(list)
+        self.file_table = list(self.source_files)
+        self._file_indices = {f: i for i, f in enumerate(self.file_table)}
+        self._hashes = array("Q")
+        self._files = array("I")
+        self._lines = array("I")
+        self._columns = array("I")
+        self._sorted = True
+        self._n_unique = 0
+        # (One of) the kgram(s) of each fingerprint, for display: either its
+        # packed symbol ids (see `SymbolTable.pack`) or its text
+        self.kgrams = {}
 
     def __iter__(self):
         for source_file in self.source_files:
             yield source_file
 
-    def add_fingerprint(self, fingerprint, location):
-        self.fingerprints[fingerprint].append(location)
+    def file_index(self, source_file):
+        idx = self._file_indices.get(source_file)
+        if idx is None:
+            idx = len(self.file_table)
+            self._file_indices[source_file] = idx
+            self.file_table.append(source_file)
+        return idx
+
+    def add_fingerprint(self, fingerprint, location, kgram=None):
+        self.add_compact(fingerprint, self.file_index(location.source_file),
+                         location.start_line, location.start_column, kgram)
+
+    def add_compact(self, fingerprint, file_idx, line, column, kgram=None):
+        self._hashes.append(fingerprint)
+        self._files.append(file_idx)
+        self._lines.append(line)
+        self._columns.append(column)
+        self._sorted = False
+        if kgram is not None and fingerprint not in self.kgrams:
+            packed = getattr(kgram, "packed", None)
+            self.kgrams[fingerprint] = str(kgram) if packed is None \
+                else packed
+
+    def _sort(self):
+        if self._sorted:
+            return
+        hashes = self._hashes
+        # Stable: the locations of a fingerprint keep their insertion order
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        for name in ("_hashes", "_files", "_lines", "_columns"):
+            arr = getattr(self, name)
+            setattr(self, name, array(arr.typecode, (arr[i] for i in order)))
+
+        hashes = self._hashes
+        self._n_unique = sum(1 for i in range(len(hashes))
+                             if i == 0 or hashes[i] != hashes[i - 1])
+        self._sorted = True
+
+    def _range(self, fingerprint):
+        self._sort()
+        start = bisect_left(self._hashes, fingerprint)
+        end = bisect_right(self._hashes, fingerprint, start)
+        return start, end
+
+    def compact_arrays(self):
+        """Return the arrays (fingerprints, file indices, lines, columns),
+        sorted by fingerprint"""
+        self._sort()
+        return self._hashes, self._files, self._lines, self._columns
+
+    @classmethod
+    def from_compact(cls, name, source_files, file_table, hashes, files,
+                     lines, columns, n_unique=None, kgrams=None):
+        """Create a software from arrays sorted by fingerprints (any
+        sequence supporting indexing, e.g. memory views, will do)"""
+        software = cls(name, source_files)
+        software.file_table = list(file_table)
+        software._file_indices = {f: i for i, f in
+                                  enumerate(software.file_table)}
+        software._hashes = hashes
+        software._files = files
+        software._lines = lines
+        software._columns = columns
+        software._sorted = True
+        if n_unique is None:
+            n_unique = sum(1 for _ in software.yield_fingerprints())
+        software._n_unique = n_unique
+        if kgrams is not None:
+            software.kgrams = kgrams
+        return software
+
+    def kgram_str(self, fingerprint):
+        """Return the text of (one of) the kgram(s) of the given
+        fingerprint"""
+        kgram = self.kgrams.get(fingerprint)
+        if kgram is None:
+            return "{:x}".format(fingerprint)
+        if isinstance(kgram, str):
+            return kgram
+        return symbol_table.decode(SymbolTable.unpack(kgram))
+
+    def kgram_len(self, fingerprint):
+        """Number of symbols of (one of) the kgram(s) of the given
+        fingerprint, or None if not known"""
+        kgram = self.kgrams.get(fingerprint)
+        if kgram is None or isinstance(kgram, str):
+            return None
+        return len(SymbolTable.unpack(kgram))
 
     def yield_fingerprints(self):
-        for fp in self.fingerprints.keys():
-            yield fp
+        self._sort()
+        previous = None
+        for fp in self._hashes:
+            if fp != previous:
+                yield fp
+                previous = fp
+
+    def yield_fingerprint_counts(self):
+        """Yield pairs (fingerprint, number of occurrences)"""
+        self._sort()
+        hashes = self._hashes
+        start = 0
+        for end in range(1, len(hashes) + 1):
+            if end == len(hashes) or hashes[end] != hashes[start]:
+                yield hashes[start], end - start
+                start = end
+
+    def count(self, fingerprint):
+        """Number of occurrences of the fingerprint"""
+        start, end = self._range(fingerprint)
+        return end - start
 
     def __getitem__(self, fingerprint):
-        return self.fingerprints[fingerprint]
+        start, end = self._range(fingerprint)
+        return [Location(self.file_table[self._files[i]], self._lines[i],
+                         self._columns[i]) for i in range(start, end)]
 
     def count_fingerprints(self):
-        return len(self.fingerprints)
+        self._sort()
+        return self._n_unique
 
     def __repr__(self):
         return "{}({}, {})".format(self.__class__.__name__,
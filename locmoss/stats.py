@@ -0,0 +1,69 @@
+import math
+
+
+class SoftwareStats(object):
+    """
+    `SoftwareStats`
+    ===============
+    Per-software statistics of an `InvertIndex`, computed once (in a single
+    pass over the fingerprints of each software) and shared by all the
+    similarities. Only the active (i.e. not skipped) fingerprints are taken
+    into account.
+
+    Use `InvertIndex.derive_software_stats` rather than building it
+    directly: the table is then invalidated together with the index.
+
+    Attributes
+    ----------
+    n_softwares: int
+        The number of softwares in the index
+    n_active: dict
+        Software -> number of distinct active fingerprints
+    max_tf: dict
+        Software -> highest multiplicity of an active fingerprint
+    idf: dict
+        Active fingerprint -> inverse document frequency
+    norm: dict
+        Software -> norm of its tf-idf vector
+    """
+    @classmethod
+    def from_invert_index(cls, invert_index):
+        stats = cls()
+        softwares = invert_index.get_softwares()
+        stats.n_softwares = len(softwares)
+
+        for fp, postings in invert_index:
+            stats.idf[fp] = math.log(stats.n_softwares / float(len(postings)))
+
+        for software in softwares:
+            counts = [(fp, count)
+                      for fp, count in software.yield_fingerprint_counts()
+                      if fp in stats.idf]
+            stats.n_active[software] = len(counts)
+            max_tf = max((count for _, count in counts), default=0)
+            stats.max_tf[software] = max_tf
+            stats.norm[software] = math.sqrt(sum(
+                (stats._tf(count, max_tf) * stats.idf[fp]) ** 2
+                for fp, count in counts))
+
+        return stats
+
+    def __init__(self):
+        self.n_softwares = 0
+        self.n_active = {}
+        self.max_tf = {}
+        self.idf = {}
+        self.norm = {}
+
+    @classmethod
+    def _tf(cls, count, max_tf):
+        # Augmented Frequency (aka. double normalization 0.5) is used
+        # to treat all softwares similarly, independently of the number
+        # of fingerprints they contain
+        return .5 + .5 * count / float(max_tf)
+
+    def tf(self, fingerprint, software):
+        return self._tf(software.count(fingerprint), self.max_tf[software])
+
+    def tfidf(self, fingerprint, software):
+        return self.tf(fingerprint, software) * self.idf[fingerprint]
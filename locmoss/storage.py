@@ -0,0 +1,290 @@
+"""
+Binary (memory-mappable) storage of an `InvertIndex`.
+
+Layout
+------
+All integers are stored in the native byte order (recorded in the header).
+
+    magic (8 bytes) | header length (uint32) | header (JSON, utf-8)
+    sections, each aligned on 8 bytes:
+        fingerprints    uint64[n_fp]     sorted fingerprint table
+        offsets         uint64[n_fp + 1] CSR offsets into `postings`
+        postings        uint32[n_post]   software ids
+        skips           uint8[⌈n_fp/8⌉]  bitmap of skipped fingerprints
+        raw             uint8[⌈n_fp/8⌉]  bitmap of fingerprints with postings
+        kgram_offsets   uint64[n_fp + 1] offsets into `kgram_ids`
+        kgram_ids       uint32[n_ids]    symbol ids of the kgrams
+        for each software (sorted by fingerprint):
+            hashes uint64[n] | files uint32[n] | lines uint32[n] |
+            columns uint32[n]
+
+The header holds the position of each section, the software names and
+their file tables, and the symbol table decoding the kgrams (ids are those
+of the saved file, not of the process).
+"""
+import json
+import mmap as mmap_
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from locmoss.moss import InvertIndex
+from locmoss.software import Software
+from locmoss.symbols import SymbolTable, symbol_table
+
+
+MAGIC = b"LOCMOSSI"
+VERSION = 2
+
+
+def _to_bitmap(flags):
+    bitmap = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    return bitmap
+
+
+def save_invert_index(invert_index, path):
+    softwares = invert_index.get_softwares()
+    software_ids = {id(s): i for i, s in enumerate(softwares)}
+
+    raw = {fp: postings for fp, postings in invert_index.iter_raw()}
+    fingerprints = array("Q", sorted(set(raw) | set(invert_index.skips)))
+
+    kgrams = {}
+    for software in softwares:
+        for fp in software.yield_fingerprints():
+            if fp not in kgrams:
+                kgram = software.kgrams.get(fp)
+                if kgram is not None:
+                    kgrams[fp] = kgram
+
+    offsets = array("Q", [0])
+    postings = array("I")
+    # Only the symbols of the saved kgrams
+    symbols = SymbolTable()
+    kgram_offsets = array("Q", [0])
+    kgram_ids = array("I")
+    skips, raws = [], []
+    for fp in fingerprints:
+        is_raw = fp in raw
+        raws.append(is_raw)
+        skips.append(invert_index.is_skipped(fp))
+        if is_raw:
+            postings.extend(sorted(software_ids[id(s)] for s in raw[fp]))
+        offsets.append(len(postings))
+        kgram = kgrams.get(fp)
+        if isinstance(kgram, str):
+            # Text only: stored as a single symbol
+            kgram_ids.append(symbols.intern(kgram))
+        elif kgram is not None:
+            kgram_ids.extend(symbols.intern(symbol_table[i])
+                             for i in SymbolTable.unpack(kgram))
+        kgram_offsets.append(len(kgram_ids))
+
+    sections = [("fingerprints", fingerprints), ("offsets", offsets),
+                ("postings", postings), ("skips", _to_bitmap(skips)),
+                ("raw", _to_bitmap(raws)), ("kgram_offsets", kgram_offsets),
+                ("kgram_ids", kgram_ids)]
+
+    software_headers = []
+    for i, software in enumerate(softwares):
+        arrays = software.compact_arrays()
+        prefix = "software_{}_".format(i)
+        for name, arr in zip(("hashes", "files", "lines", "columns"), arrays):
+            sections.append((prefix + name, arr))
+        software_headers.append({
+            "name": software.name,
+            "source_files": list(software.source_files),
+            "file_table": list(software.file_table),
+            "n_unique": software.count_fingerprints(),
+        })
+
+    # Position of the sections, relative to the end of the header
+    positions = {}
+    position = 0
+    for name, data in sections:
+        position += (-position) % 8
+        positions[name] = [position, len(data)]
+        position += len(bytes(data))
+
+    header = json.dumps({
+        "version": VERSION,
+        "byteorder": sys.byteorder,
+        "sections": positions,
+        "softwares": software_headers,
+        "symbols": symbols.symbols,
+    }).encode("utf-8")
+    header += b" " * ((-(len(MAGIC) + 4 + len(header))) % 8)
+
+    with open(path, "wb") as hdl:
+        hdl.write(MAGIC)
+        hdl.write(struct.pack("<I", len(header)))
+        hdl.write(header)
+        written = 0
+        for name, data in sections:
+            pad = positions[name][0] - written
+            hdl.write(b"\0" * pad)
+            data = bytes(data)
+            hdl.write(data)
+            written += pad + len(data)
+
+
+def load_invert_index(path, mmap=True):
+    with open(path, "rb") as hdl:
+        if mmap:
+            buffer = mmap_.mmap(hdl.fileno(), 0, access=mmap_.ACCESS_READ)
+        else:
+            buffer = hdl.read()
+    return MappedInvertIndex(buffer)
+
+
+class KGramTable(object):
+    """Read-only mapping fingerprint -> kgram text backed by the stored
+    tables"""
+    def __init__(self, index, symbols):
+        self.index = index
+        self.symbols = symbols
+
+    def get(self, fingerprint, default=None):
+        idx = self.index.find(fingerprint)
+        if idx < 0:
+            return default
+        start, end = self.index.kgram_offsets[idx:idx + 2]
+        if start == end:
+            return default
+        return self.symbols.decode(self.index.kgram_ids[start:end])
+
+    def __contains__(self, fingerprint):
+        return self.get(fingerprint) is not None
+
+
+class MappedInvertIndex(InvertIndex):
+    """
+    `MappedInvertIndex`
+    ===================
+    Read-only `InvertIndex` backed by a buffer (typically a memory-mapped
+    file) in the layout of `save_invert_index`. Lookups are performed by
+    binary search on the fingerprint table: nothing is deserialised
+    beforehand except for the software names and file tables.
+    """
+    def __init__(self, buffer):
+        super().__init__()
+        self.buffer = buffer
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("Not a locmoss index")
+        start = len(MAGIC) + 4
+        header_len, = struct.unpack("<I", view[len(MAGIC):start])
+        header = json.loads(bytes(view[start:start + header_len])
+                            .decode("utf-8"))
+        if header["version"] != VERSION:
+            raise ValueError("Unsupported index version: {}"
+                             "".format(header["version"]))
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError("Index saved with a different byte order")
+
+        data_start = start + header_len
+        typecodes = {"fingerprints": "Q", "offsets": "Q", "postings": "I",
+                     "skips": "B", "raw": "B", "kgram_offsets": "Q",
+                     "kgram_ids": "I", "hashes": "Q", "files": "I", "lines": "I",
+                     "columns": "I"}
+
+        def section(name):
+            position, length = header["sections"][name]
+            typecode = typecodes[name.rsplit("_", 1)[-1]] \
+                if name.startswith("software_") else typecodes[name]
+            size = length * array(typecode).itemsize
+            begin = data_start + position
+            return view[begin:begin + size].cast(typecode)
+
+        self.fingerprints = section("fingerprints")
+        self.offsets = section("offsets")
+        self.postings = section("postings")
+        self.skip_bitmap = section("skips")
+        self.raw_bitmap = section("raw")
+        self.kgram_offsets = section("kgram_offsets")
+        self.kgram_ids = section("kgram_ids")
+
+        kgrams = KGramTable(self, SymbolTable(header["symbols"]))
+        self.softwares = []
+        for i, desc in enumerate(header["softwares"]):
+            prefix = "software_{}_".format(i)
+            arrays = [section(prefix + name)
+                      for name in ("hashes", "files", "lines", "columns")]
+            self.softwares.append(Software.from_compact(
+                desc["name"], desc["source_files"], desc["file_table"],
+                *arrays, n_unique=desc["n_unique"], kgrams=kgrams))
+        self._softwares = self.softwares
+
+    def _dirty(self):
+        # Nothing to invalidate: read-only
+        pass
+
+    def add(self, fingerprint, software, skip=False):
+        raise TypeError("{} is read-only".format(self.__class__.__name__))
+
+    def invalidate(self, fingerprint):
+        raise TypeError("{} is read-only".format(self.__class__.__name__))
+
+    def revalidate(self, fingerprint):
+        raise TypeError("{} is read-only".format(self.__class__.__name__))
+
+    def add_software(self, software, skip=False):
+        raise TypeError("{} is read-only".format(self.__class__.__name__))
+
+    def add_softwares(self, softwares, filter=None):
+        raise TypeError("{} is read-only".format(self.__class__.__name__))
+
+    def remove_softwares(self, softwares, filter=None):
+        raise TypeError("{} is read-only".format(self.__class__.__name__))
+
+    def count_softwares(self, fingerprint):
+        idx = self.find(fingerprint)
+        if idx < 0:
+            return 0
+        return self.offsets[idx + 1] - self.offsets[idx]
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def find(self, fingerprint):
+        """Position of the fingerprint in the table (-1 if absent)"""
+        idx = bisect_left(self.fingerprints, fingerprint)
+        if idx < len(self.fingerprints) and \
+                self.fingerprints[idx] == fingerprint:
+            return idx
+        return -1
+
+    def _bit(self, bitmap, idx):
+        return bool(bitmap[idx >> 3] & (1 << (idx & 7)))
+
+    def _postings(self, idx):
+        start, end = self.offsets[idx:idx + 2]
+        return frozenset(self.softwares[i] for i in self.postings[start:end])
+
+    def __getitem__(self, fingerprint):
+        idx = self.find(fingerprint)
+        if idx < 0 or self._bit(self.skip_bitmap, idx):
+            return frozenset()
+        return self._postings(idx)
+
+    def __iter__(self):
+        for idx, fp in enumerate(self.fingerprints):
+            if self._bit(self.raw_bitmap, idx) and \
+                    not self._bit(self.skip_bitmap, idx):
+                yield fp, self._postings(idx)
+
+    def iter_raw(self):
+        for idx, fp in enumerate(self.fingerprints):
+            if self._bit(self.raw_bitmap, idx):
+                yield fp, self._postings(idx)
+
+    def is_skipped(self, fingerprint):
+        idx = self.find(fingerprint)
+        return idx >= 0 and self._bit(self.skip_bitmap, idx)
+
+    def get_softwares(self):
+        return self.softwares
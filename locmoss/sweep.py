@@ -0,0 +1,227 @@
+"""
+Sweep of the fingerprinting parameters (kgram length and window size):
+one index is built per combination, each file being lexed only once, and
+the resulting rankings are compared.
+"""
+from itertools import product
+
+from locmoss.cache import TokenStreams
+from locmoss.moss import MossEngine, Filter
+from locmoss.query.query import Query
+from locmoss.query.report import Score
+from locmoss.query.similarity import Ranking, TfIdfSimilarity
+from locmoss.software import Software
+from locmoss.winnowing import Winnower
+
+
+def parse_values(spec):
+    """
+    Parse a set of integers such as "4..8" (inclusive range), "10..20:5"
+    (range with a step), "5" or "4,6,8" (the forms can be mixed)
+    """
+    values = []
+    for part in spec.split(","):
+        part = part.strip()
+        try:
+            if ".." in part:
+                bounds, _, step = part.partition(":")
+                start, end = bounds.split("..")
+                values.extend(range(int(start), int(end) + 1,
+                                    int(step) if step else 1))
+            else:
+                values.append(int(part))
+        except ValueError:
+            raise ValueError("Invalid values: '{}' (expected e.g. '4..8', "
+                             "'10..20:5' or '4,6,8')".format(spec))
+    if len(values) == 0:
+        raise ValueError("Invalid values: '{}' (empty)".format(spec))
+    return sorted(set(values))
+
+
+class SweepResult(object):
+    def __init__(self, kgram_len, window_size, invert_index, ranking):
+        self.kgram_len = kgram_len
+        self.window_size = window_size
+        self.invert_index = invert_index
+        self.ranking = ranking
+        self._softwares = None
+
+    @property
+    def setting(self):
+        return self.kgram_len, self.window_size
+
+    def pairs(self):
+        """The pairs (of software names) of the ranking, in order"""
+        return [frozenset((s1.name, s2.name)) for _, s1, s2 in self.ranking]
+
+    def score(self, pair):
+        """Score of a pair of software names (computed if not ranked)"""
+        if self._softwares is None:
+            self._softwares = {s.name: s for s in
+                               self.invert_index.get_softwares()}
+        name_1, name_2 = sorted(pair)
+        return self.ranking[(self._softwares[name_1],
+                             self._softwares[name_2])]
+
+    def __repr__(self):
+        return "{}(k={}, w={})".format(self.__class__.__name__,
+                                       self.kgram_len, self.window_size)
+
+
+class Sweep(object):
+    """
+    `Sweep`
+    =======
+    Build one index per combination of kgram length and window size. The
+    files are lexed once (see `TokenStreams`): only the kgrams and the
+    winnowing depend on those parameters.
+
+    Parameters
+    ----------
+    parser_factory: callable
+        Factory creating a parser from a file path
+    kgram_lens: iterable of int
+        The kgram lengths
+    window_sizes: iterable of int
+        The window sizes
+    collision_threshold: int (default: 10)
+        See `Filter`
+    similarity: `Similarity` (default: `TfIdfSimilarity()`)
+        The similarity of the rankings
+    top: int (default: 15)
+        Number of pairs of each ranking
+    token_cache: `TokenCache` or None (default: None)
+        On-disk cache of the token streams (e.g. to share them across runs)
+    hashing, hash_bits:
+        See `Winnower`
+    """
+    def __init__(self, parser_factory, kgram_lens, window_sizes,
+                 collision_threshold=10, similarity=None, top=15,
+                 token_cache=None, hashing="rolling", hash_bits=64):
+        self.parser_factory = parser_factory
+        self.kgram_lens = list(kgram_lens)
+        self.window_sizes = list(window_sizes)
+        self.collision_threshold = collision_threshold
+        self.similarity = TfIdfSimilarity() if similarity is None \
+            else similarity
+        self.top = top
+        self.hashing = hashing
+        self.hash_bits = hash_bits
+        self.token_streams = TokenStreams(token_cache)
+
+    def settings(self):
+        return list(product(self.kgram_lens, self.window_sizes))
+
+    def run(self, softwares, reference_software=None):
+        """
+        Return the `SweepResult` of each setting. Each index holds its own
+        copies of the softwares.
+        """
+        softwares = list(softwares)
+        results = []
+        for kgram_len, window_size in self.settings():
+            fingerprinter = Winnower(self.parser_factory, window_size,
+                                     kgram_len, hashing=self.hashing,
+                                     hash_bits=self.hash_bits,
+                                     token_cache=self.token_streams)
+            moss = MossEngine(fingerprinter,
+                              Filter(self.collision_threshold))
+            reference = None
+            if reference_software is not None:
+                reference = self._copy(reference_software)
+            moss.build_index([self._copy(s) for s in softwares], reference)
+            ranking = Ranking.from_invert_index(self.similarity,
+                                                moss.invert_index,
+                                                k=self.top)
+            results.append(SweepResult(kgram_len, window_size,
+                                       moss.invert_index, ranking))
+        return results
+
+    @classmethod
+    def _copy(cls, software):
+        return Software(software.name, software.source_files)
+
+
+def rank_correlation(xs, ys):
+    """Spearman rank correlation (None if undefined)"""
+    def ranks(values):
+        order = sorted(range(len(values)), key=values.__getitem__)
+        ranks = [0.] * len(values)
+        i = 0
+        while i < len(order):
+            j = i
+            while j + 1 < len(order) and \
+                    values[order[j + 1]] == values[order[i]]:
+                j += 1
+            # Ties share their average rank
+            for idx in order[i:j + 1]:
+                ranks[idx] = (i + j) / 2.
+            i = j + 1
+        return ranks
+
+    if len(xs) < 2:
+        return None
+    rx, ry = ranks(xs), ranks(ys)
+    mean = (len(xs) - 1) / 2.
+    cov = sum((a - mean) * (b - mean) for a, b in zip(rx, ry))
+    var_x = sum((a - mean) ** 2 for a in rx)
+    var_y = sum((b - mean) ** 2 for b in ry)
+    if var_x == 0 or var_y == 0:
+        return None
+    return cov / (var_x * var_y) ** .5
+
+
+class SweepSummary(Query):
+    """
+    How the rankings change across the settings of a `Sweep`, with respect
+    to a baseline setting: overlap of the top pairs and rank correlation of
+    the scores (over the pairs of both tops). The `invert_index` given to
+    the query is ignored.
+    """
+    def __init__(self, results, baseline=None, label=None):
+        super().__init__(label)
+        self.results = list(results)
+        self.baseline = self.results[0]
+        for result in self.results:
+            if result.setting == baseline:
+                self.baseline = result
+
+    def query_(self, report, invert_index):
+        baseline = self.baseline
+        base_pairs = baseline.pairs()
+        base_top = set(base_pairs)
+
+        report.add_raw("Baseline: k={}, w={}".format(*baseline.setting))
+        header = ["k", "w", "Fingerprints", "Active", "Pairs",
+                  "Top overlap", "Rank correlation", "First pair"]
+        with report.add_table(len(header), header) as table:
+            for result in self.results:
+                index = result.invert_index
+                n_fp, n_active = 0, 0
+                for fingerprint, _ in index.iter_raw():
+                    n_fp += 1
+                    if not index.is_skipped(fingerprint):
+                        n_active += 1
+                pairs = result.pairs()
+                common = sorted(set(pairs) | base_top, key=sorted)
+                correlation = rank_correlation(
+                    [baseline.score(pair) for pair in common],
+                    [result.score(pair) for pair in common])
+                overlap = len(base_top & set(pairs))
+                table.append(
+                    str(result.kgram_len), str(result.window_size),
+                    str(n_fp), str(n_active),
+                    str(len(index.derive_matching_graph())),
+                    "{}/{}".format(overlap, len(base_top)),
+                    Score(correlation, "-" if correlation is None
+                          else "{:.2f}".format(correlation)),
+                    " VS. ".join(sorted(pairs[0])) if len(pairs) > 0
+                    else "-")
+
+        tops = [set(result.pairs()) for result in self.results]
+        stable = [pair for pair in base_pairs
+                  if all(pair in top for top in tops)]
+        with report.add_list("Pairs in the top of every setting: {}"
+                             "".format(len(stable))) as report_list:
+            for pair in stable:
+                report_list.append(" VS. ".join(sorted(pair)))
@@ -0,0 +1,74 @@
+class SymbolTable(object):
+    """
+    `SymbolTable`
+    =============
+    Interning of the normalised symbols (see `locmoss.parser.normalize`):
+    each symbol is mapped to a small integer, its id, in order of first
+    appearance. Sequences of symbols (e.g. kgrams) are thus handled as
+    sequences of integers, and can be packed into a single integer.
+
+    Ids depend on the order in which symbols are met, hence on the process:
+    symbols are exchanged as text between processes (and with the disk),
+    and interned again on the other side.
+
+    Parameters
+    ----------
+    symbols: iterable of str (default: empty)
+        Initial symbols, with ids 0, 1, ...
+    """
+    PACK_BITS = 32
+    PACK_MASK = (1 << PACK_BITS) - 1
+
+    def __init__(self, symbols=()):
+        self.symbols = []
+        self.ids = {}
+        for symbol in symbols:
+            self.intern(symbol)
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, repr(self.symbols))
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __getitem__(self, symbol_id):
+        return self.symbols[symbol_id]
+
+    def intern(self, symbol):
+        """Return the id of `symbol` (registering it if needed)"""
+        symbol_id = self.ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.ids[symbol] = symbol_id
+            self.symbols.append(symbol)
+        return symbol_id
+
+    def encode(self, symbols):
+        return [self.intern(symbol) for symbol in symbols]
+
+    def decode(self, symbol_ids):
+        """Text of a sequence of ids"""
+        symbols = self.symbols
+        return "".join([symbols[i] for i in symbol_ids])
+
+    @classmethod
+    def pack(cls, symbol_ids):
+        """Pack a sequence of ids into a single integer"""
+        # Ids are shifted by one so that the length is recoverable
+        packed = 0
+        for symbol_id in reversed(symbol_ids):
+            packed = (packed << cls.PACK_BITS) | (symbol_id + 1)
+        return packed
+
+    @classmethod
+    def unpack(cls, packed):
+        symbol_ids = []
+        while packed:
+            symbol_ids.append((packed & cls.PACK_MASK) - 1)
+            packed >>= cls.PACK_BITS
+        return symbol_ids
+
+
+# Shared by all the lexers: the normalised alphabet is common to all of them
+# (e.g. "N" for any name), so that files lexed differently still match
+symbol_table = SymbolTable()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+from nose.tools import assert_equal, assert_less
+
+from locmoss.location import Location, SnippetService
+
+
+def write_file(directory, name, n_lines):
+    path = os.path.join(directory, name)
+    with open(path, "w") as hdl:
+        for i in range(n_lines):
+            hdl.write("line {}  \n".format(i + 1))
+    return path
+
+
+def test_snippet_service():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = write_file(tmp_dir, "a.c", 30)
+        service = SnippetService(pre_lines=3, post_lines=2)
+
+        assert_equal(list(service(Location(path, 10, 1))),
+                     [(i, "line {}".format(i)) for i in range(7, 13)])
+        assert_equal(list(service(Location(path, 1, 1))),
+                     [(1, "line 1"), (2, "line 2"), (3, "line 3")])
+        assert_equal(list(service(Location(path, 30, 1)))[-1],
+                     (30, "line 30"))
+        # The file is read once
+        assert_equal(service.misses, 1)
+        assert_equal(service.hits, 2)
+
+        locations = [Location(path, 25, 1), Location(path, 10, 1),
+                     Location(path, 14, 5), Location(path, 26, 1)]
+        merged = service.merge(locations)
+        assert_equal([(first, last) for _, _, (first, last) in merged],
+                     [(7, 16), (22, 28)])
+        assert_equal([[l.start_line for l in group]
+                      for _, group, _ in merged],
+                     [[10, 14], [25, 26]])
+
+
+def test_snippet_service_eviction():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = [write_file(tmp_dir, "{}.c".format(i), 100)
+                 for i in range(3)]
+        service = SnippetService(max_size=2000)
+        for path in paths:
+            list(service(Location(path, 1, 1)))
+        assert_less(service.size, 2001)
+        assert_equal(list(service.files), paths[1:])
@@ -0,0 +1,49 @@
+from nose.tools import assert_equal, assert_less
+
+from locmoss import lsh
+from locmoss.lsh import MinHashLSH
+from locmoss.query import CountSimilarity, Ranking
+from locmoss.test.test_moss import get_engine, get_softwares, \
+    graph_content, ranking_content
+
+
+def test_signature():
+    minhash = MinHashLSH(8, 2)
+    fingerprints = [3, 2**63 + 5, 42, 2**40]
+    signature = minhash.signature(fingerprints)
+    assert_equal(len(signature), 16)
+    assert_equal(signature, minhash.signature(reversed(fingerprints)))
+
+    # Pure Python fallback
+    np = lsh.np
+    lsh.np = None
+    try:
+        assert_equal(signature, minhash.signature(fingerprints))
+    finally:
+        lsh.np = np
+
+
+def test_candidates():
+    full = get_engine().build_index(get_softwares())
+    expected = graph_content(full.invert_index.derive_matching_graph())
+
+    # High recall: all the matching pairs are found
+    moss = get_engine(lsh=MinHashLSH(128, 1)).build_index(get_softwares())
+    assert_equal(graph_content(moss.invert_index.derive_matching_graph()),
+                 expected)
+
+    # Low recall: dissimilar pairs are pruned
+    moss = get_engine(lsh=MinHashLSH(1, 16)).build_index(get_softwares())
+    assert_less(len(moss.invert_index.derive_matching_graph()),
+                len(expected))
+
+
+def test_incremental_with_candidates():
+    softwares = get_softwares()
+    moss = get_engine(lsh=MinHashLSH(128, 1)).build_index(softwares[:2])
+    ranking = moss.track(moss.query(Ranking.as_query(CountSimilarity())))
+    moss.add_softwares(softwares[2:])
+
+    full = get_engine().build_index(get_softwares())
+    expected = Ranking.from_invert_index(CountSimilarity(), full.invert_index)
+    assert_equal(ranking_content(expected), ranking_content(ranking))
@@ -0,0 +1,378 @@
+import glob
+import os
+import pickle
+import tempfile
+from functools import partial
+
+import pygments.lexers
+from nose.tools import assert_equal, assert_greater, assert_less, \
+    assert_raises
+
+from locmoss import MossEngine, Parser, Winnower
+from locmoss.cache import FingerprintCache, TokenCache, TokenStreams
+from locmoss.moss import Filter, InvertIndex
+from locmoss.parser import LexerResolver
+from locmoss.query import CountSimilarity, JaccardSimilarity, Ranking, \
+    TfIdfSimilarity
+from locmoss.reference import ReferenceFilter
+from locmoss.software import Software
+from locmoss.sweep import Sweep, SweepSummary, parse_values
+
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "..", "examples")
+
+
+def get_softwares():
+    return [Software(name, [os.path.join(EXAMPLES, name, "Sort.c")])
+            for name in ("insertionsort", "mergesort_on_heap",
+                         "mergesort_on_stack")]
+
+
+def get_engine(cache=None, k=5, lsh=None):
+    lexer = pygments.lexers.get_lexer_by_name("c")
+    return MossEngine(Winnower(partial(Parser, lexer=lexer), 15, k,
+                               cache=cache), lsh=lsh)
+
+
+def index_content(moss):
+    return {fp: sorted(s.name for s in sw)
+            for fp, sw in moss.invert_index.iter_raw()}
+
+
+def software_content(software):
+    return [(fp, [str(l) for l in software[fp]])
+            for fp in software.yield_fingerprints()]
+
+
+def test_parallel_build_same_as_serial():
+    serial = get_engine().build_index(get_softwares())
+    parallel = get_engine().build_index(get_softwares(), n_jobs=2)
+
+    assert_greater(len(index_content(serial)), 0)
+    assert_equal(index_content(serial), index_content(parallel))
+    assert_equal(serial.fingerprinter.stats, parallel.fingerprinter.stats)
+
+    # Lexers guessed once per extension, as in the serial path, even if
+    # the files are spread over several processes
+    def guessing_engine():
+        parser_factory = partial(Parser, resolver=LexerResolver())
+        return MossEngine(Winnower(parser_factory, 15, 5))
+
+    def guessing_softwares():
+        return [Software(name, [os.path.join(EXAMPLES, name, f)
+                                for f in ("Sort.c", "Sort.h")])
+                for name in ("insertionsort", "mergesort_on_heap",
+                             "mergesort_on_stack")]
+
+    serial = guessing_engine().build_index(guessing_softwares())
+    parallel = guessing_engine().build_index(guessing_softwares(), n_jobs=3)
+    assert_equal(serial.fingerprinter.stats["lexer_guesses"], 2)
+    assert_equal(serial.fingerprinter.stats, parallel.fingerprinter.stats)
+    assert_equal(index_content(serial), index_content(parallel))
+
+    for s1, s2 in zip(serial.invert_index.get_softwares(),
+                      parallel.invert_index.get_softwares()):
+        assert_equal(s1.name, s2.name)
+        assert_equal(software_content(s1), software_content(s2))
+
+
+def test_fingerprint_cache():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cold = get_engine(FingerprintCache(tmp_dir))
+        cold.build_index(get_softwares())
+        assert_equal(cold.fingerprinter.cache.misses, 3)
+        assert_equal(len(cold.fingerprinter.cache), 3)
+
+        warm = get_engine(FingerprintCache(tmp_dir))
+        warm.build_index(get_softwares())
+        assert_equal(warm.fingerprinter.cache.hits, 3)
+        assert_equal(warm.fingerprinter.cache.misses, 0)
+        assert_equal(index_content(cold), index_content(warm))
+
+        # Different settings must not reuse the entries
+        other = get_engine(FingerprintCache(tmp_dir), k=6)
+        other.build_index(get_softwares())
+        assert_equal(other.fingerprinter.cache.misses, 3)
+
+        cache = FingerprintCache(tmp_dir)
+        half = cache.size() // 2
+        cache.evict(half)
+        assert_less(cache.size(), half + 1)
+        assert_less(len(cache), 6)
+
+    # Guessed lexers depend on the file name: same content, other entries
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = os.path.join(EXAMPLES, "insertionsort", "Sort.c")
+        with open(source) as hdl:
+            code = hdl.read()
+        paths = []
+        for name in ("Sort.c", "Sort.h", "Sort.cpp"):
+            paths.append(os.path.join(tmp_dir, name))
+            with open(paths[-1], "w") as hdl:
+                hdl.write(code)
+        cache = FingerprintCache(os.path.join(tmp_dir, "cache"))
+        keys = {cache.key(path, Parser(path).signature(), ())
+                for path in paths}
+        assert_equal(len(keys), 3)
+
+
+def test_token_cache():
+    lexer = pygments.lexers.get_lexer_by_name("c")
+    parser_factory = partial(Parser, lexer=lexer)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for k, misses in ((5, 3), (6, 0)):
+            # Tokens do not depend on the kgram length
+            cache = TokenCache(tmp_dir)
+            moss = MossEngine(Winnower(parser_factory, 15, k,
+                                       token_cache=cache))
+            moss.build_index(get_softwares())
+            assert_equal(cache.misses, misses)
+            assert_equal(cache.hits, 3 - misses)
+            expected = get_engine(k=k).build_index(get_softwares())
+            assert_equal(index_content(expected), index_content(moss))
+
+    # In-memory streams, shipped to the worker processes
+    streams = TokenStreams()
+    for software in get_softwares():
+        for source_file in software:
+            streams.compact(parser_factory(source_file))
+    moss = MossEngine(Winnower(parser_factory, 15, 5, token_cache=streams))
+    moss.build_index(get_softwares(), n_jobs=2)
+    assert_equal(index_content(get_engine().build_index(get_softwares())),
+                 index_content(moss))
+
+
+def test_sweep():
+    assert_equal(parse_values("4..6"), [4, 5, 6])
+    assert_equal(parse_values("10..20:5,3"), [3, 10, 15, 20])
+
+    lexer = pygments.lexers.get_lexer_by_name("c")
+    parser_factory = partial(Parser, lexer=lexer)
+    sweep = Sweep(parser_factory, [4, 5], [8, 15], top=2)
+    results = sweep.run(get_softwares())
+    # Each file is lexed once
+    assert_equal(len(sweep.token_streams), 3)
+    assert_equal([r.setting for r in results], [(4, 8), (4, 15), (5, 8),
+                                                 (5, 15)])
+    for result in results:
+        moss = MossEngine(Winnower(parser_factory, result.window_size,
+                                   result.kgram_len), Filter(10))
+        moss.build_index(get_softwares())
+        assert_equal(index_content(moss), {
+            fp: sorted(s.name for s in sw)
+            for fp, sw in result.invert_index.iter_raw()})
+        ranking = Ranking.from_invert_index(TfIdfSimilarity(),
+                                            moss.invert_index, k=2)
+        assert_equal([(score, s1.name, s2.name) for score, s1, s2 in ranking],
+                     [(score, s1.name, s2.name)
+                      for score, s1, s2 in result.ranking])
+
+    report = list(SweepSummary(results, baseline=(5, 15))(None))
+    table = [block for block in report if hasattr(block, "rows")][0]
+    assert_equal(len(table.rows), 4)
+    # The baseline fully overlaps with itself
+    assert_equal(table.rows[3][5], "2/2")
+
+
+def test_save_load_index():
+    reference = Software("Reference", [os.path.join(EXAMPLES, "Sort.h")])
+    moss = get_engine()
+    moss.filter = Filter(2)
+    moss.build_index(get_softwares(), reference)
+    index = moss.invert_index
+    expected = CountSimilarity()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "index.bin")
+        index.save(path)
+
+        for mmap in (True, False):
+            loaded = InvertIndex.load(path, mmap=mmap)
+            assert_equal(index_content(moss), dict(
+                (fp, sorted(s.name for s in sw))
+                for fp, sw in loaded.iter_raw()))
+            assert_equal(sorted(fp for fp, _ in index),
+                         sorted(fp for fp, _ in loaded))
+            for fp, _ in index.iter_raw():
+                assert_equal(index.is_skipped(fp), loaded.is_skipped(fp))
+                assert_equal(sorted(s.name for s in index[fp]),
+                             sorted(s.name for s in loaded[fp]))
+            for fp in index.skips:
+                assert_equal(loaded.is_skipped(fp), True)
+
+            for s1, s2 in zip(index.get_softwares(), loaded.get_softwares()):
+                assert_equal(s1.name, s2.name)
+                assert_equal(software_content(s1), software_content(s2))
+                for fp in s1.yield_fingerprints():
+                    assert_equal(s1.kgram_str(fp), s2.kgram_str(fp))
+
+            r1 = Ranking.from_invert_index(expected, index)
+            r2 = Ranking.from_invert_index(expected, loaded)
+            assert_equal([(score, a.name, b.name) for score, a, b in r1],
+                         [(score, a.name, b.name) for score, a, b in r2])
+
+
+def graph_content(graph):
+    return {frozenset((s1.name, s2.name)): (len(shareprints),
+                                            set(shareprints))
+            for s1, s2, shareprints in graph}
+
+
+def ranking_content(ranking):
+    return {frozenset((s1.name, s2.name)): score
+            for score, s1, s2 in ranking}
+
+
+def test_incremental_update():
+    def scratch(softwares):
+        moss = get_engine()
+        moss.filter = Filter(1)
+        moss.build_index(softwares)
+        return moss
+
+    softwares = get_softwares()
+    moss = scratch(softwares[:2])
+    moss.invert_index.derive_matching_graph()
+    rankings = [moss.track(moss.query(Ranking.as_query(similarity)))
+                for similarity in (CountSimilarity(), JaccardSimilarity(),
+                                   TfIdfSimilarity())]
+
+    def check(expected):
+        assert_equal(index_content(expected), index_content(moss))
+        assert_equal(sorted(fp for fp, _ in expected.invert_index),
+                     sorted(fp for fp, _ in moss.invert_index))
+        assert_equal(graph_content(expected.invert_index
+                                   .derive_matching_graph()),
+                     graph_content(moss.invert_index._matching_graph))
+        for ranking in rankings:
+            fresh = Ranking.from_invert_index(ranking.similarity,
+                                              expected.invert_index)
+            assert_equal(ranking_content(fresh), ranking_content(ranking))
+            scores = [score for score, _, _ in ranking]
+            assert_equal(sorted(scores, reverse=True), scores)
+
+    moss.add_softwares(softwares[2:])
+    check(scratch(get_softwares()))
+
+    moss.remove_software(softwares[0].name)
+    check(scratch(get_softwares()[1:]))
+
+
+def test_ranking_tracking():
+    moss = get_engine().build_index(get_softwares()[:2])
+    # Rankings are not held by the engine unless tracked
+    untracked = moss.query(Ranking.as_query(CountSimilarity()))
+    tracked = moss.track(moss.query(Ranking.as_query(CountSimilarity())))
+    moss.track(tracked)
+    assert_equal(moss.rankings, [tracked])
+
+    moss.add_softwares(get_softwares()[2:])
+    assert_equal(len(list(tracked)), 3)
+    assert_equal(len(list(untracked)), 1)
+
+    moss.untrack(tracked)
+    assert_equal(moss.rankings, [])
+
+
+def test_patched_graph_order():
+    # Pairs of a patched graph are oriented and ordered by name, as those of
+    # a rebuilt one, whatever the order in which softwares were added
+    fpaths = sorted(glob.glob(os.path.join(EXAMPLES, "*", "*.[ch]")))
+
+    def get_many():
+        return [Software("_{:05d}".format(i),
+                         [fpaths[i % len(fpaths)],
+                          fpaths[(3 * i + 1) % len(fpaths)]])
+                for i in range(12)]
+
+    similarities = (CountSimilarity(), JaccardSimilarity(), TfIdfSimilarity())
+
+    def content(moss, rankings):
+        graph = moss.invert_index.derive_matching_graph()
+        return ([(s1.name, s2.name, len(shareprints))
+                 for s1, s2, shareprints in graph],
+                [[(score, s1.name, s2.name) for score, s1, s2 in ranking]
+                 for ranking in rankings])
+
+    softwares = get_many()
+    moss = get_engine().build_index(softwares[6:])
+    moss.invert_index.derive_matching_graph()
+    rankings = [moss.track(moss.query(Ranking.as_query(similarity)))
+                for similarity in similarities]
+    moss.add_softwares(softwares[:6])
+
+    rebuilt = get_engine().build_index(get_many())
+    expected = [Ranking.from_invert_index(similarity, rebuilt.invert_index)
+                for similarity in similarities]
+    assert_equal(content(moss, rankings), content(rebuilt, expected))
+
+
+def test_matching_graph():
+    moss = get_engine().build_index(get_softwares())
+    index = moss.invert_index
+    graph = index.derive_matching_graph()
+
+    expected = {}
+    for fp, softwares in index:
+        for s1 in softwares:
+            for s2 in softwares:
+                if s1.name < s2.name:
+                    expected.setdefault((s1.name, s2.name), set()).add(fp)
+
+    assert_equal(len(graph), len(expected))
+    for s1, s2, shareprints in graph:
+        assert_less(s1.name, s2.name)
+        fingerprints = expected[(s1.name, s2.name)]
+        assert_equal(len(shareprints), len(fingerprints))
+        assert_equal(graph.count(s2, s1), len(fingerprints))
+        assert_equal(list(shareprints), sorted(fingerprints))
+        assert_equal(list(graph[(s2, s1)]), sorted(fingerprints))
+
+
+def test_reference_filter():
+    lexer = pygments.lexers.get_lexer_by_name("c")
+    parser_factory = partial(Parser, lexer=lexer)
+    reference_path = os.path.join(EXAMPLES, "mergesort_on_heap", "Sort.c")
+    winnower = Winnower(parser_factory, 1, 5)
+    expected = set(winnower.kgram_fingerprints(parser_factory(reference_path)))
+    reference_filter = ReferenceFilter.build(winnower, [reference_path])
+    assert_equal(len(reference_filter), len(expected))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "reference.lmr")
+        reference_filter.save(path)
+        filters = [reference_filter, pickle.loads(pickle.dumps(
+            reference_filter))]
+        for mmap in (True, False):
+            loaded = ReferenceFilter.load(path, mmap)
+            assert_equal(loaded.digest, reference_filter.digest)
+            filters.append(loaded)
+        others = [fp ^ (1 << 40) for fp in expected] + list(range(1000))
+        for a_filter in filters:
+            assert_equal(sorted(fp for fp in expected if fp in a_filter),
+                         sorted(expected))
+            assert_equal([fp for fp in others if fp in a_filter],
+                         [fp for fp in others if fp in expected])
+
+        # Other kgram length
+        moss = get_engine(k=6)
+        assert_raises(ValueError, moss.load_reference, path)
+
+        # With a window of 1, all the other kgrams are indexed
+        moss = MossEngine(Winnower(parser_factory, 1, 5)).load_reference(path)
+        software = Software("mergesort_on_stack", [
+            os.path.join(EXAMPLES, "mergesort_on_stack", "Sort.c")])
+        moss.build_index([software])
+        all_kgrams = set(winnower.kgram_fingerprints(
+            parser_factory(software.source_files[0])))
+        assert_equal(set(index_content(moss)), all_kgrams - expected)
+        assert_greater(moss.fingerprinter.stats["reference_kgrams"], 0)
+
+        serial = get_engine().load_reference(path)
+        serial.build_index(get_softwares())
+        assert_equal(set(index_content(serial)) & expected, set())
+        parallel = get_engine().load_reference(path)
+        parallel.build_index(get_softwares(), n_jobs=2)
+        assert_equal(index_content(serial), index_content(parallel))
+        assert_equal(serial.fingerprinter.stats,
+                     parallel.fingerprinter.stats)
@@ -0,0 +1,128 @@
+import glob
+import os
+import tempfile
+
+import pygments.lexers
+from nose.tools import assert_equal, assert_not_equal, assert_greater, \
+    assert_is_none, assert_is_not_none
+
+from locmoss.parser import Parser, LexerResolver
+from locmoss.tokenizer import FastTokenizer
+
+
+SOURCE = """/* A block comment
+ * spanning = several = lines
+ */
+int add(int a, int b) {
+  char* s = "ab";
+  return a + b;
+}
+"""
+
+
+def parse(**kwargs):
+    lexer = pygments.lexers.get_lexer_by_name("c")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fpath = os.path.join(tmp_dir, "add.c")
+        with open(fpath, "w") as hdl:
+            hdl.write(SOURCE)
+        return [(t.symbol, t.location.start_line, t.location.start_column)
+                for t in Parser(fpath, lexer, **kwargs)]
+
+
+def test_whole_file_lexing():
+    tokens = parse()
+    expected = [("int", 4, 1), ("F", 4, 5), ("(", 4, 8), ("int", 4, 9),
+                ("N", 4, 13), (",", 4, 14), ("int", 4, 16), ("N", 4, 20),
+                (")", 4, 21), ("{", 4, 23),
+                ("char", 5, 3), ("*", 5, 7), ("N", 5, 9), ("=", 5, 11),
+                ("S", 5, 13), ("S", 5, 14), ("S", 5, 16), (";", 5, 17),
+                ("return", 6, 3), ("N", 6, 10), ("+", 6, 12), ("N", 6, 14),
+                (";", 6, 15), ("}", 7, 1)]
+    assert_equal(tokens, expected)
+
+
+def test_per_line_lexing():
+    tokens = parse(per_line=True)
+    # Comments spanning several lines are not recognized
+    assert_equal(tokens[:2], [("*", 2, 2), ("N", 2, 4)])
+    assert_not_equal(tokens, parse())
+
+
+def test_lexer_resolver():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fpaths = []
+        for name in ("a.c", "b.c", "c.h", "d.c"):
+            fpath = os.path.join(tmp_dir, name)
+            with open(fpath, "w") as hdl:
+                hdl.write(SOURCE)
+            fpaths.append(fpath)
+
+        def n_guesses(resolver, scopes):
+            parsers = [Parser(fpath, resolver=resolver, scope=scope)
+                       for fpath, scope in zip(fpaths, scopes)]
+            for parser in parsers:
+                list(parser)
+            n = sum(parser.n_lexer_guesses for parser in parsers)
+            assert_equal(n, resolver.n_guesses)
+            return n
+
+        assert_equal(n_guesses(LexerResolver(), [None] * 4), 2)
+        assert_equal(n_guesses(LexerResolver(strategy="software"),
+                               ["s1", "s1", "s1", "s2"]), 2)
+        assert_equal(n_guesses(LexerResolver({"h": "c"}), [None] * 4), 1)
+
+        resolver = LexerResolver({".c": "c", ".h": "c"})
+        assert_equal(n_guesses(resolver, [None] * 4), 0)
+        assert_equal(Parser(fpaths[0], resolver=resolver).signature()[0], "C")
+
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "..", "examples")
+
+LOCMOSS = os.path.join(os.path.dirname(__file__), "..")
+
+
+def assert_conform(fpath, lexer):
+    def symbols(fast):
+        return [(t.symbol, t.location.start_line, t.location.start_column)
+                for t in Parser(fpath, lexer, fast=fast)]
+    expected = symbols(False)
+    assert_greater(len(expected), 0)
+    assert_equal(symbols(True), expected)
+
+
+def test_fast_tokenizer_conformance():
+    sources = (("c", os.path.join(EXAMPLES, "*", "*.[ch]")),
+               ("cpp", os.path.join(EXAMPLES, "*", "*.[ch]")),
+               ("java", os.path.join(EXAMPLES, "*", "*.java")),
+               ("python", os.path.join(LOCMOSS, "*.py")))
+    for name, pattern in sources:
+        lexer = pygments.lexers.get_lexer_by_name(name)
+        if FastTokenizer.supports():
+            assert_is_not_none(FastTokenizer.get(lexer))
+        else:
+            assert_is_none(FastTokenizer.get(lexer))
+        fpaths = sorted(glob.glob(pattern))
+        assert_greater(len(fpaths), 0)
+        for fpath in fpaths:
+            assert_conform(fpath, lexer)
+
+
+def test_fast_tokenizer_fallback():
+    assert_equal([FastTokenizer.supports(v) for v in
+                  ("2.5.2", "2.6.1", "2.7.4", "2.19.2", "2.20.0", "3.0")],
+                 [False, True, False, True, False, False])
+
+    # Other lexers, and subclasses of the supported ones, are used directly
+    class ExtendedCLexer(pygments.lexers.get_lexer_by_name("c").__class__):
+        pass
+
+    for lexer in (pygments.lexers.get_lexer_by_name("ruby"),
+                  ExtendedCLexer()):
+        assert_is_none(FastTokenizer.get(lexer))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fpath = os.path.join(tmp_dir, "sort.rb")
+        with open(fpath, "w") as hdl:
+            hdl.write("def sort(a)\n  a.sort! # in place\nend\n")
+        assert_conform(fpath, pygments.lexers.get_lexer_by_name("ruby"))
@@ -0,0 +1,116 @@
+import io
+import json
+import os
+import re
+import tempfile
+import types
+
+from nose.tools import assert_equal, assert_greater
+
+from locmoss.location import Location
+from locmoss.query import CountSimilarity, HtmlRenderer, \
+    JaccardSimilarity, JsonRenderer, MatchingLocations, MatchingSnippets, \
+    MetaData, MostSimilar, Ranking, SoftwareList, TerminalRenderer
+from locmoss.query.report import Snippet
+from locmoss.test.test_moss import get_engine, get_softwares
+
+
+def render(moss, query, streaming):
+    output = io.StringIO()
+    moss.renderer = TerminalRenderer(output=output)
+    moss.streaming = streaming
+    moss.query(query)
+    return output.getvalue()
+
+
+def test_streaming_same_as_buffered():
+    moss = get_engine().build_index(get_softwares())
+    ranking = Ranking.from_invert_index(CountSimilarity(), moss.invert_index)
+    for query in (SoftwareList(), MatchingLocations(ranking),
+                  MatchingSnippets(ranking)):
+        assert_equal(isinstance(query.stream(moss.invert_index),
+                                types.GeneratorType), True)
+        buffered = render(moss, query, False)
+        assert_greater(len(buffered), 0)
+        assert_equal(render(moss, query, True), buffered)
+
+
+def test_json_renderer():
+    moss = get_engine().build_index(get_softwares())
+    ranking = Ranking.from_invert_index(CountSimilarity(), moss.invert_index)
+
+    for lines in (True, False):
+        output = io.StringIO()
+        moss.renderer = JsonRenderer(output, lines=lines)
+        moss.query(MetaData(k=5))
+        moss.query(MostSimilar(ranking, JaccardSimilarity()))
+        moss.query(MatchingSnippets(ranking))
+        moss.renderer.close()
+
+        if lines:
+            blocks = [json.loads(line)
+                      for line in output.getvalue().splitlines()]
+        else:
+            blocks = json.loads(output.getvalue())
+
+        # No ASCII art
+        assert_equal(blocks[0]["type"], "list")
+        table = [b for b in blocks if b["type"] == "table"][0]
+        assert_equal(table["header"][3:], ["# Shareprints", "Jaccard index"])
+        assert_equal([row[3] for row in table["rows"]],
+                     [score for score, _, _ in ranking])
+        assert_equal(all(isinstance(row[4], float) for row in table["rows"]),
+                     True)
+        snippets = [b for b in blocks if b["type"] == "snippet"]
+        assert_greater(len(snippets), 0)
+        assert_equal(all(isinstance(n, int) for n, _ in snippets[0]["lines"]),
+                     True)
+
+
+def test_html_renderer():
+    moss = get_engine().build_index(get_softwares())
+    ranking = Ranking.from_invert_index(CountSimilarity(), moss.invert_index)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        moss.renderer = HtmlRenderer(tmp_dir)
+        moss.streaming = True
+        moss.query(MostSimilar(ranking))
+        with ranking.top(1):
+            moss.query(MatchingSnippets(ranking,
+                                        fingerprinter=moss.fingerprinter))
+        moss.renderer.close()
+        # Closing again does not overwrite the index
+        moss.renderer.close()
+
+        with open(os.path.join(tmp_dir, "index.html")) as hdl:
+            index = hdl.read()
+        links = re.findall(r'href="(pairs/[^"]+)"', index)
+        assert_equal(len(links), len(ranking))
+        # The snippets are not in the index
+        assert_equal("<pre>" in index, False)
+
+        pages = []
+        for link in links:
+            with open(os.path.join(tmp_dir, link)) as hdl:
+                pages.append(hdl.read())
+        assert_greater(pages[0].count("<mark>"), 0)
+        # Pairs without details get a placeholder page
+        assert_equal(all("No details" in page for page in pages[1:]), True)
+        # Only the kgrams are highlighted, not the rest of their lines
+        marks = re.findall(r"<mark>(.*?)</mark>(.*?)</span>", pages[0])
+        assert_greater(len(marks), 0)
+        assert_greater(sum(1 for _, tail in marks if len(tail) > 0), 0)
+
+
+def test_html_snippet_ranges():
+    snippet = Snippet(highlights=[Location("f.c", 1, 3)],
+                      spans=[((1, 3), (1, 11)), ((2, 5), (3, 4))])
+    for n, line in enumerate(["  foo(a, b);  // tail", "int bar;  ",
+                              "  x = 1;"]):
+        snippet.append(n + 1, line)
+    assert_equal(HtmlRenderer._marked_ranges(snippet),
+                 {1: [(2, 10)], 2: [(4, 8)], 3: [(2, 3)]})
+
+    # Unknown extent: the first token only
+    snippet.spans = []
+    assert_equal(HtmlRenderer._marked_ranges(snippet), {1: [(2, 5)]})
@@ -0,0 +1,112 @@
+import os
+
+from nose.tools import assert_equal, assert_almost_equal, assert_greater, \
+    assert_raises
+
+from locmoss.moss import Filter
+from locmoss.query import CountSimilarity, JaccardSimilarity, Ranking, \
+    TfIdfSimilarity
+from locmoss.software import Software
+
+from locmoss.test.test_moss import EXAMPLES, get_engine, get_softwares
+
+
+def get_index(collision_threshold=3):
+    reference = Software("Reference", [os.path.join(EXAMPLES, "Sort.h")])
+    moss = get_engine()
+    moss.filter = Filter(collision_threshold)
+    moss.build_index(get_softwares(), reference)
+    return moss.invert_index
+
+
+def scores(ranking):
+    return {(s1.name, s2.name): score for score, s1, s2 in ranking}
+
+
+def test_vectorized_same_as_pairwise():
+    index = get_index()
+    for cls in (CountSimilarity, JaccardSimilarity, TfIdfSimilarity):
+        expected = scores(Ranking.from_invert_index(cls(), index))
+        ranking = Ranking.from_invert_index(cls(vectorized=True), index)
+        actual = scores(ranking)
+
+        assert_greater(len(expected), 1)
+        assert_equal(sorted(expected), sorted(actual))
+        for pair, score in expected.items():
+            assert_almost_equal(score, actual[pair])
+
+        values = [score for score, _, _ in ranking]
+        assert_equal(sorted(values, reverse=True), values)
+
+
+def test_not_vectorizable():
+    class SquaredCount(CountSimilarity):
+        vectorizable = False
+
+        def __call__(self, invert_index, software_1, software_2, shareprints):
+            return len(shareprints) ** 2
+
+    assert_raises(ValueError, SquaredCount, vectorized=True)
+
+    # Scored pair by pair anyway
+    index = get_index()
+    similarity = SquaredCount()
+    similarity.vectorized = True
+    expected = scores(Ranking.from_invert_index(CountSimilarity(), index))
+    actual = scores(Ranking.from_invert_index(similarity, index))
+    assert_equal({pair: score ** 2 for pair, score in expected.items()},
+                 actual)
+
+
+def test_tfidf_symmetric():
+    index = get_index()
+    similarity = TfIdfSimilarity()
+    graph = index.derive_matching_graph()
+    for s1, s2, shareprints in graph:
+        assert_almost_equal(similarity(index, s1, s2, shareprints),
+                            similarity(index, s2, s1, shareprints))
+
+    # All the pairs at once, from the postings
+    scored = list(similarity.score_graph(index, graph))
+    assert_equal(len(scored), len(graph))
+    for score, s1, s2 in scored:
+        assert_almost_equal(score, similarity(index, s1, s2, graph[(s1, s2)]))
+
+
+def test_software_stats():
+    index = get_index()
+    stats = index.derive_software_stats()
+    assert_equal(stats is index.derive_software_stats(), True)
+
+    for software in index.get_softwares():
+        active = [(fp, count)
+                  for fp, count in software.yield_fingerprint_counts()
+                  if not index.is_skipped(fp)]
+        assert_equal(stats.n_active[software], len(active))
+        assert_equal(stats.max_tf[software], max(c for _, c in active))
+
+    # Invalidated with the index
+    index.invalidate(next(fp for fp, _ in index))
+    assert_equal(stats is index.derive_software_stats(), False)
+
+
+def test_top_k_ranking():
+    index = get_index()
+    for similarity in (CountSimilarity(), JaccardSimilarity(),
+                       TfIdfSimilarity(), TfIdfSimilarity(vectorized=True)):
+        full = Ranking.from_invert_index(similarity, index)
+        top = Ranking.from_invert_index(similarity, index, k=1)
+        assert_equal(len(top), 1)
+        assert_equal([score for score, _, _ in top],
+                     [score for score, _, _ in full][:1])
+
+        # Pairs which are not kept are scored on demand
+        for score, s1, s2 in full:
+            assert_almost_equal(top[(s2, s1)], score)
+
+        threshold = [score for score, _, _ in full][1]
+        above = Ranking.from_invert_index(similarity, index,
+                                          threshold=threshold)
+        assert_equal(all(score >= threshold for score, _, _ in above), True)
+        assert_equal(len(above),
+                     sum(1 for score, _, _ in full if score >= threshold))
@@ -33,3 +33,91 @@ def test_kgram_hash_eq():
     assert_not_equal(kg1, kg2)
     assert_not_equal(kg1, kg3)
     assert_not_equal(kg2, kg3)
+
+
+def test_rolling_kgrams():
+    from locmoss.kgram import RollingKGrams
+    from locmoss.parser import Token
+
+    symbols = ["int", "N", "=", "N", ";", "int", "N", "=", "N", ";", "F"]
+    tokens = [Token(s, i) for i, s in enumerate(symbols)]
+    kgrams = list(RollingKGrams.kgramify(tokens, 3))
+
+    assert_equal(len(kgrams), len(symbols) - 2)
+    for i, (location, kgram) in enumerate(kgrams):
+        assert_equal(location, i)
+        assert_equal(str(kgram), "".join(symbols[i:i+3]))
+        # Same hash as computed from scratch
+        direct = 0
+        for s in symbols[i:i+3]:
+            direct = (direct * RollingKGrams.BASE +
+                      RollingKGrams.symbol_entry(s)[1]) % RollingKGrams.MODULUS
+        assert_equal(kgram.rolling_hash, direct)
+
+    assert_equal(kgrams[0][1], kgrams[5][1])
+    assert_equal(hash(kgrams[0][1]), hash(kgrams[5][1]))
+    assert_not_equal(kgrams[0][1], kgrams[1][1])
+
+
+def test_software_fingerprints():
+    from locmoss.location import Location
+    from locmoss.software import Software
+
+    software = Software("s", ["a.c", "b.c"])
+    software.add_fingerprint(7, Location("b.c", 3, 4), "xyz")
+    software.add_fingerprint(2, Location("a.c", 1, 1), "abc")
+    software.add_fingerprint(7, Location("a.c", 5, 2), "other")
+    software.add_fingerprint(2 ** 64 - 1, Location("c.c", 9, 9))
+
+    assert_equal(list(software.yield_fingerprints()), [2, 7, 2 ** 64 - 1])
+    assert_equal(software.count_fingerprints(), 3)
+    assert_equal(software.count(7), 2)
+    assert_equal(software.count(3), 0)
+    assert_equal(software[3], [])
+    assert_equal([str(l) for l in software[7]], ["b.c:3:4", "a.c:5:2"])
+    assert_equal([str(l) for l in software[2 ** 64 - 1]], ["c.c:9:9"])
+    assert_equal(list(software.yield_fingerprint_counts()),
+                 [(2, 1), (7, 2), (2 ** 64 - 1, 1)])
+    assert_equal(software.kgram_str(7), "xyz")
+
+    # Additions after a lookup
+    software.add_fingerprint(1, Location("a.c", 2, 2))
+    assert_equal(list(software.yield_fingerprints()), [1, 2, 7, 2 ** 64 - 1])
+
+
+def test_symbol_table():
+    from locmoss.symbols import SymbolTable
+
+    table = SymbolTable(["N", "="])
+    assert_equal(table.intern("N"), 0)
+    assert_equal(table.intern(";"), 2)
+    assert_equal(len(table), 3)
+    ids = table.encode(["N", "=", "N", ";"])
+    assert_equal(ids, [0, 1, 0, 2])
+    assert_equal(table.decode(ids), "N=N;")
+    for symbol_ids in ([], [0], ids, [2 ** 32 - 2, 0, 5]):
+        assert_equal(SymbolTable.unpack(SymbolTable.pack(symbol_ids)),
+                     symbol_ids)
+
+
+def test_kgrams_symbols():
+    import pickle
+    from locmoss.kgram import RollingKGrams
+    from locmoss.location import Location
+    from locmoss.software import Software
+    from locmoss.symbols import symbol_table
+
+    symbol_ids = symbol_table.encode(["int", "N", "=", "N", ";", "F"])
+    for kgram_class in (KGrams, RollingKGrams):
+        kgram = kgram_class.at(symbol_ids, 1, 3, 64)
+        assert_equal(str(kgram), "N=N")
+        assert_equal(kgram.ids, tuple(symbol_ids[1:4]))
+        # Symbols (not ids) are pickled
+        copy = pickle.loads(pickle.dumps(kgram))
+        assert_equal(copy, kgram)
+        assert_equal(int(copy), int(kgram))
+        assert_equal(str(copy), "N=N")
+
+        software = Software("s", ["a.c"])
+        software.add_fingerprint(int(kgram), Location("a.c", 1, 1), kgram)
+        assert_equal(software.kgram_str(int(kgram)), "N=N")
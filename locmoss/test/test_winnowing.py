@@ -0,0 +1,69 @@
+import glob
+import os
+import random
+
+import pygments.lexers
+from nose.tools import assert_equal, assert_greater
+
+from locmoss.parser import Parser, Token
+from locmoss.winnowing import Winnower, NaiveWinnower
+
+
+def get_tokens(n, alphabet="abcd", seed=42):
+    rng = random.Random(seed)
+    return [Token(rng.choice(alphabet), i) for i in range(n)]
+
+
+def select(winnower_cls, tokens, window_size, k, hashing, hash_bits):
+    winnower = winnower_cls(None, window_size, k, hashing=hashing,
+                            hash_bits=hash_bits)
+    return [(location, str(kgram), int(kgram)) for location, kgram
+            in winnower.extract_fingerprints_(tokens)]
+
+
+def test_deque_winnowing_same_as_naive():
+    for seed, n in enumerate((0, 3, 10, 20, 500)):
+        tokens = get_tokens(n, seed=seed)
+        for window_size in (1, 2, 4, 15):
+            for hashing in ("sha1", "rolling"):
+                # Small alphabets and 16 bits to have many ties
+                for hash_bits in (16, 64):
+                    expected = select(NaiveWinnower, tokens, window_size, 3,
+                                      hashing, hash_bits)
+                    actual = select(Winnower, tokens, window_size, 3,
+                                    hashing, hash_bits)
+                    assert_equal(expected, actual)
+
+
+def test_winnowing_guarantee():
+    # Any window contains (at least) one selected kgram
+    window_size, k = 4, 3
+    tokens = get_tokens(300)
+    selected = select(Winnower, tokens, window_size, k, "rolling", 64)
+    positions = [location for location, _, _ in selected]
+    assert_greater(len(positions), 0)
+    n_kgrams = len(tokens) - k + 1
+    for start in range(n_kgrams - window_size + 1):
+        window = range(start, start + window_size)
+        assert any(p in window for p in positions)
+
+
+def test_compact_same_as_tokens():
+    # Same selection with the compact pipeline (kgrams created only for the
+    # selected positions) as with the tokens
+    lexer = pygments.lexers.get_lexer_by_name("c")
+    examples = os.path.join(os.path.dirname(__file__), "..", "..",
+                            "examples")
+    fpath = sorted(glob.glob(os.path.join(examples, "*", "*.c")))[0]
+    for per_line in (False, True):
+        for hashing in ("sha1", "rolling"):
+            winnower = Winnower(None, 4, 5, hashing=hashing)
+            expected = [(location.start_line, location.start_column,
+                         str(kgram), int(kgram), kgram)
+                        for location, kgram in winnower.extract_fingerprints_(
+                            iter(Parser(fpath, lexer, per_line=per_line)))]
+            actual = [(line, column, str(kgram), int(kgram), kgram)
+                      for kgram, line, column in winnower.extract_compact_(
+                          Parser(fpath, lexer, per_line=per_line))]
+            assert_greater(len(actual), 0)
+            assert_equal(expected, actual)
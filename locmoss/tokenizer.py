@@ -0,0 +1,875 @@
+"""
+Dedicated tokenizers for C/C++, Java and Python, the languages most often
+compared. They produce the same symbols as the pygments lexers followed by
+`normalize` (see `Parser.iter_pygments`), much faster.
+
+Each tokenizer is a table of rules per state, written after the lexer it
+replaces. The rules of a state are compiled into one master regex, whose
+alternatives are tried in order (as pygments tries the rules), and each
+rule directly gives the symbols of its token, or of the groups of its
+token. Ignored tokens (whitespaces, comments, preprocessor directives) are
+never built.
+
+The lexers of pygments change from one release to the next, so that the
+tables are only provided for the pinned version (2.6) and for the current
+one (2.19). With any other version, `FastTokenizer.get` returns None and
+the pygments lexers are used.
+"""
+import keyword
+import re
+
+import pygments
+from pygments import unistring
+
+
+# What a token becomes: nothing, "N", "S", "F" or its own text
+SKIP, NAME, STRING, FUNCTION, VALUE = range(5)
+
+_SYMBOLS = {NAME: "N", STRING: "S", FUNCTION: "F"}
+
+
+class Using(object):
+    """
+    Action of a group which is tokenized on its own, from the states
+    `stack` (`using(this)` in pygments)
+    """
+    def __init__(self, stack=("root",)):
+        self.stack = stack
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, repr(self.stack))
+
+
+USING = Using()
+
+
+def _words(words, prefix="", suffix=r"\b"):
+    # Longest first, so that e.g. "yield from" is preferred to "yield"
+    return "{}(?:{}){}".format(prefix, "|".join(
+        re.escape(word) for word in sorted(words, key=len, reverse=True)),
+        suffix)
+
+
+def pygments_version(version=None):
+    """The (major, minor) version of (the installed) pygments"""
+    if version is None:
+        version = getattr(pygments, "__version__", "")
+    return tuple(int(x) for x in re.findall(r"\d+", version)[:2])
+
+
+class FastTokenizer(object):
+    """
+    `FastTokenizer`
+    ===============
+    Tokenizer driven by a table of states, each of which is a list of
+    rules `(pattern, action[, transition])` tried in order:
+     - `action` is `SKIP`, `NAME`, `STRING`, `FUNCTION` or `VALUE`, or a
+       tuple of those (or of `Using`), one per group of `pattern`;
+     - `transition` is None, the name of the state to push, "#push",
+       "#pop" or a tuple of those.
+    When no rule matches, a newline resets the states and any other
+    character is a token of its own, as in pygments.
+
+    Parameters
+    ----------
+    states: dict
+        Map the name of the states to their rules
+    flags: int (default: `re.MULTILINE`)
+        The flags of the patterns
+    names: collection of str (default: ())
+        The names which are types rather than names (their symbol is their
+        value instead of "N")
+    """
+    # Pygments versions whose lexers are reproduced by the tables
+    __VERSIONS__ = (2, 6), (2, 19)
+
+    __cache__ = {}
+
+    @classmethod
+    def supports(cls, version=None):
+        """Whether the tokenizers reproduce (the installed version of)
+        pygments"""
+        return pygments_version(version) in cls.__VERSIONS__
+
+    @classmethod
+    def get(cls, lexer):
+        """The tokenizer equivalent to `lexer`, or None if there is none"""
+        lexer_class = lexer.__class__
+        language = _LANGUAGES.get((lexer_class.__module__,
+                                   lexer_class.__name__))
+        if language is None or not cls.supports():
+            return None
+        tables, get_names = language
+        names = frozenset(get_names(lexer))
+        key = lexer_class, names
+        tokenizer = cls.__cache__.get(key)
+        if tokenizer is None:
+            states, flags = tables[pygments_version()]()
+            tokenizer = cls(states, flags, names)
+            cls.__cache__[key] = tokenizer
+        return tokenizer
+
+    def __init__(self, states, flags=re.MULTILINE, names=()):
+        self.states = {name: self._compile(rules, flags)
+                       for name, rules in states.items()}
+        self.names = frozenset(names)
+
+    @classmethod
+    def _compile(cls, rules, flags):
+        # One group per rule: the index of the group of the matched rule
+        # is `lastindex`, and the groups of the rule follow it
+        alternatives = []
+        actions = {}
+        index = 1
+        for rule in rules:
+            pattern, action = rule[:2]
+            transition = rule[2] if len(rule) > 2 else None
+            alternatives.append("(" + pattern + ")")
+            actions[index] = index, action, transition
+            index += 1 + re.compile(pattern, flags).groups
+        return re.compile("|".join(alternatives), flags).match, actions
+
+    def __call__(self, text):
+        """Yield the pairs (offset, symbol) of the tokens of `text`"""
+        return self.tokenize(text)
+
+    def tokenize(self, text, stack=("root",), offset=0):
+        states = self.states
+        stack = list(stack)
+        match, actions = states[stack[-1]]
+        pos = 0
+        while True:
+            m = match(text, pos)
+            if m is None:
+                if pos >= len(text):
+                    return
+                if text[pos] == "\n":
+                    stack = ["root"]
+                    match, actions = states["root"]
+                else:
+                    yield offset + pos, text[pos]
+                pos += 1
+                continue
+
+            index, action, transition = actions[m.lastindex]
+            if type(action) is tuple:
+                yield from self._groups(m, index, action, offset)
+            elif action != SKIP:
+                yield offset + pos, self.symbol(action, m.group())
+            pos = m.end()
+
+            if transition is not None:
+                if type(transition) is not tuple:
+                    transition = transition,
+                for state in transition:
+                    if state == "#pop":
+                        if len(stack) > 1:
+                            stack.pop()
+                    elif state == "#push":
+                        stack.append(stack[-1])
+                    else:
+                        stack.append(state)
+                match, actions = states[stack[-1]]
+
+    def symbol(self, action, value):
+        if action == VALUE or (action == NAME and value in self.names):
+            return value
+        return _SYMBOLS[action]
+
+    def _groups(self, m, index, actions, offset):
+        for i, action in enumerate(actions, index + 1):
+            if action == SKIP:
+                continue
+            value = m.group(i)
+            if type(action) is Using:
+                if value is not None:
+                    yield from self.tokenize(value, action.stack,
+                                             offset + m.start(i))
+            elif value:
+                yield offset + m.start(i), self.symbol(action, value)
+
+
+# ----------------------------------------------------------------------- C/C++
+def _c_family_names(lexer):
+    # Names which `CFamilyLexer` turns into types (according to its options)
+    names = set()
+    for option, types in (("stdlibhighlighting", "stdlib_types"),
+                          ("c99highlighting", "c99_types"),
+                          ("c11highlighting", "c11_atomic_types"),
+                          ("platformhighlighting", "linux_types")):
+        if getattr(lexer, option, False):
+            names.update(getattr(lexer, types, ()))
+    return names
+
+
+_C_WS1 = r"\s*(?:/[*].*?[*]/\s*)?"
+
+_C_STRING = [
+    (r'"', STRING, "#pop"),
+    (r'\\([\\abfnrtv"\']|x[a-fA-F0-9]{2,4}|u[a-fA-F0-9]{4}|U[a-fA-F0-9]{8}|'
+     r'[0-7]{1,3})', STRING),
+    (r'[^\\"\n]+', STRING),
+    (r"\\\n", STRING),
+    (r"\\", STRING),
+]
+
+_C_IF0 = [
+    (r"^\s*#if.*?(?<!\\)\n", SKIP, "#push"),
+    (r"^\s*#el(?:se|if).*\n", SKIP, "#pop"),
+    (r"^\s*#endif.*?(?<!\\)\n", SKIP, "#pop"),
+    (r".*?\n", SKIP),
+]
+
+_C_MS_KEYWORDS = _words((
+    "asm", "based", "except", "stdcall", "cdecl", "fastcall", "declspec",
+    "finally", "try", "leave", "w64", "unaligned", "raise", "noop",
+    "identifier", "forceinline", "assume"), prefix="__")
+
+_CPP_KEYWORDS = (
+    "catch", "const_cast", "delete", "dynamic_cast", "explicit", "export",
+    "friend", "mutable", "operator", "private", "protected", "public",
+    "reinterpret_cast", "static_cast", "template", "this", "throw",
+    "throws", "try", "typeid", "using", "virtual", "constexpr", "nullptr",
+    "decltype", "noexcept", "override", "final", "constinit", "consteval",
+    "concept", "co_await", "co_return", "co_yield", "requires", "import",
+    "module")
+
+
+def _c_family_2_6(cpp):
+    ident = r"[a-zA-Z_]\w*"
+    whitespace = [
+        (r"^#if\s+0", SKIP, "if0"),
+        (r"^#", SKIP, "macro"),
+        (r"^" + _C_WS1 + r"#if\s+0", SKIP, "if0"),
+        (r"^" + _C_WS1 + r"#", SKIP, "macro"),
+        (r"\n", SKIP),
+        (r"\s+", SKIP),
+        (r"\\\n", SKIP),
+        (r"//(?:\n|[\w\W]*?[^\\]\n)", SKIP),
+        (r"/(?:\\\n)?[*][\w\W]*?[*](?:\\\n)?/", SKIP),
+        (r"/(?:\\\n)?[*][\w\W]*", SKIP),
+    ]
+    statements = [
+        (r'(L?)(")', (STRING, STRING), "string"),
+        (r"(L?)(')(\\.|\\[0-7]{1,3}|\\x[a-fA-F0-9]{1,2}|[^\\\'\n])(')",
+         (STRING, STRING, STRING, STRING)),
+        (r"(?:\d+\.\d*|\.\d+|\d+)[eE][+-]?\d+[LlUu]*", VALUE),
+        (r"(?:\d+\.\d*|\.\d+|\d+[fF])[fF]?", VALUE),
+        (r"0x[0-9a-fA-F]+[LlUu]*", VALUE),
+        (r"0[0-7]+[LlUu]*", VALUE),
+        (r"\d+[LlUu]*", VALUE),
+        (r"\*/", VALUE),
+        (r"[~!%^&*+=|?:<>/-]", VALUE),
+        (r"[()\[\],.]", VALUE),
+        (_words((
+            "asm", "auto", "break", "case", "const", "continue", "default",
+            "do", "else", "enum", "extern", "for", "goto", "if", "register",
+            "restricted", "return", "sizeof", "static", "struct", "switch",
+            "typedef", "union", "volatile", "while")), VALUE),
+        (r"(?:bool|int|long|float|short|double|char|unsigned|signed|void)\b",
+         VALUE),
+        (_words(("inline", "_inline", "__inline", "naked", "restrict",
+                 "thread", "typename")), VALUE),
+        (r"__m(?:128i|128d|128|64)\b", VALUE),
+        (_words(("asm", "int8", "based", "except", "int16", "stdcall",
+                 "cdecl", "fastcall", "int32", "declspec", "finally", "int64",
+                 "try", "leave", "wchar_t", "w64", "unaligned", "raise",
+                 "noop", "identifier", "forceinline", "assume"),
+                prefix="__"), VALUE),
+        (r"(?:true|false|NULL)\b", VALUE),
+        (r"(" + ident + r")(\s*)(:)(?!:)", (VALUE, SKIP, VALUE)),
+        (ident, NAME),
+    ]
+    if cpp:
+        statements = [
+            (_words(_CPP_KEYWORDS + ("namespace", "new", "restrict",
+                                     "typename", "thread_local", "alignas",
+                                     "alignof", "static_assert")), VALUE),
+            (r"char(?:16_t|32_t|8_t)\b", VALUE),
+            (r"(class)(\s+)", (VALUE, SKIP), "classname"),
+            (r'(R)(")(?P<delimiter>[^\\()\s]{,16})(\()((?:.|\n)*?)'
+             r'(\)(?P=delimiter))(")', (STRING,) * 7),
+            (r'(u8|u|U)(")', (STRING, STRING), "string"),
+        ] + statements
+
+    # Functions definitions and declarations
+    function = (r"((?:[\w*\s])+?(?:\s|[*]))(" + ident + r")(\s*\([^;]*?\))"
+                r"([^;{]*)(\{)")
+    declaration = (r"((?:[\w*\s])+?(?:\s|[*]))(" + ident + r")"
+                   r"(\s*\([^;]*?\))([^;]*)(;)")
+    groups = USING, FUNCTION, USING, USING, VALUE
+    states = {
+        "root": whitespace + [
+            (function, groups, "function"),
+            (declaration, groups, None),
+            ("", SKIP, "statement"),
+        ],
+        "statement": whitespace + statements + [
+            (r"[{}]", VALUE),
+            (r";", VALUE, "#pop"),
+        ],
+        "function": whitespace + statements + [
+            (r";", VALUE),
+            (r"\{", VALUE, "#push"),
+            (r"\}", VALUE, "#pop"),
+        ],
+        "string": _C_STRING,
+        "macro": [
+            (r"include" + _C_WS1 + r"[^\n]+", SKIP),
+            (r"[^/\n]+", SKIP),
+            (r"/[*](?:.|\n)*?[*]/", SKIP),
+            (r"//.*?\n", SKIP, "#pop"),
+            (r"/", SKIP),
+            (r"(?<=\\)\n", SKIP),
+            (r"\n", SKIP, "#pop"),
+        ],
+        "if0": _C_IF0,
+    }
+    if cpp:
+        states["classname"] = [
+            (ident, VALUE, "#pop"),
+            (r"\s*(?=>)", SKIP, "#pop"),
+        ]
+    return states, re.MULTILINE
+
+
+def _c_family_2_19(cpp):
+    ident = r"(?!\d)(?:[\w$]|\\u[0-9a-fA-F]{4}|\\U[0-9a-fA-F]{8})+"
+    namespaced = r"(?!\d)(?:[\w$]|\\u[0-9a-fA-F]{4}|\\U[0-9a-fA-F]{8}|::)+"
+    hexpart = r"[0-9a-fA-F](?:'?[0-9a-fA-F])*"
+    decpart = r"\d(?:'?\d)*"
+    intsuffix = r"(?:[uU][lL]{0,2}|[lL]{1,2}[uU]?)?"
+    comment_single = r"//(?:.|(?<=\\)\n)*\n"
+    comment_multiline = r"/(?:\\\n)?[*](?:[^*]|[*](?!(?:\\\n)?/))*[*](?:\\\n)?/"
+    comments = r"\s*(?:(?:(?:{})|(?:{}))\s*)*".format(comment_single,
+                                                     comment_multiline)
+
+    whitespace = [
+        (r"^#if\s+0", SKIP, "if0"),
+        (r"^#", SKIP, "macro"),
+        (r"^" + _C_WS1 + r"#if\s+0", SKIP, "if0"),
+        (r"^" + _C_WS1 + r"#", SKIP, "macro"),
+        # Labels
+        (r"(^[ \t]*)(?!(?:public|private|protected|default)\b)(" + ident +
+         r")(\s*)(:)(?!:)", (SKIP, VALUE, SKIP, VALUE)),
+        (r"\n", SKIP),
+        (r"[^\S\n]+", SKIP),
+        (r"\\\n", SKIP),
+        (comment_single, SKIP),
+        (comment_multiline, SKIP),
+        (r"/(?:\\\n)?[*][\w\W]*", SKIP),
+    ]
+    types = [
+        (_words(("int8", "int16", "int32", "int64", "wchar_t"), prefix="__"),
+         VALUE),
+        (_words(("bool", "int", "long", "float", "short", "double", "char",
+                 "unsigned", "signed", "void", "_BitInt", "__int128")),
+         VALUE),
+    ]
+    keywords = [
+        (r"(struct|union)(\s+)", (VALUE, SKIP), "classname"),
+        (r"case\b", VALUE, "case-value"),
+        (_words((
+            "asm", "auto", "break", "const", "continue", "default", "do",
+            "else", "enum", "extern", "for", "goto", "if", "register",
+            "restricted", "return", "sizeof", "struct", "static", "switch",
+            "typedef", "volatile", "while", "union", "thread_local",
+            "alignas", "alignof", "static_assert", "_Pragma")), VALUE),
+        (_words(("inline", "_inline", "__inline", "naked", "restrict",
+                 "thread")), VALUE),
+        (r"__m(?:128i|128d|128|64)\b", VALUE),
+        (_C_MS_KEYWORDS, VALUE),
+    ]
+    if cpp:
+        keywords = [
+            (r"(class|concept|typename)(\s+)", (VALUE, SKIP), "classname"),
+            (_words(_CPP_KEYWORDS + (
+                "new", "class", "__restrict", "typename", "and", "and_eq",
+                "bitand", "bitor", "compl", "not", "not_eq", "or", "or_eq",
+                "xor", "xor_eq")), VALUE),
+            (r"namespace\b", VALUE, "namespace"),
+            (r"(enum)(\s+)", (VALUE, SKIP), "enumname"),
+        ] + keywords
+        types = [(r"char(?:16_t|32_t|8_t)\b", VALUE)] + types
+    else:
+        keywords = [
+            (_words(("_Alignas", "_Alignof", "_Noreturn", "_Generic",
+                     "_Thread_local", "_Static_assert", "_Imaginary",
+                     "noreturn", "imaginary", "complex")), VALUE),
+        ] + keywords
+        types = [(_words(("_Bool", "_Complex", "_Atomic")), VALUE)] + types
+
+    statements = keywords + types + [
+        (r'([LuU]|u8)?(")', (STRING, STRING), "string"),
+        (r"([LuU]|u8)?(')(\\.|\\[0-7]{1,3}|\\x[a-fA-F0-9]{1,2}|[^\\\'\n])(')",
+         (STRING, STRING, STRING, STRING)),
+        (r"0[xX](?:{0}\.{0}|\.{0}|{0})[pP][+-]?{0}[lL]?".format(hexpart),
+         VALUE),
+        (r"-?(?:{0}\.{0}|\.{0}|{0})[eE][+-]?{0}[fFlL]?".format(decpart),
+         VALUE),
+        (r"-?(?:{0}\.(?:{0})?|\.{0})[fFlL]?|{0}[fFlL]".format(decpart),
+         VALUE),
+        (r"-?0[xX]" + hexpart + intsuffix, VALUE),
+        (r"-?0[bB][01](?:'?[01])*" + intsuffix, VALUE),
+        (r"-?0(?:'?[0-7])+" + intsuffix, VALUE),
+        (r"-?" + decpart + intsuffix, VALUE),
+        (r"[~!%^&*+=|?:<>/-]", VALUE),
+        (r"[()\[\],.]", VALUE),
+        (r"(?:true|false|NULL)\b", VALUE),
+        (ident, NAME),
+    ]
+    if cpp:
+        statements = [
+            (r'((?:[LuU]|u8)?R)(")(?P<delimiter>[^\\()\s]{,16})(\()'
+             r'((?:.|\n)*?)(\)(?P=delimiter))(")', (STRING,) * 7),
+        ] + statements
+
+    # Functions definitions and declarations (the comments are whitespaces)
+    function = (r"(" + namespaced + r"(?:[&*\s])+)(" + comments + r")(" +
+                namespaced + r")(" + comments + r")(\([^;\"')]*?\))(" +
+                comments + r")")
+    groups = USING, SKIP, FUNCTION, SKIP, USING, SKIP, USING, VALUE
+    statement = whitespace + statements + [
+        (r"\}", VALUE),
+        (r"[{;]", VALUE, "#pop"),
+    ]
+    states = {
+        "root": whitespace + keywords + [
+            (function + r"([^;{/\"']*)(\{)", groups, "function"),
+            (function + r"([^;/\"']*)(;)", groups, None),
+        ] + types + [
+            ("", SKIP, "statement"),
+        ],
+        "statement": statement,
+        "function": whitespace + statements + [
+            (r";", VALUE),
+            (r"\{", VALUE, "#push"),
+            (r"\}", VALUE, "#pop"),
+        ],
+        "string": _C_STRING,
+        "macro": [
+            (r"(?:" + _C_WS1 + r")include" + _C_WS1 + r"(?:\"[^\"]+\"|<[^>]+>)"
+             r"[^\n]*", SKIP),
+            (r"[^/\n]+", SKIP),
+            (r"/[*](?:.|\n)*?[*]/", SKIP),
+            (r"//.*?\n", SKIP, "#pop"),
+            (r"/", SKIP),
+            (r"(?<=\\)\n", SKIP),
+            (r"\n", SKIP, "#pop"),
+        ],
+        "if0": _C_IF0,
+        "classname": [
+            (ident, VALUE, "#pop"),
+            (r"\s*(?=>)", SKIP, "#pop"),
+            ("", SKIP, "#pop"),
+        ],
+        "case-value": [
+            (r"(?<!:):(?!:)", VALUE, "#pop"),
+            (ident, VALUE),
+        ] + whitespace + statements,
+    }
+    if cpp:
+        states["enumname"] = whitespace + [
+            (_words(("class", "struct")), VALUE),
+            (ident, VALUE, "#pop"),
+            (r"\s*(?=>)", SKIP, "#pop"),
+            ("", SKIP, "#pop"),
+        ]
+        states["namespace"] = [
+            (r"[;{]", VALUE, ("#pop", "root")),
+            (r"inline\b", VALUE),
+            (ident, VALUE),
+        ] + statement
+    return states, re.MULTILINE
+
+
+# ------------------------------------------------------------------------ Java
+def _java(version):
+    start = r"(?:[^\W\d]|\$)"
+    name = start + r"[\w$]*"
+    keywords = (r"(?:assert|break|case|catch|continue|default|do|else|finally|"
+                r"for|if|goto|instanceof|new|return|switch|this|throw|try|"
+                r"while)\b")
+    declarations = ["abstract", "const", "enum", "extends", "final",
+                    "implements", "native", "private", "protected", "public",
+                    "static", "strictfp", "super", "synchronized", "throws",
+                    "transient", "volatile"]
+    numbers = [
+        (r"(?:[0-9][0-9_]*\.(?:[0-9][0-9_]*)?|\.[0-9][0-9_]*)"
+         r"(?:[eE][+\-]?[0-9][0-9_]*)?[fFdD]?|"
+         r"[0-9][eE][+\-]?[0-9][0-9_]*[fFdD]?|"
+         r"[0-9](?:[eE][+\-]?[0-9][0-9_]*)?[fFdD]|"
+         r"0[xX](?:[0-9a-fA-F][0-9a-fA-F_]*\.?|"
+         r"(?:[0-9a-fA-F][0-9a-fA-F_]*)?\.[0-9a-fA-F][0-9a-fA-F_]*)"
+         r"[pP][+\-]?[0-9][0-9_]*[fFdD]?", VALUE),
+        (r"0[xX][0-9a-fA-F][0-9a-fA-F_]*[lL]?", VALUE),
+        (r"0[bB][01][01_]*[lL]?", VALUE),
+        (r"0[0-7_]+[lL]?", VALUE),
+        (r"0|[1-9][0-9_]*[lL]?", VALUE),
+        (r"[~^*!%&\[\]<>|+=/?-]", VALUE),
+        (r"[{}();:.,]", VALUE),
+        (r"\n", SKIP),
+    ]
+    char = r"'\\.'|'[^\\]'|'\\u[0-9a-fA-F]{4}'", STRING
+    attribute = r"(\.)(" + name + r")", (VALUE, VALUE)
+    states = {
+        "var": [(name, NAME, "#pop")],
+        "import": [(r"[\w.]+\*?", VALUE, "#pop")],
+    }
+
+    if version == (2, 6):
+        states["root"] = [
+            (r"[^\S\n]+", SKIP),
+            (r"//.*?\n", SKIP),
+            (r"/\*.*?\*/", SKIP),
+            (keywords, VALUE),
+            # Methods
+            (r"((?:" + start + r"[\w.\[\]$<>]*\s+)+?)(" + name + r")(\s*)(\()",
+             (USING, FUNCTION, SKIP, VALUE)),
+            (r"@[^\W\d][\w.]*", VALUE),
+            (_words(declarations), VALUE),
+            (r"(?:boolean|byte|char|double|float|int|long|short|void)\b",
+             VALUE),
+            (r"(package)(\s+)", (VALUE, SKIP), "import"),
+            (r"(?:true|false|null)\b", VALUE),
+            (r"(class|interface)(\s+)", (VALUE, SKIP), "class"),
+            (r"(var)(\s+)", (VALUE, SKIP), "var"),
+            (r"(import(?:\s+static)?)(\s+)", (VALUE, SKIP), "import"),
+            (r'"(?:\\\\|\\"|[^"])*"', STRING),
+            char,
+            attribute,
+            # Labels
+            (r"^\s*" + name + r":", VALUE),
+            (name, NAME),
+        ] + numbers
+        states["class"] = [(name, VALUE, "#pop")]
+    else:
+        states["root"] = [
+            (r"(^\s*)((?:(?:public|private|protected|static|strictfp)"
+             r"(?:\s+))*)(record)\b", (SKIP, USING, VALUE), "class"),
+            (r"[^\S\n]+", SKIP),
+            (r"//.*?\n", SKIP),
+            (r"/\*.*?\*/", SKIP),
+            (keywords, VALUE),
+            # Methods
+            (r"((?:" + start + r"[\w.\[\]$<>?]*\s+)+?)(" + name +
+             r")(\s*)(\()", (USING, FUNCTION, SKIP, VALUE)),
+            (r"@[^\W\d][\w.]*", VALUE),
+            (_words(declarations + ["sealed", "yield"]), VALUE),
+            (r"(?:boolean|byte|char|double|float|int|long|short|void)\b",
+             VALUE),
+            (r"(package)(\s+)", (VALUE, SKIP), "import"),
+            (r"(?:true|false|null)\b", VALUE),
+            (r"(?:class|interface)\b", VALUE, "class"),
+            (r"(var)(\s+)", (VALUE, SKIP), "var"),
+            (r"(import(?:\s+static)?)(\s+)", (VALUE, SKIP), "import"),
+            (r'"""\n', STRING, "multiline_string"),
+            (r'"', STRING, "string"),
+            char,
+            attribute,
+            # Labels
+            (r"^(\s*)(default)(:)", (SKIP, VALUE, VALUE)),
+            (r"^(\s*)(" + name + r")(:)", (SKIP, VALUE, VALUE)),
+            (name, NAME),
+        ] + numbers
+        states["class"] = [
+            (r"\s+", SKIP),
+            (name, VALUE, "#pop"),
+        ]
+        string = [
+            (r'[^\\"]+', STRING),
+            (r"\\\\", STRING),
+            (r'\\"', STRING),
+            (r"\\", STRING),
+            (r'"', STRING, "#pop"),
+        ]
+        states["string"] = string
+        states["multiline_string"] = [
+            (r'"""', STRING, "#pop"),
+            (r'"', STRING),
+        ] + string
+    return states, re.MULTILINE | re.DOTALL
+
+
+# ---------------------------------------------------------------------- Python
+_PY_BUILTINS = (
+    "__import__", "abs", "all", "any", "bin", "bool", "bytearray", "bytes",
+    "chr", "classmethod", "compile", "complex", "delattr", "dict", "dir",
+    "divmod", "enumerate", "eval", "filter", "float", "format", "frozenset",
+    "getattr", "globals", "hasattr", "hash", "hex", "id", "input", "int",
+    "isinstance", "issubclass", "iter", "len", "list", "locals", "map",
+    "max", "memoryview", "min", "next", "object", "oct", "open", "ord",
+    "pow", "print", "property", "range", "repr", "reversed", "round", "set",
+    "setattr", "slice", "sorted", "staticmethod", "str", "sum", "super",
+    "tuple", "type", "vars", "zip")
+
+_PY_EXCEPTIONS = (
+    "ArithmeticError", "AssertionError", "AttributeError", "BaseException",
+    "BufferError", "BytesWarning", "DeprecationWarning", "EOFError",
+    "EnvironmentError", "Exception", "FloatingPointError", "FutureWarning",
+    "GeneratorExit", "IOError", "ImportError", "ImportWarning",
+    "IndentationError", "IndexError", "KeyError", "KeyboardInterrupt",
+    "LookupError", "MemoryError", "NameError", "NotImplementedError",
+    "OSError", "OverflowError", "PendingDeprecationWarning",
+    "ReferenceError", "ResourceWarning", "RuntimeError", "RuntimeWarning",
+    "StopIteration", "SyntaxError", "SyntaxWarning", "SystemError",
+    "SystemExit", "TabError", "TypeError", "UnboundLocalError",
+    "UnicodeDecodeError", "UnicodeEncodeError", "UnicodeError",
+    "UnicodeTranslateError", "UnicodeWarning", "UserWarning", "ValueError",
+    "VMSError", "Warning", "WindowsError", "ZeroDivisionError",
+    "BlockingIOError", "ChildProcessError", "ConnectionError",
+    "BrokenPipeError", "ConnectionAbortedError", "ConnectionRefusedError",
+    "ConnectionResetError", "FileExistsError", "FileNotFoundError",
+    "InterruptedError", "IsADirectoryError", "NotADirectoryError",
+    "PermissionError", "ProcessLookupError", "TimeoutError",
+    "StopAsyncIteration", "ModuleNotFoundError", "RecursionError")
+
+_PY_MAGIC_FUNCTIONS = (
+    "__abs__", "__add__", "__aenter__", "__aexit__", "__aiter__", "__and__",
+    "__anext__", "__await__", "__bool__", "__bytes__", "__call__",
+    "__complex__", "__contains__", "__del__", "__delattr__", "__delete__",
+    "__delitem__", "__dir__", "__divmod__", "__enter__", "__eq__",
+    "__exit__", "__float__", "__floordiv__", "__format__", "__ge__",
+    "__get__", "__getattr__", "__getattribute__", "__getitem__", "__gt__",
+    "__hash__", "__iadd__", "__iand__", "__ifloordiv__", "__ilshift__",
+    "__imatmul__", "__imod__", "__imul__", "__index__", "__init__",
+    "__instancecheck__", "__int__", "__invert__", "__ior__", "__ipow__",
+    "__irshift__", "__isub__", "__iter__", "__itruediv__", "__ixor__",
+    "__le__", "__len__", "__length_hint__", "__lshift__", "__lt__",
+    "__matmul__", "__missing__", "__mod__", "__mul__", "__ne__", "__neg__",
+    "__new__", "__next__", "__or__", "__pos__", "__pow__", "__prepare__",
+    "__radd__", "__rand__", "__rdivmod__", "__repr__", "__reversed__",
+    "__rfloordiv__", "__rlshift__", "__rmatmul__", "__rmod__", "__rmul__",
+    "__ror__", "__round__", "__rpow__", "__rrshift__", "__rshift__",
+    "__rsub__", "__rtruediv__", "__rxor__", "__set__", "__setattr__",
+    "__setitem__", "__str__", "__sub__", "__subclasscheck__",
+    "__truediv__", "__xor__")
+
+_PY_MAGIC_VARIABLES = (
+    "__annotations__", "__bases__", "__class__", "__closure__", "__code__",
+    "__defaults__", "__dict__", "__doc__", "__file__", "__func__",
+    "__globals__", "__kwdefaults__", "__module__", "__mro__", "__name__",
+    "__objclass__", "__qualname__", "__self__", "__slots__", "__weakref__")
+
+
+def _python_strings(interpolation):
+    # Content of the strings
+    if interpolation:
+        return [
+            (r"\}", STRING),
+            (r"\{", STRING, "expr-inside-fstring"),
+            (r"[^\\'\"{}\n]+", STRING),
+            (r"['\"\\]", STRING),
+        ]
+    return [
+        (r"%(?:\(\w+\))?[-#0 +]*(?:[0-9]+|[*])?(?:\.(?:[0-9]+|[*]))?"
+         r"[hlL]?[E-GXc-giorsaux%]", STRING),
+        (r"\{(?:(?:\w+)(?:(?:\.\w+)|(?:\[[^\]]+\]))*)?(?:\![sra])?"
+         r"(?:\:(?:.?[<>=\^])?[-+ ]?#?0?(?:\d+)?,?(?:\.\d+)?[E-GXb-gnosx%]?)?"
+         r"\}", STRING),
+        (r"[^\\'\"%{\n]+", STRING),
+        (r"['\"\\]", STRING),
+        (r"%|\{{1,2}", STRING),
+    ]
+
+
+def _python(version):
+    name = "[{}][{}]*".format(unistring.xid_start, unistring.xid_continue)
+    builtins = _PY_BUILTINS
+    exceptions = _PY_EXCEPTIONS
+    if version == (2, 6):
+        builtins += ("cmp",)
+    else:
+        builtins += ("aiter", "breakpoint", "callable")
+        exceptions += ("EncodingWarning",)
+
+    numbers = [
+        (r"(?:\d(?:_?\d)*\.(?:\d(?:_?\d)*)?|(?:\d(?:_?\d)*)?\.\d(?:_?\d)*)"
+         r"(?:[eE][+-]?\d(?:_?\d)*)?", VALUE),
+        (r"\d(?:_?\d)*[eE][+-]?\d(?:_?\d)*j?", VALUE),
+        (r"0[oO](?:_?[0-7])+", VALUE),
+        (r"0[bB](?:_?[01])+", VALUE),
+        (r"0[xX](?:_?[a-fA-F0-9])+", VALUE),
+        (r"\d(?:_?\d)*", VALUE),
+    ]
+    magic_functions = [(_words(_PY_MAGIC_FUNCTIONS), FUNCTION)]
+    constants = r"(?:True|False|None)\b", VALUE
+
+    # Strings: the prefixes and the states of their content (the escapes
+    # depend on the prefix)
+    if version == (2, 6):
+        prefixes = [
+            ("(?i:rf|fr)", None),
+            ("[fF]", "fstringescape"),
+            ("(?i:rb|br|r)", None),
+            ("[uUbB]?", "stringescape"),
+        ]
+        escapes = {
+            "fstringescape": [
+                (r"\{\{", STRING),
+                (r"\}\}", STRING),
+            ],
+            "stringescape": [
+                (r"\\(?:[\\abfnrtv\"']|\n|N\{.*?\}|u[a-fA-F0-9]{4}|"
+                 r"U[a-fA-F0-9]{8}|x[a-fA-F0-9]{2}|[0-7]{1,3})", STRING),
+            ],
+        }
+        escapes["fstringescape"] += escapes["stringescape"]
+    else:
+        prefixes = [
+            ("(?i:rf|fr)", "rfstringescape"),
+            ("[fF]", "fstringescape"),
+            ("(?i:rb|br|r)", None),
+            ("[uU]?", "stringescape"),
+            ("[bB]", "bytesescape"),
+        ]
+        bytes_escape = [
+            (r"\\(?:[\\abfnrtv\"']|\n|x[a-fA-F0-9]{2}|[0-7]{1,3})", STRING),
+        ]
+        fstring_escape = [
+            (r"\{\{", STRING),
+            (r"\}\}", STRING),
+        ]
+        string_escape = [
+            (r"\\(?:N\{.*?\}|u[a-fA-F0-9]{4}|U[a-fA-F0-9]{8})", STRING),
+        ] + bytes_escape
+        escapes = {
+            "rfstringescape": fstring_escape,
+            "fstringescape": fstring_escape + string_escape,
+            "stringescape": string_escape,
+            "bytesescape": bytes_escape,
+        }
+
+    states = {}
+    strings = []
+    for prefix, escape in prefixes:
+        interpolation = "f" in prefix
+        for quotes, content in (('"""', "tdq"), ("'''", "tsq"), ('"', "dq"),
+                                ("'", "sq")):
+            content += "f" if interpolation else "s"
+            rules = [(quotes, STRING, "#pop")]
+            if len(quotes) == 1:
+                rules.append((r"\\\\|\\{}|\\\n".format(quotes), STRING))
+            rules += _python_strings(interpolation)
+            if len(quotes) == 3:
+                rules.append((r"\n", STRING))
+            if escape is not None:
+                rules = escapes[escape] + rules
+                content = escape + "+" + content
+            states[content] = rules
+            strings.append(("(" + prefix + ")(" + quotes + ")",
+                            (STRING, STRING), content))
+
+    expr = strings + [
+        (r"[^\S\n]+", SKIP),
+    ] + (numbers if version != (2, 6) else []) + [
+        (r"!=|==|<<|>>|:=|[-~+/*%=<>&^|.]", VALUE),
+        (r"[]{}:(),;[]", VALUE),
+        (r"(?:in|is|and|or|not)\b", VALUE),
+        (_words(("async for", "await", "else", "for", "if", "lambda",
+                 "yield", "yield from")), VALUE),
+        constants,
+        (_words(builtins, prefix=r"(?<!\.)"), VALUE),
+        (r"(?<!\.)(?:self|Ellipsis|NotImplemented|cls)\b", VALUE),
+        (_words(exceptions, prefix=r"(?<!\.)"), VALUE),
+    ] + magic_functions + [
+        (_words(_PY_MAGIC_VARIABLES), VALUE),
+        (r"@" + name, VALUE),
+        (r"@", VALUE),
+        (name, NAME),
+    ] + (numbers if version == (2, 6) else [])
+
+    keywords = [
+        (_words(("assert", "async", "await", "break", "continue", "del",
+                 "elif", "else", "except", "finally", "for", "global", "if",
+                 "lambda", "pass", "raise", "nonlocal", "return", "try",
+                 "while", "yield", "yield from", "as", "with")), VALUE),
+        constants,
+    ]
+    if version != (2, 6):
+        # Soft keywords `match` and `case` at the start of a line
+        keywords.append((
+            r"(^[ \t]*)(match|case)\b(?![ \t]*(?:[:,;=^&|@~)\]}]|(?:" +
+            "|".join(k for k in keyword.kwlist if k[0].islower()) + r")\b))",
+            (SKIP, VALUE), "soft-keywords-inner"))
+        states["soft-keywords-inner"] = [
+            (r"(\s+)([^\n_]*)(_\b)", (SKIP, USING, VALUE)),
+            ("", SKIP, "#pop"),
+        ]
+
+    whitespace = r"\s+" if version != (2, 6) else r"[^\S]+"
+    states.update({
+        "root": [
+            (r"\n", SKIP),
+            (r'^(\s*)([rRuUbB]{,2})("""(?:.|\n)*?""")', (SKIP, STRING, STRING)),
+            (r"^(\s*)([rRuUbB]{,2})('''(?:.|\n)*?''')", (SKIP, STRING, STRING)),
+            (r"\A#!.+$", SKIP),
+            (r"#.*$", SKIP),
+            (r"\\\n", SKIP),
+            (r"\\", SKIP),
+        ] + keywords + [
+            (r"(def)((?:\s|\\\s)+)", (VALUE, SKIP), "funcname"),
+            (r"(class)((?:\s|\\\s)+)", (VALUE, SKIP), "classname"),
+            (r"(from)((?:\s|\\\s)+)", (VALUE, SKIP), "fromimport"),
+            (r"(import)((?:\s|\\\s)+)", (VALUE, SKIP), "import"),
+        ] + expr,
+        "expr-inside-fstring": [
+            (r"[{([]", VALUE, "expr-inside-fstring-inner"),
+            (r"(?:=\s*)?(?:\![sraf])?\}", STRING, "#pop"),
+            (r"(?:=\s*)?(?:\![sraf])?:", STRING, "#pop"),
+            (whitespace, SKIP),
+        ] + expr,
+        "expr-inside-fstring-inner": [
+            (r"[{([]", VALUE, "expr-inside-fstring-inner"),
+            (r"[])}]", VALUE, "#pop"),
+            (whitespace, SKIP),
+        ] + expr,
+        "funcname": magic_functions + [
+            (name, FUNCTION, "#pop"),
+            ("", SKIP, "#pop"),
+        ],
+        "classname": [
+            (name, VALUE, "#pop"),
+        ],
+        "import": [
+            (r"(\s+)(as)(\s+)", (SKIP, VALUE, SKIP)),
+            (r"\.", VALUE),
+            (name, VALUE),
+            (r"(\s*)(,)(\s*)", (SKIP, VALUE, SKIP)),
+            ("", SKIP, "#pop"),
+        ],
+        "fromimport": [
+            (r"(\s+)(import)\b", (SKIP, VALUE), "#pop"),
+            (r"\.", VALUE),
+            (r"None\b", VALUE, "#pop"),
+            (name, VALUE),
+            ("", SKIP, "#pop"),
+        ],
+    })
+    return states, re.MULTILINE
+
+
+def _no_names(lexer):
+    return ()
+
+
+# (module, name) of the pygments lexers -> (tables by pygments version, names
+# which are types)
+_LANGUAGES = {
+    ("pygments.lexers.c_cpp", "CLexer"): (
+        {(2, 6): lambda: _c_family_2_6(False),
+         (2, 19): lambda: _c_family_2_19(False)},
+        _c_family_names),
+    ("pygments.lexers.c_cpp", "CppLexer"): (
+        {(2, 6): lambda: _c_family_2_6(True),
+         (2, 19): lambda: _c_family_2_19(True)},
+        _c_family_names),
+    ("pygments.lexers.jvm", "JavaLexer"): (
+        {(2, 6): lambda: _java((2, 6)),
+         (2, 19): lambda: _java((2, 19))},
+        _no_names),
+    ("pygments.lexers.python", "PythonLexer"): (
+        {(2, 6): lambda: _python((2, 6)),
+         (2, 19): lambda: _python((2, 19))},
+        _no_names),
+}
@@ -1,39 +1,217 @@
+from collections import deque
+
 from .fingerprint import Fingerprinter
-from .kgram import KGrams, Buffer
+from .kgram import KGrams, RollingKGrams, Buffer
 
 
 
 class Winnower(Fingerprinter):
-    def __init__(self, parser_factory, window_size, k):
-        super().__init__(parser_factory)
+    """
+    Parameters
+    ----------
+    parser_factory: callable
+        Factory creating a token iterator from a file path
+    window_size: int
+        Size of the min-hashing window
+    k: int
+        Length of the kgrams
+    hashing: "rolling" or "sha1" (default: "rolling")
+        How the kgrams are hashed. "rolling" is a Karp-Rabin rolling hash,
+        "sha1" hashes the text of each kgram (slower, kept for compatibility
+        with previous versions)
+    hash_bits: 16, 32 or 64 (default: 64)
+        Width of the fingerprints. Kgrams sharing the same fingerprint are
+        considered identical, so narrow fingerprints produce false matches
+        on large corpora
+    cache: `FingerprintCache` or None
+        Cache of fingerprints (default: None, no caching)
+    token_cache: `TokenCache`, `TokenStreams` or None
+        Cache of the token streams of the files (default: None, no caching).
+        Unlike the fingerprints, they do not depend on `k`, `window_size`,
+        etc.
+    reference_filter: `ReferenceFilter` or None
+        Fingerprints of the reference code (default: None). Those kgrams are
+        never selected: within each window, the minimum is taken over the
+        other kgrams only.
+    """
+    __KGRAMIFIERS__ = {
+        "sha1": KGrams,
+        "rolling": RollingKGrams,
+    }
+
+    __HASH_BITS__ = (16, 32, 64)
+
+    def __init__(self, parser_factory, window_size, k, hashing="rolling",
+                 hash_bits=64, cache=None, token_cache=None,
+                 reference_filter=None):
+        super().__init__(parser_factory, cache)
+        if hashing not in self.__KGRAMIFIERS__:
+            raise ValueError("Unknown hashing '{}' (choose among {})"
+                             "".format(hashing,
+                                       ", ".join(self.__KGRAMIFIERS__)))
+        if hash_bits not in self.__HASH_BITS__:
+            raise ValueError("Unsupported hash width: {} (choose among {})"
+                             "".format(hash_bits, self.__HASH_BITS__))
         self.window_size = window_size
         self.k = k
+        self.hashing = hashing
+        self.hash_bits = hash_bits
+        self.token_cache = token_cache
+        self._reference_filter = None
+        self.reference_filter = reference_filter
 
     @property
-    def kgramifier(self):
+    def kgram_class(self):
         # Can be overriden to change the default hash function
-        return KGrams.kgramify
+        return self.__KGRAMIFIERS__[self.hashing]
+
+    @property
+    def kgramifier(self):
+        return self.kgram_class.kgramify
+
+    @property
+    def hash_name(self):
+        # Must be overriden together with `kgram_class` (used by the cache)
+        return "{}:{}".format(self.hashing, self.hash_bits)
+
+    @property
+    def reference_filter(self):
+        return self._reference_filter
+
+    @reference_filter.setter
+    def reference_filter(self, reference_filter):
+        if reference_filter is not None:
+            reference_filter.check(self)
+        self._reference_filter = reference_filter
+
+    def signature(self):
+        signature = super().signature() + (self.k, self.window_size,
+                                           self.hash_name)
+        if self.reference_filter is not None:
+            signature += (self.reference_filter.digest,)
+        return signature
+
+
+    def winnow(self, fingerprints):
+        """
+        Yield the positions (in the sequence of kgrams) of the selected
+        fingerprints. A selected position is always within the last
+        `window_size` fingerprints consumed.
+        """
+        # Monotonic deque: fingerprints are increasing from front to back, so
+        # that the front is the minimum of the current window. Each kgram is
+        # pushed and popped at most once, hence O(1) amortised per kgram.
+        # On ties, the rightmost minimum is kept (robust winnowing): a new
+        # kgram evicts all the kgrams with a greater or equal fingerprint.
+        window = deque()
+        window_size = self.window_size
+        last_selected = -1
 
+        for i, fingerprint in enumerate(fingerprints):
+            while window and window[-1][0] >= fingerprint:
+                window.pop()
+            window.append((fingerprint, i))
+            if window[0][1] <= i - window_size:
+                # Out of the window
+                window.popleft()
+
+            if i >= window_size - 1:
+                position = window[0][1]
+                if position != last_selected:
+                    last_selected = position
+                    yield position
+
+    def winnow_unreferenced(self, fingerprints):
+        """
+        As `winnow`, but the fingerprints found in the reference filter are
+        never selected. The other fingerprints are selected as if those were
+        absent from the windows (a window of reference kgrams only selects
+        nothing).
+        """
+        reference_filter = self.reference_filter
+        if reference_filter is None:
+            yield from self.winnow(fingerprints)
+            return
+
+        # Reference kgrams are given a fingerprint greater than any other,
+        # so that they are only the minimum of a window without other kgram
+        masked = set()
+        sentinel = 1 << self.hash_bits
+
+        def masking():
+            for i, fingerprint in enumerate(fingerprints):
+                if fingerprint in reference_filter:
+                    masked.add(i)
+                    yield sentinel
+                else:
+                    yield fingerprint
+
+        for position in self.winnow(masking()):
+            if position not in masked:
+                yield position
+        self.stats["reference_kgrams"] += len(masked)
+
+    def compact(self, parser):
+        """The arrays (symbol ids, lines, columns) of the tokens of a file"""
+        if self.token_cache is None:
+            return parser.compact()
+        return self.token_cache.compact(parser)
+
+    def kgram_fingerprints(self, parser):
+        """The fingerprints of all the kgrams of a file (no winnowing)"""
+        if not hasattr(parser, "compact"):
+            return [int(kgram) for _, kgram
+                    in self.kgramifier(iter(parser), self.k, self.hash_bits)]
+        return list(self.kgram_class.fingerprints(self.compact(parser)[0],
+                                                  self.k, self.hash_bits))
+
+    def extract_compact_(self, parser):
+        # Lean pipeline: the parser produces arrays, only the fingerprints
+        # are computed for each position, and the kgrams are created for the
+        # selected positions only
+        if not hasattr(parser, "compact"):
+            yield from super().extract_compact_(parser)
+            return
+
+        symbol_ids, lines, columns = self.compact(parser)
+        kgram_class, k, hash_bits = self.kgram_class, self.k, self.hash_bits
+        for start in self.winnow_unreferenced(
+                kgram_class.fingerprints(symbol_ids, k, hash_bits)):
+            yield kgram_class.at(symbol_ids, start, k, hash_bits), \
+                lines[start], columns[start]
 
     def extract_fingerprints_(self, token_iterator):
+        # The last `window_size` kgrams are kept to retrieve the selected
+        # ones
+        window_size = self.window_size
+        recent = [None] * window_size
+
+        def fingerprints():
+            for i, location_kgram in enumerate(
+                    self.kgramifier(token_iterator, self.k, self.hash_bits)):
+                recent[i % window_size] = location_kgram
+                yield int(location_kgram[1])
+
+        for position in self.winnow_unreferenced(fingerprints()):
+            yield recent[position % window_size]
+
+
+class NaiveWinnower(Winnower):
+    """
+    Straightforward O(w) per kgram implementation of `Winnower`. Kept as a
+    reference for testing and benchmarking.
+    """
+    def winnow(self, fingerprints):
         window = Buffer(self.window_size)
-        selected_grams = []
-        min_gram = None
+        min_position = None
 
-        for location, kgram in self.kgramifier(token_iterator, self.k):
-            window.put(kgram)
+        for i, fingerprint in enumerate(fingerprints):
+            window.put((fingerprint, i))
             if window.is_full():
-                # Note: using built-in `min` should be much faster than
-                # re-impl. it. Moreover, the window is expected to be small
-                # and the cost of deriving and inverting an array should be
-                # small.
                 # `min` keeps the leftmost minima:
                 # >> min([(1, 1), (1, 2)], key=lambda x:x[0])
                 # (1, 1)
-                window_min = min(list(window)[::-1], key=hash)
-                if window_min is not min_gram:
-                    selected_grams.append(window_min)
-                    min_gram = window_min
-                    yield location, window_min
-
-
+                _, position = min(list(window)[::-1], key=lambda x: x[0])
+                if position != min_position:
+                    min_position = position
+                    yield position
@@ -33,6 +33,8 @@ if __name__ == '__main__':
         ],
         platforms="any",
         install_requires=['nose'],
+        # numpy also speeds up the signatures of `locmoss.lsh`
+        extras_require={'vectorized': ['numpy', 'scipy']},
         packages=["locmoss", "locmoss/query"],
         scripts=['bin/local_moss',]
     )